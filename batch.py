@@ -0,0 +1,263 @@
+"""
+Struct-of-arrays backend for the headless simulation. Enemy and projectile state lives
+in NumPy arrays and every enemy/projectile is stepped, range-checked against the player
+and collision-tested in one go, instead of one Python method call per object.
+
+NumPy is optional. Without it HAVE_NUMPY is False and callers keep using LevelSimulation.
+The enemy Body objects in sim.enemies stay around as mirrors of the arrays (like widgets
+would), so the actor index, the activity region and the stats keep working unchanged.
+"""
+try:
+    import numpy as np
+except ImportError:     # Optional dependency, see HAVE_NUMPY
+    np = None
+
+from simulation import LevelSimulation, integrate, move_swept, player_input, player_contacts, \
+    apply_inventory_effects, FIXED_DT
+
+HAVE_NUMPY = np is not None
+
+PROJECTILE_SIZE = (10, 4)   # SimProjectile / Projectile size
+
+
+def static_arrays(objects):
+    """(x, y, width, height) arrays of objects with pos and size."""
+    rects = np.array([(o.pos[0], o.pos[1], o.size[0], o.size[1]) for o in objects], dtype=float).reshape(-1, 4)
+    return rects[:, 0], rects[:, 1], rects[:, 2], rects[:, 3]
+
+
+def _axis_times(start, size, delta, other, other_size):
+    """Entry and exit times along one axis, as in simulation.sweep_aabb with inclusive=True."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        forward = delta > 0
+        entry = np.where(forward, (other - (start + size)) / delta, (other + other_size - start) / delta)
+        exit_ = np.where(forward, (other + other_size - start) / delta, (other - (start + size)) / delta)
+    still = delta == 0
+    inside = ~((start + size < other) | (start > other + other_size))
+    entry = np.where(still, np.where(inside, -np.inf, np.inf), entry)
+    exit_ = np.where(still, np.where(inside, np.inf, -np.inf), exit_)
+    return entry, exit_
+
+
+def sweep_matrix(x, y, w, h, dx, dy, ox, oy, ow, oh):
+    """
+    Time of impact of every moving rect (rows) against every still rect (columns),
+    same rules as simulation.sweep_aabb(..., inclusive=True). np.inf where they don't meet.
+    """
+    x, y, w, h, dx, dy = (a[:, None] for a in (x, y, w, h, dx, dy))
+    tx_entry, tx_exit = _axis_times(x, w, dx, ox, ow)
+    ty_entry, ty_exit = _axis_times(y, h, dy, oy, oh)
+    entry = np.maximum(tx_entry, ty_entry)
+    exit_ = np.minimum(tx_exit, ty_exit)
+    hit = ~((entry > exit_) | (exit_ <= 0) | (entry > 1))
+    return np.where(hit, np.maximum(entry, 0.0), np.inf)
+
+
+class EnemyBatch:
+    """Enemy state as arrays, in the same order as the Body mirrors passed in."""
+    def __init__(self, bodies):
+        self.bodies = list(bodies)
+        self.slots = {id(body): i for i, body in enumerate(self.bodies)}
+        column = lambda name: np.array([getattr(b, name) for b in self.bodies], dtype=float)
+        self.x = np.array([b.pos[0] for b in self.bodies], dtype=float)
+        self.y = np.array([b.pos[1] for b in self.bodies], dtype=float)
+        self.w = np.array([b.size[0] for b in self.bodies], dtype=float)
+        self.h = np.array([b.size[1] for b in self.bodies], dtype=float)
+        self.direction = column('direction')
+        self.move_speed = column('move_speed')
+        self.health = column('current_health')
+        self.attack_damage = column('attack_damage')
+        self.shoot_interval = column('shoot_interval')
+        self.last_shot = column('last_shot_time')
+        self.alive = np.ones(len(self.bodies), dtype=bool)
+        self.awake = np.ones(len(self.bodies), dtype=bool)
+
+    def set_awake(self, bodies):
+        self.awake[:] = False
+        for body in bodies:
+            self.awake[self.slots[id(body)]] = True
+
+
+class ProjectileBatch:
+    """Live projectiles as growable columns. Only the first `count` entries are in use."""
+    FIELDS = ('x', 'y', 'vx', 'vy', 'age', 'decay', 'damage', 'from_player')
+
+    def __init__(self, capacity=64):
+        self.data = np.zeros((len(self.FIELDS), capacity))
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, x, y, vx, vy, damage, from_player, decay=2.0):
+        if self.count == self.data.shape[1]:
+            self.data = np.concatenate([self.data, np.zeros_like(self.data)], axis=1)
+        self.data[:, self.count] = (x, y, vx, vy, 0.0, decay, damage, from_player)
+        self.count += 1
+
+    def columns(self):
+        """Views of the live part of each column, in FIELDS order."""
+        return [row[:self.count] for row in self.data]
+
+    def keep(self, mask):
+        """Drop the projectiles where mask is False, keeping the order of the others."""
+        kept = int(mask.sum())
+        self.data[:, :kept] = self.data[:, :self.count][:, mask]
+        self.count = kept
+
+
+class BatchLevelSimulation(LevelSimulation):
+    """
+    LevelSimulation with the enemy and projectile updates done on arrays.
+    Plays out the same as LevelSimulation: same order of updates, same rules.
+    """
+    def __init__(self, data, world_width=1920, fixed_dt=FIXED_DT):
+        if not HAVE_NUMPY:
+            raise RuntimeError("BatchLevelSimulation needs numpy, use LevelSimulation instead")
+        self.projectile_batch = ProjectileBatch()     # self.projectiles stays empty
+        super().__init__(data, world_width, fixed_dt)
+        self.enemy_batch = EnemyBatch(self.enemies)
+        self.enemy_batch.set_awake(self.activity.awake)
+
+    def static_near(self, left, bottom, right, top):
+        """
+        Arrays of the static objects around the box covering arrays left/bottom/right/top: the
+        broad phase, one grid query for all movers. They are all near the player (enemies only run
+        their AI while awake, projectiles decay), so the box stays small however big the level is.
+        """
+        x, y = float(left.min()), float(bottom.min())
+        return static_arrays(self.spatial_index.query(x, y, float(right.max()) - x, float(top.max()) - y))
+
+    def update_activity(self, dt=0):
+        super().update_activity(dt)
+        if hasattr(self, 'enemy_batch'):
+            self.enemy_batch.set_awake(self.activity.awake)
+
+    def spawn_projectile(self, x, y, direction, speed, damage, owner):
+        self.projectile_batch.add(x, y, direction[0] * speed, direction[1] * speed, damage, owner == 'player')
+
+    def step(self, dt):
+        if self.outcome is not None:
+            return
+        # run_tick, with the projectile and enemy phases done on the arrays
+        player = self.player
+        player_input(player, self.keys_pressed, self)
+        self.update_projectiles(dt)
+        self.update_enemies(dt)
+        player_contacts(self)
+        integrate(player, dt, self.world_width, self.solids_near)
+        apply_inventory_effects(player)
+
+    def kill_enemy(self, slot):
+        batch = self.enemy_batch
+        batch.alive[slot] = False
+        batch.awake[slot] = False
+        self.remove_enemy(batch.bodies[slot])
+
+    def update_projectiles(self, dt):
+        """simulation.projectile_step for every projectile at once."""
+        batch = self.projectile_batch
+        if not batch.count:
+            return
+        x, y, vx, vy, age, decay, damage, from_player = batch.columns()
+        width, height = PROJECTILE_SIZE
+        w = np.full(batch.count, float(width))
+        h = np.full(batch.count, float(height))
+        # Swept like Projectile.update: every collision time is measured along this tick's move
+        start_x, start_y = x.copy(), y.copy()
+        dx, dy = vx * dt, vy * dt
+        x += dx
+        y += dy
+        age += dt
+        removed = age > decay
+        flying = ~removed
+
+        # Only the platforms around this tick's moves, not the whole level
+        sx, sy, sw, sh = self.static_near(np.minimum(start_x, x), np.minimum(start_y, y),
+                                          np.maximum(start_x, x) + w, np.maximum(start_y, y) + h)
+        if len(sx):
+            platform_time = sweep_matrix(start_x, start_y, w, h, dx, dy, sx, sy, sw, sh).min(axis=1)
+        else:
+            platform_time = np.full(batch.count, np.inf)
+
+        player = self.player
+        px, py, pw, ph = player.rect
+        player_time = sweep_matrix(start_x, start_y, w, h, dx, dy,
+                                   np.array([px]), np.array([py]), np.array([pw]), np.array([ph]))[:, 0]
+        # A platform hit first (or at the same time) stops the projectile before the target
+        hits_player = flying & (from_player == 0) & (player_time < platform_time)
+        for i in np.flatnonzero(hits_player):
+            player.current_health -= float(damage[i])
+            player.take_damage(float(damage[i]))
+            if player.current_health <= 0:
+                player.die()
+        removed |= flying & (platform_time < np.inf)
+        removed |= hits_player
+
+        enemies = self.enemy_batch
+        shooting = np.flatnonzero(flying & (from_player != 0))
+        if len(shooting) and enemies.alive.any():
+            times = sweep_matrix(start_x[shooting], start_y[shooting], w[shooting], h[shooting],
+                                 dx[shooting], dy[shooting], enemies.x, enemies.y, enemies.w, enemies.h)
+            times[:, ~enemies.alive] = np.inf
+            # Resolved in projectile order, so a bullet behind one that killed an enemy flies on
+            for row in np.flatnonzero((times < platform_time[shooting][:, None]).any(axis=1)):
+                row_times = np.where(enemies.alive, times[row], np.inf)
+                slot = int(np.argmin(row_times))   # First enemy in index order on ties, like the query
+                i = shooting[row]
+                if not row_times[slot] < platform_time[i]:
+                    continue    # Its enemy died this tick, the platform (or nothing) is hit
+                # Projectile.update subtracts once and Enemy.take_damage subtracts again
+                enemies.health[slot] = max(enemies.health[slot] - 2 * damage[i], 0)
+                enemies.bodies[slot].current_health = float(enemies.health[slot])
+                if enemies.health[slot] <= 0:
+                    self.kill_enemy(slot)
+                removed[i] = True
+        batch.keep(~removed)
+
+    def update_enemies(self, dt):
+        """simulation.enemy_step for every awake enemy at once."""
+        batch = self.enemy_batch
+        active = batch.awake & batch.alive
+        if self.paused or not active.any():
+            return
+        x, y, w, h = batch.x, batch.y, batch.w, batch.h
+
+        vx = batch.direction * batch.move_speed
+        # Few enemies actually walk, and move_swept needs the platforms around each one
+        for slot in np.flatnonzero(active & (vx != 0)):
+            body = batch.bodies[slot]
+            body.velocity.x = float(vx[slot])
+            if move_swept(body, float(vx[slot]) * dt, 0.0, self.solids_near):
+                batch.direction[slot] *= -1
+            x[slot], y[slot] = body.pos
+            self.actor_index.move(body)
+
+        at_left = active & (x <= 0)
+        at_right = active & ~at_left & (x >= self.world_width - w)
+        batch.direction[at_left] = 1
+        batch.direction[at_right] = -1
+
+        # Gap detection: turn around when there is no platform under the front foot
+        foot_x = np.where(batch.direction == 1, x + w + 1, x - 1)[:, None]
+        foot_y = (y - 1)[:, None]
+        sx, sy, sw, sh = self.static_near(foot_x[active], foot_y[active], foot_x[active], foot_y[active])
+        ahead = ((sx <= foot_x) & (foot_x <= sx + sw) & (sy <= foot_y) & (foot_y <= sy + sh)).any(axis=1)
+        batch.direction[active & ~ahead] *= -1
+
+        player = self.player
+        px, py, pw, ph = player.rect
+        touching_player = active & ~((x + w < px) | (x > px + pw) | (y + h < py) | (y > py + ph))
+        for slot in np.flatnonzero(touching_player):
+            player.current_health -= float(batch.attack_damage[slot])
+
+        now = self.clock.now()
+        ready = active & ~(now - batch.last_shot < batch.shoot_interval)
+        dx = (px + pw / 2) - (x + w / 2)
+        dy = (py + ph / 2) - (y + h / 2)
+        distance = np.sqrt(dx * dx + dy * dy)
+        for slot in np.flatnonzero(ready & (distance <= 300) & (distance != 0)):
+            batch.last_shot[slot] = now
+            self.spawn_projectile(float(x[slot] + w[slot] / 2), float(y[slot] + h[slot] / 2),
+                                  (float(dx[slot] / distance[slot]), float(dy[slot] / distance[slot])),
+                                  speed=300, damage=10, owner='enemy')
@@ -0,0 +1,642 @@
+"""
+Benchmarks for the game's hot paths. Runs without opening a window.
+Usage:
+    python benchmark.py
+    python benchmark.py --suite -o results.json
+    python benchmark.py --suite --baseline baseline.json --threshold 0.25
+
+Without --suite it exits with 1 when a drop or shot ends differently at 30, 60 and 144 Hz
+(check_tick_rates, tests/test_tick_rates.py plays the same scenarios).
+--suite times a fixed set of cases (see suite_cases) on generated levels of growing size and
+saves them as JSON. With --baseline it exits with 1 when any case got slower than the baseline
+by more than the threshold, so a baseline saved from the main branch gates a change.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import tracemalloc
+import random
+import tempfile
+import time
+from statistics import median
+
+from spatial import SpatialGrid
+from tilemap import merge_quads, build_mesh_data
+from simulation import (LevelSimulation, SimProjectile, ACTIVITY_RADIUS, FIXED_DT, sweep_aabb, player_contacts,
+                        projectile_step, enemy_step)
+from batch import BatchLevelSimulation, HAVE_NUMPY
+from level_data import LEVELS, parse_level_data, parse_level_file, iter_level_records
+from levelpack import compile_level, CompiledLevel
+from levelcheck import validate_level
+from levelcache import LevelCache
+from rendersync import SyncedRect, WriteCounter, health_bar_rect
+from tests.scenarios import (TICK_RATES, drop, drop_in_level, drop_scenarios, shot_in_level, shot_on_time,
+                             shot_scenarios)
+
+FRAME_BUDGET_MS = 1000 / 60
+
+
+class Box:
+    """Stand-in for Platform: only has pos and size, which is all the collision code reads."""
+    def __init__(self, x, y, width, height):
+        self.pos = (x, y)
+        self.size = (width, height)
+
+
+def generate_platforms(count, seed=0):
+    """Generate a level with count platforms laid out on the 40px tile grid."""
+    rng = random.Random(seed)
+    columns = max(1, int(count ** 0.5))
+    platforms = []
+    for i in range(count):
+        x = (i % columns) * 160 + rng.randrange(0, 3) * 40
+        y = (i // columns) * 120 + rng.randrange(0, 2) * 40
+        platforms.append(Box(x, y, 40 * rng.randint(1, 3), 40))
+    return platforms
+
+
+def overlaps(rect, platform):
+    """Same AABB test as BaseLevelContents.check_collisions."""
+    return (rect[0] < platform.pos[0] + platform.size[0] and
+            rect[0] + rect[2] > platform.pos[0] and
+            rect[1] < platform.pos[1] + platform.size[1] and
+            rect[1] + rect[3] > platform.pos[1])
+
+
+def bench_collisions(count, frames=600):
+    """Return (linear scan, grid) average time per frame in milliseconds."""
+    platforms = generate_platforms(count)
+    grid = SpatialGrid(cell_size=40)
+    for platform in platforms:
+        grid.insert(platform)
+
+    # The player walks across the level, one rect per frame
+    rng = random.Random(1)
+    rects = [(rng.uniform(0, 6000), rng.uniform(0, 4000), 40, 40) for _ in range(frames)]
+
+    start = time.perf_counter()
+    for rect in rects:
+        for platform in platforms:
+            overlaps(rect, platform)
+    linear = (time.perf_counter() - start) / frames * 1000
+
+    start = time.perf_counter()
+    for rect in rects:
+        for platform in grid.query(*rect):
+            overlaps(rect, platform)
+    indexed = (time.perf_counter() - start) / frames * 1000
+    return linear, indexed
+
+
+def bench_projectiles(bullet_count, frames=120, platform_count=60, enemy_count=15, dt=1 / 60):
+    """
+    Stress scene: bullet_count bullets flying through a level-3 sized map.
+    Return (linear scan, broad phase) average time per frame in milliseconds.
+    """
+    platforms = generate_platforms(platform_count)
+    enemies = generate_platforms(enemy_count, seed=2)
+    rng = random.Random(3)
+    spawns = [(rng.uniform(0, 1600), rng.uniform(0, 900), rng.choice((-500, 500))) for _ in range(bullet_count)]
+
+    def run(use_index):
+        static = SpatialGrid(cell_size=40)
+        actors = SpatialGrid(cell_size=40)
+        for platform in platforms:
+            static.insert(platform)
+        for enemy in enemies:
+            actors.insert(enemy)
+        bullets = [(Box(x, y, 10, 4), speed) for x, y, speed in spawns]
+        start = time.perf_counter()
+        for _ in range(frames):
+            for bullet, speed in bullets:
+                bullet.pos = (bullet.pos[0] + speed * dt, bullet.pos[1])
+                rect = (bullet.pos[0], bullet.pos[1], 10, 4)
+                if use_index:
+                    near_platforms = static.query(*rect)
+                    near_enemies = actors.query(*rect)
+                else:
+                    near_platforms = platforms
+                    near_enemies = enemies
+                for platform in near_platforms:
+                    overlaps(rect, platform)
+                for enemy in near_enemies:
+                    overlaps(rect, enemy)
+            for enemy in enemies:
+                actors.move(enemy)
+        return (time.perf_counter() - start) / frames * 1000
+
+    return run(False), run(True)
+
+
+def bench_tilemap(tile_count, textures=3, repeat=20):
+    """
+    Generated level with tile_count 40px tiles spread over a few textures.
+    Return (platform count, draw calls with the tile map, vertex floats, ms to build the meshes).
+    Before the tile map every platform was one widget and one draw call.
+    """
+    rng = random.Random(4)
+    quads = {}
+    tiles = 0
+    row = 0
+    while tiles < tile_count:
+        # Rows of platform pieces, some of them touching so merge_quads has work to do
+        x = 0
+        while x < 4000 and tiles < tile_count:
+            tiles_x = min(rng.randint(1, 4), tile_count - tiles)
+            quads.setdefault(rng.randrange(textures), []).append((x, row * 80, tiles_x * 40, 40, tiles_x, 1))
+            tiles += tiles_x
+            x += tiles_x * 40 + rng.choice((0, 0, 40))
+        row += 1
+    platform_count = sum(len(q) for q in quads.values())
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        meshes = [mesh for q in quads.values() for mesh in build_mesh_data(merge_quads(q))]
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    vertex_floats = sum(len(vertices) for vertices, _ in meshes)
+    return platform_count, len(meshes), vertex_floats, elapsed
+
+
+def generate_level(enemy_count, width=40000, seed=5):
+    """Level data (see level_data.py) with one long ground and enemy_count enemies spread along it."""
+    rng = random.Random(seed)
+    return {
+        'spawn_point': [(100, 40)],
+        'ground': [(0, 0, width // 40, 1)],
+        'platform': [],
+        'enemy': [(rng.randrange(0, width - 40), 40) for _ in range(enemy_count)],
+        'artifact': [],
+        'exit': [],
+    }
+
+
+def bench_activity(enemy_count, ticks=600):
+    """Return (every enemy awake, activity regions) average time per tick in milliseconds."""
+    data = generate_level(enemy_count)
+
+    def run(radius):
+        sim = LevelSimulation(data, world_width=40000)
+        sim.activity.radius = radius
+        sim.update_activity()
+        start = time.perf_counter()
+        sim.run(ticks, lambda sim: ('right',))
+        return (time.perf_counter() - start) / sim.tick_count * 1000, sim.activity.stats()
+
+    everyone, _ = run(10 ** 9)     # Wakes the whole level
+    regions, stats = run(ACTIVITY_RADIUS)
+    return everyone, regions, stats
+
+
+def bench_backends(enemy_count, ticks=300):
+    """
+    Every enemy awake and within shooting range of an invincible player.
+    Return (object path, numpy path or None without numpy) average time per tick in milliseconds.
+    """
+    data = generate_level(enemy_count, width=1200)
+
+    def run(simulation_class):
+        sim = simulation_class(data, world_width=1200)
+        sim.activity.radius = 10 ** 9
+        sim.update_activity()
+        sim.player.health = sim.player.current_health = float('inf')
+        start = time.perf_counter()
+        sim.run(ticks, lambda sim: ('spacebar',))
+        return (time.perf_counter() - start) / ticks * 1000
+
+    return run(LevelSimulation), run(BatchLevelSimulation) if HAVE_NUMPY else None
+
+
+def generate_level_text(count, seed=0):
+    """custom.txt style level with count objects: platforms, traps, enemies, artifacts and exits."""
+    rng = random.Random(seed)
+    columns = max(1, int(count ** 0.5))
+    lines = {'platform': [], 'death_trap': [], 'enemy': [], 'artifact': [], 'exit': []}
+    kinds = list(lines)
+    for i in range(count):
+        x, y = (i % columns) * 160, (i // columns) * 120
+        kind = kinds[0] if i % 4 else rng.choice(kinds)
+        if kind in ('platform', 'death_trap'):
+            lines[kind].append(f"({x}, {y}, {rng.randrange(1, 4)}, 1)")
+        else:
+            lines[kind].append(f"({x}, {y + 40})")
+    return '\n'.join(f"{kind}:\n" + '\n'.join(rows) for kind, rows in lines.items()) + '\nspawn_point:\n(40, 40)\n'
+
+
+def bench_level_load(count):
+    """
+    Load a count-object level into a LevelSimulation (static objects + spatial index + enemies).
+    Return (text ms, compiled ms, text size, compiled size): custom.txt parsed as the game does,
+    against the compiled file memory-mapped by levelpack.
+    """
+    text = generate_level_text(count)
+    with tempfile.TemporaryDirectory() as folder:
+        text_path = os.path.join(folder, 'level.txt')
+        level_path = os.path.join(folder, 'level.lvl')
+        with open(text_path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        compile_level(parse_level_data(text), level_path)
+
+        start = time.perf_counter()
+        LevelSimulation(parse_level_file(text_path))
+        from_text = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        level = CompiledLevel(level_path)
+        sim = LevelSimulation(level)
+        from_compiled = (time.perf_counter() - start) * 1000
+        del sim
+        level.close()
+        return from_text, from_compiled, os.path.getsize(text_path), os.path.getsize(level_path)
+
+
+def bench_validation(count):
+    """Return (ms to validate a count-object custom.txt, errors found). No widgets are built."""
+    text = generate_level_text(count)
+    start = time.perf_counter()
+    errors = validate_level(text)
+    return (time.perf_counter() - start) * 1000, len(errors)
+
+
+def bench_parse(count):
+    """
+    Stream a count-object custom.txt from disk. Return (file size, records per second,
+    peak KiB streaming the records, peak KiB reading the whole file and parsing it into level data).
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'level.txt')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(generate_level_text(count))
+
+        def stream():
+            with open(path, 'r', encoding='utf-8') as file:
+                return sum(1 for record in iter_level_records(file) if record.values is not None)
+
+        def whole():
+            with open(path, 'r', encoding='utf-8') as file:
+                return parse_level_data(file.read())
+
+        start = time.perf_counter()
+        records = stream()
+        rate = records / (time.perf_counter() - start)
+        peaks = []
+        for run in (stream, whole):
+            tracemalloc.start()
+            run()
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+        return os.path.getsize(path), rate, peaks[0], peaks[1]
+
+
+def bench_level_cache(count):
+    """
+    Load a count-object custom.txt through LevelCache. Return ms for (first load, same file again,
+    file touched but unchanged, fresh cache with the compiled copy on disk) and the final stats.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'custom.txt')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(generate_level_text(count))
+        cache_dir = os.path.join(folder, 'cache')
+        cache = LevelCache(cache_dir)
+
+        def timed(load):
+            start = time.perf_counter()
+            data, errors = load(path)
+            assert data is not None, errors
+            return (time.perf_counter() - start) * 1000
+
+        first = timed(cache.load)
+        again = timed(cache.load)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        touched = timed(cache.load)
+        from_disk = timed(LevelCache(cache_dir).load)
+        stats = cache.stats()
+        cache.entries.clear()   # Unmaps the compiled copy before the folder is removed
+        return first, again, touched, from_disk, stats
+
+
+class Instruction:
+    """Stand-in for a Kivy Rectangle: only has the attributes the entities write."""
+    def __init__(self, pos=(0, 0), size=(0, 0)):
+        self.pos = pos
+        self.size = size
+        self.texture = None
+
+
+def bench_canvas_writes(level=3, ticks=1800, seed=0):
+    """
+    Play a level headless with the random policy, one tick per frame. Return (frames, writes per frame
+    with the old pos bindings, writes per frame with SyncedRect) for the player, enemy and projectile
+    rects and health bars. A binding fired on every pos change and wrote pos and size of both the rect
+    and the health bar; SyncedRect only writes the values that changed.
+    """
+    from simulate import RandomPolicy
+    sim = LevelSimulation(LEVELS[level])
+    policy = RandomPolicy(seed)
+    counter = WriteCounter()
+    bound = 0
+    synced = {}     # id(body) -> (rect, health bar or None)
+    last = {}       # id(body) -> (pos, health) last frame
+
+    def health(body):
+        return getattr(body, 'health', getattr(body, 'current_health', None))
+
+    frames = 0
+    while sim.outcome is None and frames < ticks:
+        sim.keys_pressed = set(policy(sim))
+        sim.fixed_step.run_ticks(1)
+        frames += 1
+        bodies = [(sim.player, True)] + [(e, True) for e in sim.enemies] + [(p, False) for p in sim.projectiles]
+        for body, has_bar in bodies:
+            key = id(body)
+            pos, hp = tuple(body.pos), health(body)
+            if key not in synced:
+                rect = SyncedRect(Instruction(), counter)
+                bar = SyncedRect(Instruction(), counter) if has_bar else None
+                synced[key] = rect, bar
+                bound += 4 if has_bar else 2    # New widget, drawn once either way
+            elif last[key][0] != pos:
+                bound += 4 if has_bar else 2
+            elif has_bar and last[key][1] != hp:
+                bound += 2  # take_damage redrew the health bar
+            rect, bar = synced[key]
+            rect.set(pos, tuple(body.size))
+            if bar is not None:
+                bar.set(*health_bar_rect(*body.rect, hp, 100 if body is sim.player else body.max_health))
+            last[key] = pos, hp
+    return frames, bound / frames, counter.take() / frames
+
+
+def check_tick_rates(scenarios=300, seed=0):
+    """
+    Property check, the same scenarios as tests/test_tick_rates.py: random drops onto 10px traps /
+    40px platforms and random shots at walls and enemies, each played at every rate in TICK_RATES.
+    Return (scenarios, swept mismatches, overlap mismatches, shot mismatches). A drop mismatches when
+    it doesn't end at the same position at every rate, a shot when it misses or hits on another tick
+    than the one its time of impact falls in. Overlap is the old move-then-push-out resolution, kept
+    for comparison.
+    """
+    swept_mismatches = overlap_mismatches = shot_mismatches = 0
+    for x, start_y, row, kind in drop_scenarios(scenarios, seed):
+        if len({drop_in_level(rate, x, start_y, row, kind) for rate in TICK_RATES}) != 1:
+            swept_mismatches += 1
+        height = 40 if kind == 'ground' else LevelSimulation.TRAP_TILE_HEIGHT
+        platform = (row[0], row[1], 40 * row[2], height)
+        if len({drop(rate, start_y, platform, swept=False, x=x) for rate in TICK_RATES}) != 1:
+            overlap_mismatches += 1
+    for x, speed, target_x, kind, impact in shot_scenarios(scenarios, seed):
+        for rate in TICK_RATES:
+            tick, hit = shot_in_level(rate, x, speed, target_x, kind)
+            if hit != kind or not shot_on_time(rate, tick, impact):
+                shot_mismatches += 1
+                break
+    return scenarios, swept_mismatches, overlap_mismatches, shot_mismatches
+
+
+SUITE_SIZES = (1000, 10000, 50000)
+DEFAULT_THRESHOLD = 0.25    # 25% slower than the baseline fails
+
+
+def time_case(run, setup=None, repeat=5, number=1):
+    """
+    Best and median ms per call of run(state) over repeat rounds of number calls.
+    state comes from setup(), called before every round and not timed.
+    """
+    run(setup() if setup else None)     # Warm up caches (and the spatial grids' cells)
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        gc.collect()    # Every round starts with the same garbage, i.e. none
+        start = time.perf_counter()
+        for _ in range(number):
+            run(state)
+        times.append((time.perf_counter() - start) * 1000 / number)
+    return min(times), median(times)
+
+
+def suite_simulation(data):
+    """
+    LevelSimulation with every enemy awake and nothing able to die, so the cases below can
+    run again and again on the same simulation.
+    """
+    sim = LevelSimulation(data, world_width=10 ** 6)
+    sim.activity.radius = 10 ** 9
+    sim.update_activity()
+    sim.player.health = sim.player.current_health = float('inf')
+    for enemy in sim.enemies:
+        enemy.current_health = float('inf')
+    return sim
+
+
+def suite_cases(sizes):
+    """
+    Yield (name, run, setup, number) for every case. The game code needs a window, so its
+    rules are timed headless, on a LevelSimulation: player_contacts, projectile_step and enemy_step.
+    """
+    rng = random.Random(6)
+    for number, level in sorted(LEVELS.items()):
+        yield f"level_build/level_{number}", lambda state, level=level: LevelSimulation(level), None, 100
+
+    for count in sizes:
+        text = generate_level_text(count)
+        data = parse_level_data(text)
+        sim = suite_simulation(data)
+        solids = [p for p in sim.platforms if p.kind in ('platform', 'death_trap')]
+        spots = [rng.choice(solids) for _ in range(500)]
+
+        yield f"parse_level_data/{count}", lambda state, text=text: parse_level_data(text), None, 1
+        yield f"level_build/{count}", lambda state, data=data: LevelSimulation(data), None, 1
+
+        def collisions(state, sim=sim, spots=spots):
+            # The player lands half inside a platform, so every call pushes it out again
+            player = sim.player
+            for spot in spots:
+                player.pos = (spot.pos[0], spot.pos[1] + spot.size[1] - 20)
+                player_contacts(sim)
+            sim.outcome = None
+        yield f"check_collisions/{count}", collisions, None, 1
+
+        def shots(sim=sim, spots=spots):
+            # Half of them shot by the player (tested against enemies), half by enemies
+            sim.projectiles = [SimProjectile(spot.pos[0] - 30, spot.pos[1] + 10, (1, 0), 500, 10,
+                                             'player' if i % 2 else 'enemy') for i, spot in enumerate(spots)]
+
+        def projectiles(state, sim=sim):
+            for proj in list(sim.projectiles):
+                projectile_step(proj, FIXED_DT, sim)
+        yield f"projectile_update/{count}", projectiles, shots, 1
+
+        def enemies(state, sim=sim):
+            for enemy in list(sim.enemies):
+                enemy_step(enemy, FIXED_DT, sim)
+            sim.projectiles.clear()
+            sim.clock.advance(FIXED_DT)
+        yield f"enemy_update/{len(sim.enemies)}_enemies", enemies, None, 1
+
+
+def texture_case():
+    """(name, run) decoding every sprite with Kivy's image loader, or (name, reason) without Kivy."""
+    name = "texture_decode/sprites"
+    os.environ.setdefault('KIVY_NO_ARGS', '1')  # Kivy would read our command line otherwise
+    try:
+        from kivy.core.image import ImageLoader
+    except ImportError as e:
+        return name, f"needs Kivy ({e})"
+    paths = [os.path.join(folder, file) for folder, _, files in os.walk(os.path.join('assets', 'sprites'))
+             for file in sorted(files) if file.endswith('.png')]
+    # Decoding only (what TextureCache.decode does on the loader thread), uploading needs a GL context
+    return name, lambda state: [ImageLoader.load(path) for path in paths]
+
+
+def run_suite(sizes=SUITE_SIZES, repeat=5):
+    """Time every case. Returns the JSON-able report."""
+    results = {}
+    skipped = {}
+    cases = list(suite_cases(sizes))
+    name, run = texture_case()
+    if callable(run):
+        cases.append((name, run, None, 1))
+    else:
+        skipped[name] = run
+    for name, run, setup, number in cases:
+        best, middle = time_case(run, setup, repeat=repeat, number=number)
+        results[name] = {'ms': round(best, 4), 'median_ms': round(middle, 4)}
+        print(f"{name:>32} {best:>10.3f} ms")
+    for name, reason in skipped.items():
+        print(f"{name:>32} skipped, {reason}")
+    return {
+        'meta': {'python': platform.python_version(), 'machine': platform.platform(),
+                 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'sizes': list(sizes), 'repeat': repeat},
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    (name, baseline ms, ms, ratio) for every case in both reports, and the ones slower than
+    the baseline by more than threshold. Cases only in one of them are left out.
+    """
+    rows = []
+    for name, result in report['results'].items():
+        before = baseline['results'].get(name)
+        if before is None or not before['ms']:
+            continue
+        rows.append((name, before['ms'], result['ms'], result['ms'] / before['ms']))
+    return rows, [row for row in rows if row[3] > 1 + threshold]
+
+
+def suite_main(args):
+    report = run_suite(args.sizes, args.repeat)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"Wrote {args.output}")
+    if not args.baseline:
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    rows, regressions = compare(report, baseline, args.threshold)
+    print(f"\nAgainst {args.baseline} (fails above +{args.threshold:.0%})")
+    print(f"{'case':>32} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, before, now, ratio in rows:
+        flag = '  SLOWER' if ratio > 1 + args.threshold else ''
+        print(f"{name:>32} {before:>10.3f} {now:>10.3f} {ratio - 1:>+8.0%}{flag}")
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the game's hot paths headless.")
+    parser.add_argument('--suite', action='store_true', help="run the regression suite instead of the tables")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SUITE_SIZES, help="generated level sizes (objects)")
+    parser.add_argument('--repeat', type=int, default=5, help="rounds per case, the best one counts")
+    parser.add_argument('-o', '--output', help="save the suite results as JSON")
+    parser.add_argument('--baseline', help="suite results to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown against the baseline, 0.25 = 25%%")
+    args = parser.parse_args(argv)
+    if args.suite:
+        return suite_main(args)
+
+    print("check_collisions, ms per frame")
+    print(f"{'platforms':>10} {'linear':>10} {'grid':>10}")
+    for count in (100, 1000, 10000):
+        linear, indexed = bench_collisions(count)
+        print(f"{count:>10} {linear:>10.4f} {indexed:>10.4f}")
+
+    print(f"\nProjectile stress scene, ms per frame (budget {FRAME_BUDGET_MS:.1f} ms)")
+    print(f"{'bullets':>10} {'linear':>10} {'grid':>10} {'in budget':>10}")
+    for count in (100, 300, 1000):
+        linear, indexed = bench_projectiles(count)
+        print(f"{count:>10} {linear:>10.4f} {indexed:>10.4f} {str(indexed < FRAME_BUDGET_MS):>10}")
+
+    print("\nTile map, static layer of a generated level (built once at level load)")
+    print(f"{'tiles':>10} {'platforms':>10} {'draw calls':>10} {'floats':>10} {'build ms':>10}")
+    for count in (500, 5000):
+        platforms, draw_calls, floats, elapsed = bench_tilemap(count)
+        print(f"{count:>10} {platforms:>10} {draw_calls:>10} {floats:>10} {elapsed:>10.3f}")
+
+    print(f"\nActivity regions, headless ms per tick (radius {ACTIVITY_RADIUS}px)")
+    print(f"{'enemies':>10} {'all awake':>10} {'regions':>10} {'awake':>10} {'woken':>10} {'slept':>10}")
+    for count in (15, 200, 1000):
+        everyone, regions, stats = bench_activity(count)
+        print(f"{count:>10} {everyone:>10.4f} {regions:>10.4f} "
+              f"{stats['awake']:>10} {stats['woken']:>10} {stats['slept']:>10}")
+
+    print("\nLevel load into a simulation, ms (custom.txt text vs compiled .lvl)")
+    print(f"{'objects':>10} {'text':>10} {'compiled':>10} {'txt bytes':>10} {'lvl bytes':>10}")
+    for count in (1000, 100000):
+        from_text, from_compiled, text_size, level_size = bench_level_load(count)
+        print(f"{count:>10} {from_text:>10.1f} {from_compiled:>10.1f} {text_size:>10} {level_size:>10}")
+
+    print("\nStreaming custom.txt parser")
+    print(f"{'objects':>10} {'MB':>8} {'records/s':>12} {'stream KiB':>12} {'whole KiB':>12}")
+    for count in (10000, 200000):
+        size, rate, stream_peak, whole_peak = bench_parse(count)
+        print(f"{count:>10} {size / 1e6:>8.2f} {rate:>12.0f} {stream_peak:>12.0f} {whole_peak:>12.0f}")
+
+    print("\nCustom level cache, ms per load of a 50k object custom.txt")
+    first, again, touched, from_disk, stats = bench_level_cache(50000)
+    print(f"{'first':>10} {'unchanged':>10} {'touched':>10} {'from disk':>10}")
+    print(f"{first:>10.1f} {again:>10.3f} {touched:>10.1f} {from_disk:>10.1f}   {stats}")
+
+    print("\ncustom.txt validation (levelcheck.py)")
+    print(f"{'objects':>10} {'ms':>10} {'us/object':>10} {'errors':>10}")
+    for count in (1000, 50000):
+        elapsed, errors = bench_validation(count)
+        print(f"{count:>10} {elapsed:>10.1f} {elapsed * 1000 / count:>10.2f} {errors:>10}")
+
+    scenarios, swept, overlap, shots = check_tick_rates()
+    rates = '/'.join(str(rate) for rate in TICK_RATES)
+    print(f"\nSame result at {rates} Hz, {scenarios} random scenarios (mismatches, swept ones must be 0)")
+    print(f"{'drop, swept':>22} {swept:>6}")
+    print(f"{'drop, overlap (old)':>22} {overlap:>6}")
+    print(f"{'shots, swept':>22} {shots:>6}")
+
+    print("\nCanvas writes per frame (player, enemies and projectiles, random input)")
+    print(f"{'level':>10} {'frames':>10} {'bindings':>10} {'synced':>10}")
+    for level in (1, 2, 3):
+        frames, bound, synced = bench_canvas_writes(level)
+        print(f"{level:>10} {frames:>10} {bound:>10.2f} {synced:>10.2f}")
+
+    print("\nEnemy/projectile update backends, headless ms per tick (every enemy awake)")
+    print(f"{'enemies':>10} {'objects':>10} {'numpy':>10}")
+    for count in (10, 100, 1000):
+        objects, vectorized = bench_backends(count)
+        vectorized = f"{vectorized:>10.4f}" if vectorized is not None else f"{'no numpy':>10}"
+        print(f"{count:>10} {objects:>10.4f} {vectorized}")
+
+    if swept or shots:
+        print("\nCollisions depend on the tick rate again, see tests/test_tick_rates.py")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,40 @@
+"""Scrolling camera over the level's world coordinates."""
+
+
+class Camera:
+    """
+    The part of the world shown on screen. (x, y) is the world position of the
+    bottom-left corner of the screen, (width, height) is the window size.
+    Objects within `margin` pixels of the view still count as visible, so enemies
+    wake up a little before they scroll in.
+    """
+    def __init__(self, width, height, margin=120):
+        self.x = 0
+        self.y = 0
+        self.width = width
+        self.height = height
+        self.margin = margin
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+
+    def follow(self, target_x, target_y, world_width, world_height):
+        """Center the view on the target point without showing anything outside the world."""
+        self.x = min(max(target_x - self.width / 2, 0), max(world_width - self.width, 0))
+        self.y = min(max(target_y - self.height / 2, 0), max(world_height - self.height, 0))
+
+    def covers(self, world_width, world_height):
+        """True when the whole world fits in the view, so nothing can be culled."""
+        return world_width <= self.width and world_height <= self.height
+
+    def visible(self, x, y, width, height, margin=None):
+        """True if the rectangle overlaps the view grown by margin."""
+        if margin is None:
+            margin = self.margin
+        return (x < self.x + self.width + margin and x + width > self.x - margin and
+                y < self.y + self.height + margin and y + height > self.y - margin)
+
+    def to_world(self, x, y):
+        """Convert a window position (touch, mouse) to world coordinates."""
+        return x + self.x, y + self.y
@@ -3,10 +3,12 @@ from kivy.core.window import Window
 from kivy.uix.screenmanager import Screen, ScreenManager
 from kivy.graphics import Rectangle, Color
 from utils import resource_path
+from level_data import LEVEL_1
 from kivy.clock import Clock
 
 from level_class import (Player, Platform, BaseLevelContents, Artifact,
-                         Enemy, PuzzleComponent, PlaceHolder, DeathTrap, SoundManager, LevelExit)
+                         Enemy, PuzzleComponent, PlaceHolder, DeathTrap, SoundManager, LevelExit, TextureCache,
+                         LevelLoader)
 
 
 class Level_1_Class(Screen):
@@ -21,6 +23,7 @@ class Level_1_Class(Screen):
         super().__init__(**kwargs)
         self.level_contents = None
         self.update_event = None
+        self.loader = None          # LevelLoader while the level is being built
         self.initialized = False    # Flag to ensure the level is initialized only once
 
     # Overriding Kivy-defined on_enter
@@ -40,9 +43,14 @@ class Level_1_Class(Screen):
         print("Entering level 1, press Q to exit")
         if not self.initialized:
             SoundManager.play_music("level_1")
-            self.level_contents = LevelContents()
-            self.add_widget(self.level_contents)
+            # Built over several frames behind a progress bar, start_level runs once it's done
+            if self.loader:     # Only one copy of the level may be loading
+                self.loader.cancel()
+            self.loader = LevelLoader(self, lambda prepared: LevelContents(deferred=True), LevelContents.texture_paths(),
+                                      on_done=self.start_level)
+            self.loader.start()
             self.initialized = True
+            return
         else:
             # Reset puzzle states when re-entering level
             if hasattr(self.level_contents, 'puzzles'):
@@ -58,12 +66,24 @@ class Level_1_Class(Screen):
 
              # Restore keyboard input if re-entering
             self.level_contents.player.setup_keyboard()
+        self.start_level()
+
+    def start_level(self, level_contents=None):
+        """Start updating the level. level_contents is the newly built level, from LevelLoader."""
+        if level_contents is not None:
+            self.loader = None
+            self.level_contents = level_contents
+            self.add_widget(level_contents)
         # Frame rate: 60FPS
         self.update_event = Clock.schedule_interval(self.level_contents.update, 1/60)
     
     # Overriding Kivy-defined on_leave
     def on_leave(self, *args):
         print("Leaving level 1 ")
+        if self.loader:     # Left before the level finished loading
+            self.loader.cancel()
+            self.loader = None
+            self.initialized = False
         if hasattr(self, 'level_contents') and self.level_contents:
             
             if (hasattr(self.level_contents, 'active_puzzle_popup') and 
@@ -80,26 +100,35 @@ class Level_1_Class(Screen):
         if self.update_event:
             self.update_event.cancel()
             self.update_event = None
+        TextureCache.evict_unused()    # Drop textures of levels that were thrown away
     def reset_level(self):
         self.on_leave()
         """Reset the level to its initial state"""
         if self.level_contents:
+            self.level_contents.dispose()
             self.remove_widget(self.level_contents)
         self.level_contents = None
         self.initialized = False
         self.on_enter()  # Re-initialize the level
 
 class LevelContents(BaseLevelContents):
-    def __init__(self, **kwargs):
+    LEVEL = '1'
+    TEXTURES = ('assets/sprites/PixelTexturePack/Textures/Rocks/GOLDROCKS.png',
+                'assets/sprites/PixelTexturePack/Textures/Elements/SAND.png',
+                'assets/sprites/Characters/Enemy.png',
+                'assets/sprites/Artifacts/DOUBLE_JUMP.png')
+
+    def __init__(self, deferred=False, **kwargs):
         super().__init__(**kwargs)
-        self.player = Player(x=40, y=40, width=40, height=40)
+        self.data = LEVEL_1
+        x, y = LEVEL_1['spawn_point'][0]
+        self.player = Player(x=x, y=y, width=40, height=40)
         self.paused = False     # Flag to stop game
         self.active_puzzle_popup = None
         self.artifact = None
 
-        # Lists for bullets, particles, enemies
+        # Lists for bullets, enemies (particles are in self.particle_system)
         self.projectiles = []
-        self.particles = []
         self.platforms = []
         self.enemies = []
         self.puzzles = []
@@ -107,66 +136,41 @@ class LevelContents(BaseLevelContents):
         self.add_widget(self.player)
 
         self.entities.append(self.player)
-        self.create_platform()
-        self.create_puzzle()
-        self.create_enemy()
-        self.create_artifact()
-        self.create_exit()
+        if not deferred:    # Otherwise LevelLoader runs load_steps over several frames
+            self.load()
+
+    def load_steps(self):
+        yield from self.create_platform()
+        yield from self.create_puzzle()
+        yield from self.create_enemy()
+        yield from self.create_artifact()
+        yield from self.create_exit()
+        yield from super().load_steps()
 
     def create_platform(self):
         # Create all platforms for this level
+        x, y, num_tiles_x, num_tiles_y = LEVEL_1['ground'][0]
         ground = Platform(
-            x=0, y=0,
-            num_tiles_x=100,
-            num_tiles_y=1,
-            texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Rocks/GOLDROCKS.png')
+            x=x, y=y,
+            num_tiles_x=num_tiles_x,
+            num_tiles_y=num_tiles_y,
+            texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Rocks/GOLDROCKS.png'),
+            draw=False
         )
-        self.platforms.append(ground)
-        self.add_widget(ground)
+        self.add_platform(ground)
+        yield
 
         # Floating platforms
-        platforms_data = [
-            (160, 80, 2, 1),
-            (440, 80 * 2, 2, 1),
-            (160, 80 * 3, 2, 1),
-            (440, 80 * 4, 2, 1),
-            (160, 80 * 5, 2, 1),
-            (440, 80 * 6, 2, 1),
-
-            (560, 40, 1, 14),
-            (640, 120, 1, 14),
-
-            (160 + 600, 80, 2, 1),
-            (440 + 600, 80 * 2, 2, 1),
-            (160 + 600, 80 * 3, 2, 1),
-            (440 + 600, 80 * 4, 2, 1),
-            (160 + 600, 80 * 5, 2, 1),
-            (440 + 600, 80 * 6, 2, 1),
-            (160 + 600, 80 * 7, 2, 1),
-
-            (0, 120 + 40 * 14, 16, 1),
-
-            (160, 760, 2, 1),
-            (440, 840, 2, 1),
-            (440 + 320, 840, 2, 1),
-            (440 + 320 * 2, 840, 2, 1),
-
-            (440 + 400 * 2, 40, 1, 22)
-        ]
+        platforms_data = LEVEL_1['platform']
 
         for x, y, num_tiles_x, num_tiles_y in platforms_data:
             platform = Platform(x, y, num_tiles_x, num_tiles_y,
-                                texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Elements/SAND.png'))
-            self.platforms.append(platform)
-            self.add_widget(platform)
+                                texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Elements/SAND.png'), draw=False)
+            self.add_platform(platform)
+            yield
 
     def create_enemy(self):
-        enemy_data = [
-            (480, 520),
-            (1200, 40),
-            (640, 680),
-            (1500, 40)
-        ]
+        enemy_data = LEVEL_1['enemy']
 
         for x, y in enemy_data:
             enemy = Enemy(x=x, y=y, width=40, height=40,
@@ -174,58 +178,43 @@ class LevelContents(BaseLevelContents):
             self.enemies.append(enemy)
             self.entities.append(enemy)
             self.add_widget(enemy)
+            yield
 
     def create_artifact(self):
-        artifact_data = (700, 40)
-        artifact = Artifact(name="sky rocket",x=artifact_data[0],y = artifact_data[1],  width=40, height=40,
+        artifact_data = LEVEL_1['artifact'][0]
+        artifact = Artifact(name=LEVEL_1['artifact_name'],x=artifact_data[0],y = artifact_data[1],  width=40, height=40,
                             texture_path=resource_path('assets/sprites/Artifacts/DOUBLE_JUMP.png'))
         # self.artifact = artifact
         self.platforms.append(artifact) # Workaround for collision checking
         self.add_widget(artifact)
+        yield
 
     def create_puzzle(self):
-        for puzzle in PuzzleComponent.get_puzzles_for_level(1):  
-            puzzle.level_ref = self  # So puzzle can check enemies when failed
-            self.puzzles.append(puzzle)
-            self.add_widget(puzzle)
+        for puzzle in PuzzleComponent.get_puzzles_for_level(1, self.rng):  
+            self.add_puzzle(puzzle)
+            yield
 
     def create_exit(self):
-        exit_pos = (1280, 40)
+        exit_pos = LEVEL_1['exit'][0]
         exit = LevelExit(x=exit_pos[0], y=exit_pos[1])
         self.platforms.append(exit)
         self.add_widget(exit)
+        yield
 
-    def update(self, dt):
+    def step(self, dt):
+        """One fixed simulation tick. Called by BaseLevelContents.update."""
         if self.paused:  # if pause → no process
             return
-        # Process keyboard input for movement
-        self.player.process_input()
-
-        # update proj
-        for proj in self.projectiles:
-            proj.update(dt, self)
-
-        # update enemy
-        for enemy in self.enemies:
-            if isinstance(enemy, PlaceHolder):
-                continue
-            enemy.update(dt, self.player, self.platforms, self)
-
-        # Physics and collision checks
-        self.check_collisions()
-        self.player.update(dt)
-        # Update artifacts
-        for artifact in self.platforms:
-            if isinstance(artifact, Artifact):
-                artifact.pick_up(self.player)
-        # Update inventory effects
-        self.player.apply_inventory_effects()
+        profiler = self.profiler    # Per-phase timings, see profiler.py
+
+        # Input, projectiles, enemies, collisions, player, artifacts: the game rules in simulation.py
+        super().step(dt)
 
         # Update puzzle state; remove if solved
-        for puzzle in self.puzzles[:]:
-            if isinstance(puzzle, PlaceHolder):
-                continue
-            puzzle.update()
-            if puzzle.solved:
-                self.remove_widget(puzzle)
-                self.puzzles.remove(puzzle)
\ No newline at end of file
+        with profiler.phase('puzzles'):
+            for puzzle in self.puzzles[:]:
+                if isinstance(puzzle, PlaceHolder):
+                    continue
+                puzzle.update()
+                if puzzle.solved:
+                    self.remove_puzzle(puzzle)
@@ -4,9 +4,11 @@ from kivy.uix.screenmanager import Screen, ScreenManager
 from kivy.graphics import Rectangle, Color
 from kivy.clock import Clock
 from utils import resource_path
+from level_data import LEVEL_2
 
 from level_class import (Player, Platform, BaseLevelContents, Artifact, Enemy,
-                         PuzzleComponent, PlaceHolder, DeathTrap, SoundManager, LevelExit)
+                         PuzzleComponent, PlaceHolder, DeathTrap, SoundManager, LevelExit, TextureCache,
+                         LevelLoader)
 
 class Level_2_Class(Screen):
     """
@@ -20,6 +22,7 @@ class Level_2_Class(Screen):
         super().__init__(**kwargs)
         self.level_contents = None
         self.update_event = None
+        self.loader = None          # LevelLoader while the level is being built
         self.initialized = False    # Flag to ensure the level is initialized only once
 
     # Overriding Kivy-defined on_enter
@@ -49,9 +52,14 @@ class Level_2_Class(Screen):
         # Initialize level
         print("Entering level 2, press Q to exit")
         if not self.initialized: 
-            self.level_contents = LevelContents()
-            self.add_widget(self.level_contents)
+            # Built over several frames behind a progress bar, start_level runs once it's done
+            if self.loader:     # Only one copy of the level may be loading
+                self.loader.cancel()
+            self.loader = LevelLoader(self, lambda prepared: LevelContents(deferred=True), LevelContents.texture_paths(),
+                                      on_done=self.start_level)
+            self.loader.start()
             self.initialized = True
+            return
         else:
             # Reset puzzle states when re-entering level
             if hasattr(self.level_contents, 'puzzles'):
@@ -66,12 +74,24 @@ class Level_2_Class(Screen):
                 self.level_contents.active_puzzle_popup = None
             # Restore keyboard input if re-entering
             self.level_contents.player.setup_keyboard()
+        self.start_level()
+
+    def start_level(self, level_contents=None):
+        """Start updating the level. level_contents is the newly built level, from LevelLoader."""
+        if level_contents is not None:
+            self.loader = None
+            self.level_contents = level_contents
+            self.add_widget(level_contents)
         # Frame rate: 60FPS
         self.update_event = Clock.schedule_interval(self.level_contents.update, 1/60)
     
     # Overriding Kivy-defined on_leave
     def on_leave(self, *args):
         print("Leaving level 2 ")
+        if self.loader:     # Left before the level finished loading
+            self.loader.cancel()
+            self.loader = None
+            self.initialized = False
         if hasattr(self, 'level_contents') and self.level_contents:
             if (hasattr(self.level_contents, 'active_puzzle_popup') and 
                 self.level_contents.active_puzzle_popup and
@@ -87,11 +107,13 @@ class Level_2_Class(Screen):
         if self.update_event:
             self.update_event.cancel()
             self.update_event = None
+        TextureCache.evict_unused()    # Drop textures of levels that were thrown away
 
     def reset_level(self):
         self.on_leave()
         """Reset the level to its initial state"""
         if self.level_contents:
+            self.level_contents.dispose()
             self.remove_widget(self.level_contents)
         self.level_contents = None
         self.initialized = False
@@ -103,186 +125,114 @@ class Level_2_Class(Screen):
         self.bg_rect.size = instance.size
 
 class LevelContents(BaseLevelContents):
-    def __init__(self, **kwargs):
+    LEVEL = '2'
+    TEXTURES = ('assets/sprites/PixelTexturePack/Textures/Elements/BIGLEAVES.png',
+                'assets/sprites/Spikes/four_Conjoined_Spikes.png',
+                'assets/sprites/PixelTexturePack/Textures/Wood/WOODA.png',
+                'assets/sprites/Characters/Enemy.png',
+                'assets/sprites/Artifacts/HEALTH.png')
+
+    def __init__(self, deferred=False, **kwargs):
         super().__init__(**kwargs)
-        self.player = Player(x=10, y=40, width=40, height=40)
+        self.data = LEVEL_2
+        x, y = LEVEL_2['spawn_point'][0]
+        self.player = Player(x=x, y=y, width=40, height=40)
         self.paused = False     # Flag to stop game
         self.active_puzzle_popup = None
         
-        # Lists for bullets, particles, enemies
+        # Lists for bullets, enemies (particles are in self.particle_system)
         self.projectiles = []
-        self.particles = []
         self.platforms = []
         self.enemies = []
         self.puzzles = []
         self.add_widget(self.player)
+        if not deferred:    # Otherwise LevelLoader runs load_steps over several frames
+            self.load()
 
-        self.create_platform()
-        self.create_puzzle()
-        self.create_enemy()
-        self.create_artifact()
-        self.create_exit()
+    def load_steps(self):
+        yield from self.create_platform()
+        yield from self.create_puzzle()
+        yield from self.create_enemy()
+        yield from self.create_artifact()
+        yield from self.create_exit()
+        yield from super().load_steps()
 
     def create_platform(self):
         # Create all platforms for this level
+        x, y, num_tiles_x, num_tiles_y = LEVEL_2['ground'][0]
         ground = Platform(
-            x=0, y=0,
-            num_tiles_x=100,
-            num_tiles_y=1,
-            texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Elements/BIGLEAVES.png')
+            x=x, y=y,
+            num_tiles_x=num_tiles_x,
+            num_tiles_y=num_tiles_y,
+            texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Elements/BIGLEAVES.png'),
+            draw=False
         )
-        self.platforms.append(ground)
-        self.add_widget(ground)
+        self.add_platform(ground)
+        yield
 
         # Floating platforms
-        platforms_data = [
-            (60, 150, 10, 1),
-            (60, 40, 1, 1),
-            (0, 230, 2, 1),
-            (600, 40, 1, 11),
-            (640, 440, 1, 1),
-            (680, 440, 1, 3),
-            (560, 80, 1, 1),
-            (400, 400, 3, 1),
-            (260, 350, 1, 1),
-            (160, 300, 1, 1),
-            (600, 530, 12, 1),
-            (770, 440, 10, 1),
-            (1130, 530, 1, 1),
-            (1170, 440, 1, 8),
-            (690, 360, 5, 1),
-            (770, 400, 3, 2),
-            (640, 280, 3, 1),
-            (770, 80, 1, 1),
-            (890, 160, 1, 1),
-            (890, 260, 1, 5),
-            (1010, 120, 1, 1),
-            (1130, 200, 1, 1),
-            (930, 260, 2, 1),
-            (1130, 320, 2, 1),
-            (1290, 400, 2, 1),
-            (1290, 560, 2, 1),
-            (1290, 720, 2, 1),
-            (1210, 480, 2, 1),
-            (1210, 640, 2, 1),
-            (1370, 40, 1, 21),
-            (320, 760, 1, 1),
-            (480, 720, 18, 1),
-            (480, 720, 1, 2),
-            (480, 850, 23, 1),
-            (1610, 800, 1, 5),
-            (1610, 680, 1, 1),
-            (1410, 640, 5, 1),
-            (1700, 720, 1, 1),
-            (1800, 640, 1, 4),
-            (1500, 510, 11, 1),
-            (1370, 320, 12, 1),
-            (1530, 360, 1, 2),
-            (1670, 360, 1, 1),
-            (1810, 360, 1, 2),
-            (1530, 160, 8, 1),
-            (1810, 200, 1, 3),
-            (1530, 80, 1, 2),
-            (1410, 80, 1, 1)
-        ]
+        platforms_data = LEVEL_2['platform']
 
-        death_trap_data = [
-            (200, 190, 2, 1),
-            (850, 40, 3, 1),
-            (1220, 40, 4, 1),
-            (1070, 760, 2, 1),
-            (850, 760, 2, 1),
-            (600, 760, 2, 1),
-            (1620, 550, 5, 1),
-            (1570, 360, 6, 1)
-        ]
+        death_trap_data = LEVEL_2['death_trap']
 
         for x, y, num_tiles_x, num_tiles_y, in death_trap_data:
             death_trap = DeathTrap(x, y, num_tiles_x, num_tiles_y,
-                                texture_path=resource_path('assets/sprites/Spikes/four_Conjoined_Spikes.png'))
-            self.platforms.append(death_trap)
-            self.add_widget(death_trap)
+                                texture_path=resource_path('assets/sprites/Spikes/four_Conjoined_Spikes.png'), draw=False)
+            self.add_platform(death_trap)
+            yield
 
         for x, y, num_tiles_x, num_tiles_y in platforms_data:
             platform = Platform(x, y, num_tiles_x, num_tiles_y,
-                                texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Wood/WOODA.png'))
-            self.platforms.append(platform)
-            self.add_widget(platform)
+                                texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Wood/WOODA.png'), draw=False)
+            self.add_platform(platform)
+            yield
 
     def create_enemy(self):
-        enemy_data = [
-            (350, 40),
-            (160, 340),
-            (260, 390),
-            (690, 570),
-            (950, 480),
-            (1331, 760),
-            (320, 800),
-            (850, 890),
-            (1330, 890),
-            (1400, 680),
-            (1500, 550),
-            (1570, 40),
-            (1410, 120)
-        ]
+        enemy_data = LEVEL_2['enemy']
 
         for x,y in enemy_data:
             enemy = Enemy(x=x, y=y, width=40, height=40,
                           texture_path=resource_path('assets/sprites/Characters/Enemy.png'))
             self.enemies.append(enemy)
             self.add_widget(enemy)
+            yield
 
     def create_artifact(self):
-        artifact_data = (650, 40)
-        artifact = Artifact(name="meat armor",x=artifact_data[0],y = artifact_data[1],  width=40, height=40,
+        artifact_data = LEVEL_2['artifact'][0]
+        artifact = Artifact(name=LEVEL_2['artifact_name'],x=artifact_data[0],y = artifact_data[1],  width=40, height=40,
                             texture_path=resource_path('assets/sprites/Artifacts/HEALTH.png'))
         self.artifact = artifact
         self.platforms.append(artifact)
         self.add_widget(artifact)
+        yield
 
 
     def create_puzzle(self):
-        for puzzle in PuzzleComponent.get_puzzles_for_level(2):  
-            puzzle.level_ref = self  # So puzzle can check enemies when failed
-            self.puzzles.append(puzzle)
-            self.add_widget(puzzle)
+        for puzzle in PuzzleComponent.get_puzzles_for_level(2, self.rng):  
+            self.add_puzzle(puzzle)
+            yield
 
     def create_exit(self):
-        exit_pos = (1760, 200)
+        exit_pos = LEVEL_2['exit'][0]
         exit = LevelExit(x=exit_pos[0], y=exit_pos[1])
         self.platforms.append(exit)
         self.add_widget(exit)
+        yield
 
-    def update(self, dt):
+    def step(self, dt):
+        """One fixed simulation tick. Called by BaseLevelContents.update."""
         if self.paused:  # if pause → no process
             return
-        # Process keyboard input for movement
-        self.player.process_input()
-
-        # update proj
-        for proj in self.projectiles:
-            proj.update(dt, self)
+        profiler = self.profiler    # Per-phase timings, see profiler.py
 
-        # update enemy
-        for enemy in self.enemies:
-            if isinstance(enemy, PlaceHolder):
-                continue
-            enemy.update(dt, self.player, self.platforms, self)
-
-        # Physics and collision checks
-        self.check_collisions()
-        self.player.update(dt)
-        # Update artifacts
-        for artifact in self.platforms:
-            if isinstance(artifact, Artifact):
-                artifact.pick_up(self.player)
+        # Input, projectiles, enemies, collisions, player, artifacts: the game rules in simulation.py
+        super().step(dt)
 
         # Update puzzle state; remove if solved
-        for puzzle in self.puzzles[:]:
-            if isinstance(puzzle, PlaceHolder):
-                continue
-            puzzle.update()
-            if puzzle.solved:
-                self.remove_widget(puzzle)
-                self.puzzles.remove(puzzle)
-
+        with profiler.phase('puzzles'):
+            for puzzle in self.puzzles[:]:
+                if isinstance(puzzle, PlaceHolder):
+                    continue
+                puzzle.update()
+                if puzzle.solved:
+                    self.remove_puzzle(puzzle)
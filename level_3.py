@@ -4,9 +4,11 @@ from kivy.uix.screenmanager import Screen, ScreenManager
 from kivy.graphics import Rectangle, Color
 from kivy.clock import Clock
 from utils import resource_path
+from level_data import LEVEL_3
 
 from level_class import (Player, Platform, BaseLevelContents, Artifact, Enemy,
-                         PuzzleComponent, PlaceHolder, DeathTrap, SoundManager, LevelExit)
+                         PuzzleComponent, PlaceHolder, DeathTrap, SoundManager, LevelExit, TextureCache,
+                         LevelLoader)
 
 class Level_3_Class(Screen):
     """
@@ -20,6 +22,7 @@ class Level_3_Class(Screen):
         super().__init__(**kwargs)
         self.level_contents = None
         self.update_event = None
+        self.loader = None          # LevelLoader while the level is being built
         self.initialized = False    # Flag to ensure the level is initialized only once
 
     # Overriding Kivy-defined on_enter
@@ -46,9 +49,14 @@ class Level_3_Class(Screen):
         print("Entering level 3, press Q to exit")
         if not self.initialized:
             SoundManager.play_music("level_3")
-            self.level_contents = LevelContents()
-            self.add_widget(self.level_contents)
+            # Built over several frames behind a progress bar, start_level runs once it's done
+            if self.loader:     # Only one copy of the level may be loading
+                self.loader.cancel()
+            self.loader = LevelLoader(self, lambda prepared: LevelContents(deferred=True), LevelContents.texture_paths(),
+                                      on_done=self.start_level)
+            self.loader.start()
             self.initialized = True
+            return
         else:
             # Reset puzzle states when re-entering level
             if hasattr(self.level_contents, 'puzzles'):
@@ -64,12 +72,24 @@ class Level_3_Class(Screen):
 
              # Restore keyboard input if re-entering
             self.level_contents.player.setup_keyboard()
+        self.start_level()
+
+    def start_level(self, level_contents=None):
+        """Start updating the level. level_contents is the newly built level, from LevelLoader."""
+        if level_contents is not None:
+            self.loader = None
+            self.level_contents = level_contents
+            self.add_widget(level_contents)
         # Frame rate: 60FPS
         self.update_event = Clock.schedule_interval(self.level_contents.update, 1/60)
     
     # Overriding Kivy-defined on_leave
     def on_leave(self, *args):
         print("Leaving level 3 ")
+        if self.loader:     # Left before the level finished loading
+            self.loader.cancel()
+            self.loader = None
+            self.initialized = False
         if hasattr(self, 'level_contents') and self.level_contents:
             if (hasattr(self.level_contents, 'active_puzzle_popup') and 
                 self.level_contents.active_puzzle_popup and
@@ -85,11 +105,13 @@ class Level_3_Class(Screen):
         if self.update_event:
             self.update_event.cancel()
             self.update_event = None
+        TextureCache.evict_unused()    # Drop textures of levels that were thrown away
     
     def reset_level(self):
         self.on_leave()
         """Reset the level to its initial state"""
         if self.level_contents:
+            self.level_contents.dispose()
             self.remove_widget(self.level_contents)
         self.level_contents = None
         self.initialized = False
@@ -102,192 +124,112 @@ class Level_3_Class(Screen):
         self.bg_rect.size = instance.size
 
 class LevelContents(BaseLevelContents):
-    def __init__(self, **kwargs):
+    LEVEL = '3'
+    TEXTURES = ('assets/sprites/PixelTexturePack/Textures/Tech/HIGHTECHWALL.png',
+                'assets/sprites/tech_laser.png',
+                'assets/sprites/PixelTexturePack/Textures/Tech/BIGSQUARES.png',
+                'assets/sprites/Characters/Enemy.png',
+                'assets/sprites/Artifacts/DMG.png')
+
+    def __init__(self, deferred=False, **kwargs):
         super().__init__(**kwargs)
-        self.player = Player(x=10, y=40, width=40, height=40)
+        self.data = LEVEL_3
+        x, y = LEVEL_3['spawn_point'][0]
+        self.player = Player(x=x, y=y, width=40, height=40)
         self.paused = False     # Flag to stop game
         self.active_puzzle_popup = None
         
-        # Lists for bullets, particles, enemies
+        # Lists for bullets, enemies (particles are in self.particle_system)
         self.projectiles = []
-        self.particles = []
         self.platforms = []
         self.enemies = []
         self.puzzles = []
         self.artifact = None
         self.add_widget(self.player)
+        if not deferred:    # Otherwise LevelLoader runs load_steps over several frames
+            self.load()
 
-        self.create_platform()
-        self.create_puzzle()
-        self.create_enemy()
-        self.create_artifact()
-        self.create_exit()
+    def load_steps(self):
+        yield from self.create_platform()
+        yield from self.create_puzzle()
+        yield from self.create_enemy()
+        yield from self.create_artifact()
+        yield from self.create_exit()
+        yield from super().load_steps()
 
     def create_platform(self):
         # Create all platforms for this level
+        x, y, num_tiles_x, num_tiles_y = LEVEL_3['ground'][0]
         ground = Platform(
-            x=0, y=0,
-            num_tiles_x=100,
-            num_tiles_y=1,
-            texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Tech/HIGHTECHWALL.png')
+            x=x, y=y,
+            num_tiles_x=num_tiles_x,
+            num_tiles_y=num_tiles_y,
+            texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Tech/HIGHTECHWALL.png'),
+            draw=False
         )
-        self.platforms.append(ground)
-        self.add_widget(ground)
+        self.add_platform(ground)
+        yield
 
         # Floating platforms
-        platforms_data = [
-            (60, 80, 15, 1),
-            (120, 160, 2, 1),
-            (240, 240, 2, 1),
-            (480, 300, 2, 1),
-            (240, 360, 2, 1),
-            (360, 480, 8, 1),
-            (120, 420, 1, 1),
-
-            (660, 80, 1, 11),
-            (780, 40, 1, 5),
-            (780, 320, 1, 8),
-            (900, 80, 1, 11),
-            (0, 600, 20, 1),
-
-            (1020, 80, 2, 1),
-            (1140, 160, 2, 1),
-            (900, 240, 3, 1),
-            (1140, 360, 2, 1),
-            (900, 280, 2, 1),
-            (1060 - 120, 440, 1, 1),
-
-            (1220, 40, 1, 15),
-            (1220, 120 + 40 * 15, 1, 10),
-            (820, 560, 1, 1),
-            (780, 760, 1, 4),
-
-            (120, 760 - 80, 2, 1),
-            (240, 840 - 80, 2, 1),
-            (120, 800, 1, 1),
-            (240, 960 - 80, 10, 1),
-
-            (780, 720, 8, 1),
-            (900, 880, 1, 4),
-            (1060, 760, 1, 5),
-            (1020, 800, 1, 1),
-            (940, 880, 1, 1),
+        platforms_data = LEVEL_3['platform']
 
-            (1260, 600, 10, 1),
-            (1620, 80, 1, 21),
-            (1580, 680, 1, 1),
-            (1380, 760, 1, 1),
-            (1260, 840, 1, 1),
-            (1420, 880, 1, 1),
-
-            (1580, 80, 1, 1),
-            (1380, 160, 1, 1),
-            (1260, 240, 1, 1),
-            (1420, 320, 1, 1),
-            (1580, 400, 1, 1),
-            (1260, 480, 5, 1),
-            (1420, 420, 1, 2)
-        ]
-
-        death_trap_data = [
-            (200, 120, 12, 1),
-            (660, 40, 3, 1),
-            (820, 40, 1, 1),
-            (1020, 40, 2, 1),
-            (860, 760, 1, 1),
-            (1470, 640, 1, 1),
-            (1270, 40, 6, 1),
-
-        ]
+        death_trap_data = LEVEL_3['death_trap']
 
         for x, y, num_tiles_x, num_tiles_y, in death_trap_data:
             death_trap = DeathTrap(x, y, num_tiles_x, num_tiles_y,
-                                texture_path=resource_path('assets/sprites/tech_laser.png'))
-            self.platforms.append(death_trap)
-            self.add_widget(death_trap)
+                                texture_path=resource_path('assets/sprites/tech_laser.png'), draw=False)
+            self.add_platform(death_trap)
+            yield
 
         for x, y, num_tiles_x, num_tiles_y in platforms_data:
             platform = Platform(x, y, num_tiles_x, num_tiles_y,
-                                texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Tech/BIGSQUARES.png'))
-            self.platforms.append(platform)
-            self.add_widget(platform)
+                                texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Tech/BIGSQUARES.png'), draw=False)
+            self.add_platform(platform)
+            yield
 
     def create_enemy(self):
-        enemy_data = [
-            (160, 40),
-            (520, 340),
-            (1180, 40),
-            (1060, 120),
-            (980, 280),
-            (1180, 400),
-            (570, 640),
-            (430, 640),
-            (210, 640),
-            (1020, 760),
-            (1580, 640),
-            (1580, 720),
-            (1260, 880),
-            (1615, 40),
-            (1880, 40)
-        ]
+        enemy_data = LEVEL_3['enemy']
 
         for x,y in enemy_data:
             enemy = Enemy(x=x, y=y, width=40, height=40, texture_path=resource_path('assets/sprites/Characters/Enemy.png'))
             self.enemies.append(enemy)
             self.add_widget(enemy)
+            yield
 
     def create_artifact(self):
-        artifact_data = (900, 520)
-        artifact = Artifact(name="ancient shotgun",x=artifact_data[0],y = artifact_data[1],  width=40, height=40,texture_path=resource_path('assets/sprites/Artifacts/DMG.png'))
+        artifact_data = LEVEL_3['artifact'][0]
+        artifact = Artifact(name=LEVEL_3['artifact_name'],x=artifact_data[0],y = artifact_data[1],  width=40, height=40,texture_path=resource_path('assets/sprites/Artifacts/DMG.png'))
         self.artifact = artifact
         self.platforms.append(artifact)
         self.add_widget(artifact)
+        yield
 
     def create_puzzle(self):
-        puzzle_data = [
-
-        ]
-        for puzzle in PuzzleComponent.get_puzzles_for_level(3):  
-            puzzle.level_ref = self  # So puzzle can check enemies when failed
-            self.puzzles.append(puzzle)
-            self.add_widget(puzzle)
+        for puzzle in PuzzleComponent.get_puzzles_for_level(3, self.rng):  
+            self.add_puzzle(puzzle)
+            yield
 
     def create_exit(self):
-        exit_pos = (1280, 520)
+        exit_pos = LEVEL_3['exit'][0]
         exit = LevelExit(x=exit_pos[0], y=exit_pos[1])
         self.platforms.append(exit)
         self.add_widget(exit)
+        yield
 
-    def update(self, dt):
+    def step(self, dt):
+        """One fixed simulation tick. Called by BaseLevelContents.update."""
         if self.paused:  # if pause → no process
             return
-        # Process keyboard input for movement
-        self.player.process_input()
+        profiler = self.profiler    # Per-phase timings, see profiler.py
 
-        # update proj
-        for proj in self.projectiles:
-            proj.update(dt, self)
+        # Input, projectiles, enemies, collisions, player, artifacts: the game rules in simulation.py
+        super().step(dt)
 
-        # update enemy
-        for enemy in self.enemies:
-            if isinstance(enemy, PlaceHolder):
-                continue
-            enemy.update(dt, self.player, self.platforms, self)
-
-        # Physics and collision checks
-        self.check_collisions()
-        self.player.update(dt)
-        # Update artifacts
-        for artifact in self.platforms:
-            if isinstance(artifact, Artifact):
-                artifact.pick_up(self.player)
         # Update puzzle state; remove if solved
-        for puzzle in self.puzzles[:]:
-            if isinstance(puzzle, PlaceHolder):
-                continue
-            puzzle.update()
-            if puzzle.solved:
-                self.remove_widget(puzzle)
-
-                self.puzzles.remove(puzzle)
-
+        with profiler.phase('puzzles'):
+            for puzzle in self.puzzles[:]:
+                if isinstance(puzzle, PlaceHolder):
+                    continue
+                puzzle.update()
+                if puzzle.solved:
+                    self.remove_puzzle(puzzle)
@@ -1,24 +1,164 @@
 """This file contains all the main classes that'll be used across the project."""
-from typing import List
+import os
+import time
 
 from kivy.uix.widget import Widget
 from kivy.uix.popup import Popup
 from kivy.uix.label import Label
-from kivy.graphics import Rectangle, Color
+from kivy.graphics import Rectangle, Color, Mesh, InstructionGroup, PushMatrix, PopMatrix, Translate
 from kivy.core.window import Window
-from kivy.core.image import Image as CoreImage
+from kivy.core.image import Image as CoreImage, ImageLoader
+from kivy.atlas import Atlas
 from kivy.vector import Vector
 from kivy.lang import Builder
 from kivy.clock import Clock
-from kivy.core.audio import SoundLoader
 from kivy.app import App
 
 from kivy.factory import Factory
 from kivy.uix.floatlayout import FloatLayout
-from kivy.uix.image import Image
+from kivy.uix.progressbar import ProgressBar
 from kivy.animation import Animation
-from random import randint, shuffle
+from random import Random, randrange
+from queue import Queue, Empty
+from threading import Thread
+from time import perf_counter
+from array import array
+from math import cos, sin, radians
 from utils import resource_path
+from spatial import SpatialGrid
+from profiler import frame_profiler, FRAME_BUDGET_MS
+from tilemap import merge_quads, build_mesh_data
+from camera import Camera
+from rendersync import SyncedRect, canvas_writes, health_bar_rect
+from spriteatlas import ATLAS_PATH, SPRITES, sprite_id, source_key
+from replay import InputLog, level_digest
+from sounds import SoundManager
+from simulation import (SimulationClock, FixedStepLoop, TickScheduler, ActivityRegion, EntityState, run_tick,
+                        apply_inventory_effects, INTERACTION_RATE, AI_RATE, PRIORITY_PHYSICS,
+                        PRIORITY_INTERACTION, PRIORITY_AI, PRIORITY_INPUT)
+
+
+class TextureCache:
+    """
+    Process-wide texture cache, so each PNG is decoded once instead of once per widget.
+    Entries are keyed by (path, wrap, uvsize). Variants share the decoded image through get_region.
+    Widgets that pass owner= get the key recorded in owner.texture_keys so the level can release them.
+    Sprites in the sprite atlas (see spriteatlas.py) are regions of its one texture instead.
+    """
+    textures = {}   # key -> texture
+    refcounts = {}  # key -> number of owners still using the texture
+    hits = 0
+    misses = 0
+    atlas = None        # kivy.atlas.Atlas, loaded on first use
+    atlas_ids = None    # spriteatlas.source_key(path) -> sprite id, {} when there is no atlas
+
+    @staticmethod
+    def key(path, wrap=None, uvsize=None):
+        return path, wrap, tuple(uvsize) if uvsize else None
+
+    @classmethod
+    def get(cls, path, wrap=None, uvsize=None, owner=None):
+        """Return the texture for path, decoding it only on the first request."""
+        key = cls.key(path, wrap, uvsize)
+        texture = cls.textures.get(key)
+        if texture is None:
+            cls.misses += 1
+            base_key = cls.key(path)
+            base = cls.textures.get(base_key)
+            if base is None:
+                base = cls.atlas_region(path) or CoreImage(path).texture
+                cls.textures[base_key] = base
+            if key == base_key:
+                texture = base
+            else:
+                if cls.in_atlas(path):
+                    base = CoreImage(path).texture    # wrap and uvsize need a texture of its own
+                texture = base.get_region(0, 0, base.width, base.height)
+                if wrap:
+                    texture.wrap = wrap
+                if uvsize:
+                    texture.uvsize = uvsize
+                cls.textures[key] = texture
+        else:
+            cls.hits += 1
+
+        cls.refcounts[key] = cls.refcounts.get(key, 0) + 1
+        if owner is not None:
+            if not hasattr(owner, 'texture_keys'):
+                owner.texture_keys = []
+            owner.texture_keys.append(key)
+        return texture
+
+    @classmethod
+    def load_atlas(cls, path=None):
+        """Load the sprite atlas if it was built. Returns True if it was."""
+        path = path or resource_path(ATLAS_PATH)
+        cls.atlas_ids = {}
+        if not os.path.exists(path):
+            return False
+        cls.atlas = Atlas(path)
+        cls.atlas_ids = {source_key(resource_path(sprite)): sprite_id(sprite) for sprite in SPRITES}
+        return True
+
+    @classmethod
+    def in_atlas(cls, path):
+        if cls.atlas_ids is None:
+            cls.load_atlas()
+        return source_key(path) in cls.atlas_ids
+
+    @classmethod
+    def atlas_region(cls, path):
+        """Region of the atlas texture holding path, None if the atlas doesn't have it."""
+        if not cls.in_atlas(path):
+            return None
+        return cls.atlas.textures[cls.atlas_ids[source_key(path)]]
+
+    @staticmethod
+    def decode(path):
+        """Read and decode the image file without touching the GPU. Safe to call from a worker thread."""
+        return ImageLoader.load(path)
+
+    @classmethod
+    def upload(cls, path, image):
+        """Turn an image from decode() into the cached texture for path. Main thread only."""
+        base_key = cls.key(path)
+        if base_key not in cls.textures:
+            cls.textures[base_key] = CoreImage(image).texture
+
+    @classmethod
+    def release(cls, owner):
+        """Drop every reference held by owner. The textures stay cached until evict_unused."""
+        for key in getattr(owner, 'texture_keys', ()):
+            if cls.refcounts.get(key, 0) > 0:
+                cls.refcounts[key] -= 1
+        owner.texture_keys = []
+
+    @classmethod
+    def evict_unused(cls):
+        """Forget textures nobody holds anymore. Call when leaving a level. Returns how many were evicted."""
+        in_use_paths = {key[0] for key, count in cls.refcounts.items() if count > 0}
+        evicted = 0
+        for key in list(cls.textures):
+            if cls.refcounts.get(key, 0) > 0:
+                continue
+            # Keep the decoded image while one of its variants is still in use
+            if key == cls.key(key[0]) and key[0] in in_use_paths:
+                continue
+            del cls.textures[key]
+            cls.refcounts.pop(key, None)
+            evicted += 1
+        return evicted
+
+    @classmethod
+    def stats(cls):
+        return {
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'entries': len(cls.textures),
+            'in_use': sum(1 for count in cls.refcounts.values() if count > 0),
+            'pixels': sum(texture.width * texture.height for key, texture in cls.textures.items()
+                          if key == cls.key(key[0])),
+        }
 
 
 class PlaceHolder(Widget):
@@ -97,21 +237,28 @@ class OldPlatform(Widget):
         self.rect.size = self.size
 
 class Platform(Widget):
-    def __init__(self, x, y, num_tiles_x, num_tiles_y, texture_path, tile_width=40, tile_height=40, **kwargs):
+    kind = 'platform'   # custom.txt category, read by the game rules (see simulation.player_contacts)
+
+    def __init__(self, x, y, num_tiles_x, num_tiles_y, texture_path, tile_width=40, tile_height=40, draw=True, **kwargs):
         super().__init__(**kwargs)
         self.size = (tile_width * num_tiles_x, tile_height * num_tiles_y)
         self.pos = (x, y)
+        self.num_tiles = (num_tiles_x, num_tiles_y)
+        self.texture_path = texture_path
+        if not draw:
+            return  # Collision only, drawn by the level's TileMap
 
-        # Load texture
-        texture = CoreImage(texture_path).texture
-        texture.wrap = 'repeat'  # VERY important!
-        texture.uvsize = (num_tiles_x, num_tiles_y)  # Repeat X times; flip Y if needed
+        # Load texture. wrap = 'repeat' is VERY important!
+        # uvsize repeats the texture X times; flip Y if needed
+        texture = TextureCache.get(texture_path, wrap='repeat', uvsize=(num_tiles_x, num_tiles_y), owner=self)
 
         with self.canvas:
             Color(1, 1, 1, 1)
             Rectangle(texture=texture, pos=self.pos, size=self.size)
 
 class DeathTrap(Platform):
+    kind = 'death_trap'
+
     def __init__(self, x, y, num_tiles_x, num_tiles_y, texture_path, tile_width=40, tile_height=10, **kwargs):
         super().__init__(x=x, y=y,
                          num_tiles_x=num_tiles_x, num_tiles_y=num_tiles_y,
@@ -120,77 +267,52 @@ class DeathTrap(Platform):
                          **kwargs)
         self.damage = 5
 
+def _state_attribute(name):
+    """Widget attribute that is really stored on the entity's EntityState."""
+    return property(lambda self: getattr(self.state, name),
+                    lambda self, value: setattr(self.state, name, value))
+
+
 class Entity(Widget):
     """
     This is still a WIP. Please read the comments of each attribute for details.
+    The game logic moves self.state; the widget pos only follows it in sync(), once per frame.
     """
+    velocity = _state_attribute('velocity')
+    on_ground = _state_attribute('on_ground')    # Prevent double jumping, do falling check, etc...
+    gravity = _state_attribute('gravity')        # pixels/second
+    move_speed = _state_attribute('move_speed')  # pixels/second
+    jump_speed = _state_attribute('jump_speed')  # pixels/second
+    rect_sync = None    # SyncedRect of self.rect, set by subclasses that move
+
     def __init__(self, x, y, width, height, **kwargs):
         super().__init__(**kwargs)
         self.pos = (x, y) # Position of bottom-left corner of the Entity rectangle.
         self.size = (width, height) # Width and height from the bottom-left corner. Should be positive.
-        self.velocity = Vector(0, 0)
-        self.on_ground = False # Prevent double jumping, do falling check, etc...
-        self.gravity = -800 # pixels/second
-        self.move_speed = 300 # pixels/second
-        self.jump_speed = 400 # pixels/second
+        self.state = EntityState(x, y, width, height, velocity=Vector(0, 0), owner=self)
         # Unimplemented
         self.max_health = 100
         self.current_health = 100
         self.weapon = None
         self.damage = 0
         self.name = ""
-        self.last_direction = Vector(1, 0)
+        self.last_direction = (1, 0)
 
     def update_graphic(self, *args):
         self.rect.pos = self.pos
         self.rect.size = self.size
 
-    def update(self, dt):
-        """
-        dt is delta time
-        Without dt, movement would depend on frame rate. At 60 FPS you'd move 60 times per second,
-        at 30 FPS only 30 times. Multiplying by dt makes movement consistent regardless of
-        frame rate - the entity always moves the same distance per second.
-        """
-        if not self.on_ground:
-            self.velocity.y += self.gravity * dt
-
-        # Update position based on velocity
-        self.pos = (
-            self.pos[0] + self.velocity.x * dt,
-            self.pos[1] + self.velocity.y * dt
-        )
-
-        # Keep entity within screen bounds (horizontal)
-        if self.pos[0] < 0:
-            self.pos = (0, self.pos[1])
-        elif self.pos[0] > Window.width - self.size[0]:
-            self.pos = (Window.width - self.size[0], self.pos[1])
-
-        # Don't let entity fall below screen
-        if self.pos[1] < 0:
-            self.pos = (self.pos[0], 0)
-            self.velocity.y = 0
-            self.on_ground = True
-
-        # May add a check for jumping above screen
-
-    # These functions only change velocity, not position
-    def jump(self):
-        if self.on_ground:
-            self.velocity.y = self.jump_speed
-            self.on_ground = False
-
-    def move_left(self):
-        self.velocity.x = -self.move_speed
-        self.last_direction = Vector(-1, 0)
-
-    def move_right(self):
-        self.velocity.x = self.move_speed
-        self.last_direction = Vector(1, 0)
-
-    def stop_horizontal_movement(self):
-        self.velocity.x = 0
+    def sync(self):
+        """Copy the simulated position to the widget and redraw what changed. Once per frame.
+        The game rules in simulation.py move self.state; the widget only follows."""
+        self.pos = self.state.pos
+        self.sync_graphics()
+
+    def sync_graphics(self):
+        """Write the canvas instructions that are out of date, and only those. See rendersync.py."""
+        if self.rect_sync is not None:
+            self.rect_sync.set(self.state.pos, self.state.size)
+
 
 class Player(Entity):
     def __init__(self, x=0, y=0, width=40, height=40, **kwargs):
@@ -203,9 +325,10 @@ class Player(Entity):
         self.health_bar = None  
         self.airborne_with_no_movement_input = False # This is for animation, look at the update method
 
-        self.last_direction = Vector(1, 0)
-        self.last_shot_time = Clock.get_boottime()  # For cooldown
+        self.last_direction = (1, 0)
+        self.last_shot_time = 0.0  # For cooldown, in level simulation time
         self.shoot_cooldown = 0.3  # seconds
+        self.jumpboost = False    # Set from the inventory every tick, see simulation.apply_inventory_effects
 
         self.invincible = False
         self.can_double_jump = False
@@ -226,15 +349,15 @@ class Player(Entity):
         # Load your sprite images (replace with your actual image paths)
         self.sprites = {
             'idle': [
-                CoreImage(resource_path('assets/sprites/Characters/slime_character/slime_idle.png')).texture
+                TextureCache.get(resource_path('assets/sprites/Characters/slime_character/slime_idle.png'), owner=self)
             ],
             'move_left': [
-                CoreImage(resource_path('assets/sprites/Characters/slime_character/slime_left.png')).texture
+                TextureCache.get(resource_path('assets/sprites/Characters/slime_character/slime_left.png'), owner=self)
             ],
             'move_right': [
-                CoreImage(resource_path('assets/sprites/Characters/slime_character/slime_right.png')).texture
+                TextureCache.get(resource_path('assets/sprites/Characters/slime_character/slime_right.png'), owner=self)
             ],
-            'jump': [CoreImage(resource_path('assets/sprites/Characters/slime_character/slime_jump.png')).texture]  # Single frame for jump
+            'jump': [TextureCache.get(resource_path('assets/sprites/Characters/slime_character/slime_jump.png'), owner=self)]  # Single frame for jump
         }
 
         # Draw the player
@@ -247,9 +370,9 @@ class Player(Entity):
             Color(0, 1, 0) 
             self.health_bar = Rectangle(pos=(self.pos[0], self.pos[1] + self.height + 5), size=(self.width, 5))
         self.health_bar_bg = Rectangle(pos=(self.pos[0], self.pos[1] + self.height + 5), size=(self.width, 5))    
-        self.bind(pos=self.update_health_bar, size=self.update_health_bar)
-        # Bind position changes to update the rectangle
-        self.bind(pos=self.update_graphics, size=self.update_graphics)
+        # No pos bindings: sync() redraws the rect and the health bar once per frame, if they changed
+        self.rect_sync = SyncedRect(self.rect)
+        self.health_bar_sync = SyncedRect(self.health_bar)
 
     def update_animation(self, dt):
         """Update sprite animation frames"""
@@ -261,7 +384,7 @@ class Player(Entity):
 
             if len(frames) > 1:  # Only animate if multiple frames
                 self.frame_index = (self.frame_index + 1) % len(frames)
-                self.rect.texture = frames[self.frame_index]
+                self.rect_sync.set(texture=frames[self.frame_index])
 
     def set_animation(self, animation_name):
         """Change animation state"""
@@ -270,34 +393,28 @@ class Player(Entity):
             self.frame_index = 0
             self.animation_timer = 0
             # Set initial texture
-            self.rect.texture = self.sprites[animation_name][0]
+            self.rect_sync.set(texture=self.sprites[animation_name][0])
 
-    def update_health_bar(self, *args):
-        """Update the health bar when health changes"""
-        self.health_bar.pos = (self.pos[0], self.pos[1] + self.height + 5)
-        health_percentage = self.health / self.max_health
-        self.health_bar.size = (self.width * health_percentage, 5)
+    def sync_graphics(self):
+        """Animation and rect, then the health bar (moves with the player, shrinks with health)."""
+        # Determine animation based on movement state
+        if self.last_direction[0] < 0:
+            self.set_animation('move_left')
+        elif self.last_direction[0] > 0:
+            self.set_animation('move_right')
+        else:
+            self.set_animation('idle')
+        super().sync_graphics()
+        self.health_bar_sync.set(*health_bar_rect(*self.state.rect, self.health, self.max_health))
 
     def take_damage(self, damage):
         """Reduce the enemy's health when attacked"""
         self.health -= damage
         self.health = max(self.health, 0)  # Đảm bảo sức khỏe không dưới 0
-        self.update_health_bar()  # Cập nhật thanh máu
+        self.sync_graphics()  # Cập nhật thanh máu, right away in case the game stops here
         if self.health <= 0:
             self.die()
 
-    def update(self, dt):
-        super().update(dt)
-        self.update_health_bar()
-        # Determine animation based on movement state
-        if self.last_direction.x < 0:
-            self.set_animation('move_left')
-        elif self.last_direction.x > 0:
-            self.set_animation('move_right')
-        else:
-            self.set_animation('idle')
-        
-
     def setup_keyboard(self):
         """Initialize keyboard input handling"""
         self._keyboard = Window.request_keyboard(self._keyboard_closed, self)
@@ -323,11 +440,6 @@ class Player(Entity):
         if key in self.keys_pressed:
             self.keys_pressed.remove(key)
 
-    def update_graphics(self, *args):
-        """Update rectangle position and size"""
-        self.rect.pos = self.pos
-        self.rect.size = self.size
-
     def cleanup(self):
         """Clean up resources when player is destroyed"""
         self._keyboard_closed()
@@ -355,20 +467,7 @@ class Player(Entity):
         self.inventory.remove(item)
     def apply_inventory_effects(self):
         """Apply item effects from inventory"""
-        self.jumpboost = False
-        self.damage = 10
-        self.max_health = 100
-        self.current_health = min(getattr(self, "current_health", self.max_health), self.max_health)
-    
-        for item in self.inventory:
-            name = getattr(item, 'name', str(item)).lower()
-            if name == 'sky rocket':
-                self.jumpboost = True
-            if name == 'ancient shotgun':
-                self.damage = 20
-            if name == 'meat armor':
-                self.max_health = 200
-                self.current_health = min(self.current_health, self.max_health)
+        apply_inventory_effects(self)
 
 
     # def has_marioowo(self):
@@ -377,38 +476,6 @@ class Player(Entity):
     #         if hasattr(item, 'name') and item.name == 'Marioowo':
     #             return True
     #     return False
-    def jump(self):
-        """Inherited jump from Entity class, but add jumpboost logic"""
-        if self.on_ground:
-            if hasattr(self, 'jumpboost') and self.jumpboost:
-                self.velocity.y = self.jump_speed * 1.5
-            else:
-                self.velocity.y = self.jump_speed
-            self.on_ground = False
-        
-    def process_input(self):
-        if getattr(self.parent, "paused", False):
-            return
-        """Process continuous key presses (called every frame)"""
-        # Handle jump
-        if 'up' in self.keys_pressed or 'w' in self.keys_pressed:
-            if self.on_ground:
-                self.jump()
-        # Handle open inventory
-        # if 'b' in self.keys_pressed:
-        #     self.toggle_inventory()
-        #     print("Player open inventory")
-        # Handle shooting
-        if 'spacebar' in self.keys_pressed:
-            self.shoot_towards_cursor()
-            print("Position:", self.pos)
-        # Handle horizontal movement
-        if 'left' in self.keys_pressed or 'a' in self.keys_pressed:
-            self.move_left()
-        elif 'right' in self.keys_pressed or 'd' in self.keys_pressed:
-            self.move_right()
-        else:
-            self.stop_horizontal_movement()
 
     def on_enemy_collision(self, enemy):
         if self.invincible:
@@ -433,6 +500,8 @@ class Player(Entity):
 
     def die(self):
         print("Player died")
+        if hasattr(self.parent, 'finish_recording'):
+            self.parent.finish_recording('dead')
         #Implement death logic here, such as respawning or ending the game
         app = App.get_running_app()
         app.current_playing_screen = app.root.current 
@@ -442,35 +511,6 @@ class Player(Entity):
         popup = Factory.GameOverPopup()
         popup.open()
 
-########
-    def shoot_towards_cursor(self):
-        # Get current time to enforce shooting cooldown
-        now = Clock.get_boottime()
-        if now - self.last_shot_time < self.shoot_cooldown:
-            return  # Too soon to shoot again
-
-        self.last_shot_time = now   # Update the last shot timestamp
-        
-        # Determine shooting direction based on key pressed
-        if 'right' in self.keys_pressed or 'd' in self.keys_pressed:
-            direction = Vector(1, 0)
-            self.last_direction = direction
-        elif 'left' in self.keys_pressed or 'a' in self.keys_pressed:
-            direction = Vector(-1, 0)
-            self.last_direction = direction
-        else:
-            direction = self.last_direction     # Default to last used direction
-
-        # Create a new projectile and add it to the level
-        proj = Projectile(x=self.center_x, y=self.center_y, direction=direction,
-            speed=500, damage=10, owner="player")
-        self.parent.add_widget(proj)
-        self.parent.projectiles.append(proj)
-
-        # Play shooting sound and trigger animation
-        SoundManager.play("shoot")
-        # self.animate_attack()
-
     # def animate_attack(self):
     #     # Simple visual feedback (flash color)
     #     self.canvas.remove(self.rect)
@@ -539,6 +579,8 @@ class Artifact(Entity):
     Represents a collectible artifact that grants the player special abilities
     and is required to complete a level.
     """
+    kind = 'artifact'
+
     def __init__(self, name, x=0, y=0, width=100, height=100, texture_path=None, **kwargs):
         super().__init__(x, y, width, height, **kwargs)
         self.is_collected = False
@@ -548,8 +590,7 @@ class Artifact(Entity):
         # Draw the artifact
         with self.canvas:
             if self.texture_path:
-                texture = CoreImage(self.texture_path).texture
-                texture.wrap = 'repeat'  # Allow texture to repeat
+                texture = TextureCache.get(self.texture_path, owner=self)  # Drawn once, so it can come from the sprite atlas
                 Color(1, 1, 1, 1)
                 self.rect = Rectangle(texture=texture, pos=self.pos, size=self.size)
             else:
@@ -565,29 +606,6 @@ class Artifact(Entity):
         self.rect.size = self.size
 
 
-    def pick_up(self, player):
-        """
-        Check collision with player and pick up the artifact if collided.
-        """
-        if self.is_collected:
-            return  # Prevent picking up the same artifact multiple times
-
-        if self.collide_widget(player):
-            self.is_collected = True
-            if hasattr(player, "inventory_add_item"):
-                print(f"Artifact '{self.name}' collected by player!")
-                player.inventory_add_item(self)
-
-                # Immediately apply effects here
-                if hasattr(player, 'apply_inventory_effects'):
-                    player.apply_inventory_effects()
-
-            # Optionally, remove the artifact from the screen
-            if self.parent:
-                self.parent.remove_widget(self)
-
-
-
     def unlock_level(self):
         """
         Logic to unlock the next level.
@@ -611,17 +629,18 @@ class Enemy(Entity):
         self.direction = 1  # 1 for right, -1 for left
         self.move_speed = 0  # Enemy moves slower than player
         self.health_bar = None 
+        self.culled = False     # Set by the level while the enemy is out of view, only stops drawing it
 
         # Cooldown bắn
         self.shoot_interval = shoot_cooldown  # seconds
-        self.last_shot_time = Clock.get_boottime()
+        self.last_shot_time = 0.0    # Level simulation time
 
         self.texture_path = texture_path
 
         # Draw the enemy as a red rectangle or with texture if provided
         with self.canvas:
             if self.texture_path:
-                texture = CoreImage(self.texture_path).texture
+                texture = TextureCache.get(self.texture_path, owner=self)
                 Color(1, 1, 1, 1)
                 self.rect = Rectangle(texture=texture, pos=self.pos, size=self.size)
             else:
@@ -631,122 +650,28 @@ class Enemy(Entity):
             Color(1, 0, 0)
             self.health_bar = Rectangle(pos=(self.pos[0], self.pos[1] + self.height + 5), size=(self.width, 5))
         self.health_bar_bg = Rectangle(pos=(self.pos[0], self.pos[1] + self.height + 5), size=(self.width, 5))
-        # Bind position changes to update the rectangle
-        self.bind(pos=self.update_health_bar, size=self.update_health_bar)
-        self.bind(pos=self.update_graphic, size=self.update_graphic)
+        # No pos bindings: sync() redraws the rect and the health bar once per frame, if they changed
+        self.rect_sync = SyncedRect(self.rect)
+        self.health_bar_sync = SyncedRect(self.health_bar)
     
     def alive(self):
         return self.current_health > 0
     
-    def update_health_bar(self, *args):
-        """Update the health bar when health changes"""
-        self.health_bar.pos = (self.pos[0], self.pos[1] + self.height + 5)
-        health_percentage = self.current_health / self.max_health
-        self.health_bar.size = (self.width * health_percentage, 5)  # Cập nhật chiều rộng của thanh máu
+    def sync_graphics(self):
+        """Rect, then the health bar (moves with the enemy, shrinks with health)."""
+        super().sync_graphics()
+        self.health_bar_sync.set(*health_bar_rect(*self.state.rect, self.current_health, self.max_health))
 
     def take_damage(self, damage):
         """Reduce the enemy's health when attacked"""
         self.current_health -= damage
         self.current_health = max(self.current_health, 0)  # Đảm bảo sức khỏe không dưới 0
-        self.update_health_bar()    # Cập nhật thanh máu
+        self.sync_graphics()    # Cập nhật thanh máu
       
 
-    def update(self, dt, player, platforms, level):
-        """
-        Update enemy position, handle wall/gap detection, and check collision with player.
-        :param dt: Delta time
-        :param player: Player instance
-        :param platforms: List of Platform instances
-        """
-        if getattr(level, "paused", False):
-            return 
-        # Move horizontally
-        self.velocity.x = self.direction * self.move_speed
-        self.pos = (
-            self.pos[0] + self.velocity.x * dt,
-            self.pos[1] + self.velocity.y * dt
-        )
-
-        # Wall collision: reverse direction if hitting screen edge
-        if self.pos[0] <= 0:
-            self.move_right()
-        elif self.pos[0] >= Window.width - self.size[0]:
-            self.move_left()
-
-        # Gap detection: if no platform under front foot, reverse direction
-        if not self._is_platform_ahead(platforms):
-            self.direction *= -1
-
-        # Check collision with player
-        if self.collide_widget(player):
-            self.hit_player(player)
-
-        # Attempt to shoot if allowed by cooldown
-        self.try_shoot(player, level)
-
-        self.update_graphic()
-        self.update_health_bar()
-
-    def _is_platform_ahead(self, platforms):
-        """
-        Check if there is a platform under the enemy's front foot.
-        """
-        # Check the front foot position
-        if self.direction == 1:
-            foot_x = self.pos[0] + self.size[0] + 1
-        else:
-            foot_x = self.pos[0] - 1
-        foot_y = self.pos[1] - 1  # Just below the enemy
-
-        for platform in platforms:
-            px, py = platform.pos
-            pw, ph = platform.size
-            if px <= foot_x <= px + pw and py <= foot_y <= py + ph:
-                return True
-        return False
-
-    def hit_player(self, player):
-        """
-        Deal damage to the player if colliding.
-        """
-        if hasattr(player, "current_health"):
-            player.current_health -= self.attack_damage
-            # Optionally, you can add knockback or invulnerability frames here
-
-####
-    def try_shoot(self, player, level):
-        # Get the current time since app started
-        now = Clock.get_boottime()
-
-        # Enforce shooting cooldown: exit if not enough time has passed
-        if now - self.last_shot_time < self.shoot_interval:
-            return
-
-        distance = Vector(player.center_x - self.center_x,
-                        player.center_y - self.center_y).length()
-        if distance > 300:  # Only shoot if player is within 300 pixels
-            return
-
-        self.last_shot_time = now # Update the last shot time to current time
-
-        # Determine direction vector from enemy to player and normalize it
-        direction = Vector(player.center_x - self.center_x,
-                        player.center_y - self.center_y).normalize()
-        # Create the projectile moving in the calculated direction
-        bullet = Projectile(x=self.center_x, y=self.center_y,
-            direction=direction, speed=300, damage=10, owner="enemy"
-        )
-        # Add bullet to level scene and tracking list
-        level.add_widget(bullet)
-        level.projectiles.append(bullet)
-
-        SoundManager.play("shoot")
-
-    def update_graphic(self, *args):
-        self.rect.pos = self.pos
-        self.rect.size = self.size
-
 class LevelExit(Widget):
+    kind = 'exit'
+
     def __init__(self, x=0, y=0, width=40, height=40,
                  texture_path="assets/sprites/exit_portal.png", **kwargs):
         super().__init__(**kwargs)
@@ -757,108 +682,418 @@ class LevelExit(Widget):
 
         if self.texture_path:
             with self.canvas:
-                Rectangle(texture=CoreImage(self.texture_path).texture, pos=self.pos, size=self.size)
+                Rectangle(texture=TextureCache.get(self.texture_path, owner=self), pos=self.pos, size=self.size)
 
 
 class BaseLevelContents(Widget):
     """Contain the base contents of levels. This one only handles the main logic."""
 
-    def check_collisions(self):
-        """Check collisions between player and platforms and artifacts."""
-        # Type hinting for IDEs so it's less of a pain to work with.
-        # Doesn't interrupt the code with or without these.
-        self.player : Player
-        self.platforms : List[Platform]
-
-        player_rect = (
-            self.player.pos[0],
-            self.player.pos[1],
-            self.player.size[0],
-            self.player.size[1]
-        )
-
-        on_ground_temp = False
-        epsilon = 2 # pixels. Allow slight overlap or near-platform alignment. Unused.
-
-        for platform in self.platforms:
-            platform_rect = (
-                platform.pos[0],
-                platform.pos[1],
-                platform.size[0],
-                platform.size[1]
-            )
+    # Textures every level uses (player, exit, puzzle block). Levels add their own in TEXTURES
+    COMMON_TEXTURES = ('assets/sprites/Characters/slime_character/slime_idle.png',
+                       'assets/sprites/Characters/slime_character/slime_left.png',
+                       'assets/sprites/Characters/slime_character/slime_right.png',
+                       'assets/sprites/Characters/slime_character/slime_jump.png',
+                       'assets/sprites/exit_portal.png',
+                       'assets/sprites/question_block.png')
+    TEXTURES = ()
+    LEVEL = None    # Level id saved in input recordings, see replay.py
+    paused = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Every random choice of the level comes from here, so a recorded run can be played again
+        self.seed = randrange(2 ** 32)
+        self.rng = Random(self.seed)
+        self.input_log = None   # replay.InputLog while recording, see start_recording
+        # Game logic runs in fixed ticks on its own clock, see simulation.py
+        self.clock = SimulationClock()
+        # Everything that runs periodically in the level registers here, not with the Kivy Clock
+        self.scheduler = TickScheduler()
+        self.scheduler.schedule(self.step, priority=PRIORITY_PHYSICS, name='step')
+        self.scheduler.schedule(self.update_activity, rate=AI_RATE, priority=PRIORITY_AI, name='activity')
+        # A tick that pauses the level (puzzle, death) drops the rest of the frame's ticks, so every
+        # tick that runs is a tick that replays (see replay.py)
+        self.fixed_step = FixedStepLoop(self.scheduler.tick, clock=self.clock,
+                                        stop=lambda: getattr(self, 'paused', False))
+        self.profiler = frame_profiler
+        # Projectiles are reused instead of constructed for every shot
+        self.projectile_pool = WidgetPool(lambda: Projectile(0, 0, (1, 0), 0, 0, "player"), size=16)
+        # All particles of the level, drawn after (on top of) every child widget
+        self.particle_system = ParticleSystem(rng=self.rng)
+        self.canvas.after.add(self.particle_system.canvas)
+        self.canvas.after.add(PopMatrix())
+        # Positions are in world coordinates; the camera scrolls the whole level by translating it
+        self.world_width = None     # None: the world is as wide as the window
+        self.world_height = None
+        self.camera = Camera(Window.width, Window.height)
+        with self.canvas.before:
+            PushMatrix()
+            self.camera_translate = Translate(0, 0)
+        # Platforms and traps are drawn under everything else, a few meshes for the whole level
+        self.tilemap = TileMap()
+        self.canvas.before.add(self.tilemap.canvas)
+        self.spatial_index = None   # Static objects (platforms, traps, artifacts, exits)
+        self.actor_index = None     # Moving targets (enemies), updated incrementally
+        self.activity = None        # Which enemies are close enough to the player to run their AI
+
+    def build_spatial_index(self):
+        """Index everything in self.platforms into a uniform grid. Call once all create_* methods are done."""
+        for _ in self.build_spatial_index_steps():
+            pass
+
+    def build_spatial_index_steps(self, chunk=500):
+        """build_spatial_index, yielding every chunk objects. See load_steps."""
+        self.spatial_index = SpatialGrid(cell_size=40)
+        for i, platform in enumerate(self.platforms, start=1):
+            self.spatial_index.insert(platform)
+            if i % chunk == 0:
+                yield
+        self.actor_index = SpatialGrid(cell_size=40)
+        for i, enemy in enumerate(self.enemies, start=1):
+            self.actor_index.insert(enemy.state)    # States, so the index sees positions before sync()
+            if i % chunk == 0:
+                yield
+        self.activity = ActivityRegion(self.actor_index)
+        self.update_activity()
 
-            # Standard Axis-Aligned Bounding Box (AABB) collision check
-            if (player_rect[0] < platform_rect[0] + platform_rect[2] and
-                    player_rect[0] + player_rect[2] > platform_rect[0] and
-                    player_rect[1] < platform_rect[1] + platform_rect[3] and
-                    player_rect[1] + player_rect[3] > platform_rect[1]):
-
-                if isinstance(platform, DeathTrap):
-                    self.player.current_health -= platform.damage
-                    self.player.take_damage(platform.damage)
-                    print("Player health:", self.player.current_health)
-                    
-
-                if isinstance(platform, Artifact):
-                    self.player.inventory_add_item(platform.name)
-                    self.remove_widget(platform)
-                    self.platforms.remove(platform)
-
-                if isinstance(platform, LevelExit):
-                    self.parent.manager.current = 'level_selection'
-                    return
-
-                # Calculate overlap distances for each direction
-                # Read the comments to prevent misused of these variables. They follow standard naming for overlapping.
-                overlap_left = (player_rect[0] + player_rect[2]) - platform_rect[0]  # platform's left - player's right
-                overlap_right = (platform_rect[0] + platform_rect[2]) - player_rect[0]  # platform's right - player's left
-                overlap_top = (platform_rect[1] + platform_rect[3]) - player_rect[1]  # platform’s top - player’s bottom
-                overlap_bottom = (player_rect[1] + player_rect[3]) - platform_rect[1]  # platform's bottom - player's top
-                min_overlap = min(overlap_left, overlap_right, overlap_bottom, overlap_top)
-
-                # Player is falling down onto platform
-                if self.player.velocity.y <= 0 and min_overlap == overlap_top:
-                    # Place player on top of platform
-                    self.player.pos = (
-                        self.player.pos[0],
-                        platform_rect[1] + platform_rect[3]
-                    )
-                    self.player.velocity.y = 0
-                    on_ground_temp = True
-
-                # Player is head hitting the bottom of platform
-                elif self.player.velocity.y > 0 and min_overlap == overlap_bottom:
-                    self.player.velocity.y = -50 # Makes the player fall faster
-
-                # Player is touching the sides of platform
-                elif self.player.velocity.x > 0 and min_overlap == overlap_left:
-                    self.player.velocity.x = 0
-                elif self.player.velocity.x < 0 and min_overlap == overlap_right:
-                    self.player.velocity.x = 0
-
-        self.player.on_ground = on_ground_temp
+    @classmethod
+    def texture_paths(cls):
+        """Every texture the level needs, for LevelLoader to decode ahead of time."""
+        return [resource_path(path) for path in cls.COMMON_TEXTURES + cls.TEXTURES]
 
+    def load_steps(self):
+        """
+        Build the level a piece at a time. Subclasses yield after each object they create, then
+        `yield from super().load_steps()`. LevelLoader runs the steps over several frames.
+        """
+        yield from self.build_spatial_index_steps()  # Platforms don't move, so the index is only built once
+        yield from self.tilemap.build_steps()
+        # Set ARTIFACTHUNTER_RECORD=<directory> to save the inputs of every run, see replay.py
+        if os.environ.get('ARTIFACTHUNTER_RECORD'):
+            self.start_recording()
+
+    def start_recording(self):
+        """Record the keys held on every tick from now on. Saved by finish_recording."""
+        world_width = int(self.get_world_size()[0])     # What update() clamps to
+        self.input_log = InputLog(self.LEVEL or 'unknown', level_digest(self.data), self.seed,
+                                  self.fixed_step.fixed_dt, world_width)
+        self.scheduler.schedule(self.record_input, priority=PRIORITY_INPUT, name='record input')
+
+    def record_input(self, dt):
+        if self.input_log is not None:
+            self.input_log.record(self.player.keys_pressed)
+
+    def finish_recording(self, outcome):
+        """Save the recording to the ARTIFACTHUNTER_RECORD directory. outcome is 'exit', 'dead' or 'timeout' (quit)."""
+        log, self.input_log = self.input_log, None
+        if log is None:
+            return
+        # The input of the last tick is recorded before it runs, so this is the tick count
+        # LevelSimulation reports for the same outcome
+        log.finish(outcome, len(log))
+        directory = os.environ.get('ARTIFACTHUNTER_RECORD', '.')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"level_{log.level}_{time.strftime('%Y%m%d_%H%M%S')}.ahr")
+        log.save(path)
+
+    def load(self):
+        """Build the whole level at once."""
+        for _ in self.load_steps():
+            pass
+
+    def load_size(self):
+        """Roughly how many steps load_steps yields, for the progress bar."""
+        data = getattr(self, 'data', None) or {}
+        objects = sum(len(rows) for rows in data.values() if not isinstance(rows, str))
+        return objects + objects // 500 + 2 * len(self.TEXTURES) + 2
+
+    def update_activity(self, dt=0):
+        """Wake the enemies near the player and put the far ones to sleep. Runs at AI_RATE."""
+        if self.activity is not None:
+            self.activity.refresh(*self.player.state.center)
+
+    def awake_enemies(self):
+        """Enemies that should run their AI this tick."""
+        if self.activity is None:
+            return [enemy for enemy in self.enemies if not isinstance(enemy, PlaceHolder)]
+        return [state.owner for state in self.activity.awake]
+
+    def add_platform(self, platform):
+        """Add a Platform or DeathTrap created with draw=False. It collides like any platform
+        but is drawn by the tile map, so it is never added as a child widget."""
+        self.platforms.append(platform)
+        self.tilemap.add(platform)
+
+    def build_tilemap(self):
+        """Build the tile map meshes. Call once all create_* methods are done."""
+        self.tilemap.build()
+
+    def get_world_size(self):
+        """Return (width, height) of the world. It is never smaller than the window."""
+        return max(Window.width, self.world_width or 0), max(Window.height, self.world_height or 0)
+
+    def sync_widgets(self):
+        """Move the widgets to where the simulation put them. Once per frame, however many ticks ran."""
+        self.player.sync()
+        for enemy in self.enemies:
+            if hasattr(enemy, 'sync'):
+                enemy.sync()
+        for proj in self.projectiles:
+            proj.sync()
+
+    def update_camera(self):
+        """Scroll the view to the player and hide the children that are out of view.
+        Returns how many children are culled."""
+        camera = self.camera
+        camera.resize(Window.width, Window.height)
+        world_width, world_height = self.get_world_size()
+        camera.follow(*self.player.state.center, world_width, world_height)
+        self.camera_translate.xy = (-camera.x, -camera.y)
+
+        cull = not camera.covers(world_width, world_height)
+        culled = 0
+        for child in self.children:
+            hidden = cull and not camera.visible(child.x, child.y, child.width, child.height)
+            if getattr(child, 'culled', False) != hidden:
+                child.culled = hidden
+                # Kivy skips drawing a canvas whose opacity is 0
+                child.canvas.opacity = 0 if hidden else 1
+                canvas_writes.total += 1
+            culled += hidden
+        return culled
+
+    def solids_near(self, x, y, width, height):
+        """Rects of the platforms and traps (things you can stand on) that may overlap the area."""
+        return [(p.x, p.y, p.width, p.height) for p in self.platforms_near(x, y, width, height)
+                if isinstance(p, Platform)]
+
+    def platforms_near(self, x, y, width, height):
+        """Return the platforms that may overlap the given rectangle."""
+        if self.spatial_index is None:
+            return self.platforms
+        return self.spatial_index.query(x, y, width, height)
+
+    def platforms_at(self, x, y):
+        """Return the platforms whose cell contains the point."""
+        if self.spatial_index is None:
+            return self.platforms
+        return self.spatial_index.query_point(x, y)
+
+    def enemies_near(self, x, y, width, height):
+        """Return the enemies that may overlap the given rectangle."""
+        if self.actor_index is None:
+            return self.enemies
+        return [state.owner for state in self.actor_index.query(x, y, width, height)]
+
+    def actor_moved(self, actor):
+        """Re-bucket a moving object. Cheap when it stays in the same cells."""
+        if self.actor_index is not None:
+            self.actor_index.move(actor.state)
+
+    def spawn_projectile(self, **kwargs):
+        """Take a projectile from the pool (same arguments as Projectile) and add it to the level."""
+        proj = self.projectile_pool.acquire(**kwargs)
+        self.add_widget(proj)
+        self.projectiles.append(proj)
+        return proj
+
+    def release_projectile(self, proj):
+        """Remove a projectile from the level and give it back to the pool."""
+        if proj not in self.projectiles:
+            return  # Already released
+        self.projectiles.remove(proj)
+        if proj.parent:
+            proj.parent.remove_widget(proj)
+        self.projectile_pool.release(proj)
+
+    def add_puzzle(self, puzzle):
+        """Add a puzzle to the level and check for the player touching it at INTERACTION_RATE."""
+        puzzle.level_ref = self  # So puzzle can check enemies when failed
+        puzzle.check_event = self.scheduler.schedule(puzzle._check_player_interaction, rate=INTERACTION_RATE,
+                                                     priority=PRIORITY_INTERACTION, name='puzzle interaction')
+        self.puzzles.append(puzzle)
+        self.add_widget(puzzle)
+
+    def remove_puzzle(self, puzzle):
+        if puzzle.check_event:
+            puzzle.check_event.cancel()
+            puzzle.check_event = None
+        self.remove_widget(puzzle)
+        self.puzzles.remove(puzzle)
+
+    def remove_enemy(self, enemy):
+        """Remove a dead enemy from the scene, the enemy list and the index."""
+        self.remove_widget(enemy)
+        if enemy in self.enemies:
+            self.enemies.remove(enemy)
+        if self.actor_index is not None:
+            self.actor_index.remove(enemy.state)
+        if self.activity is not None:
+            self.activity.forget(enemy.state)
+
+    def remove_platform(self, platform):
+        """Remove a collected artifact (or any static object) from the scene, the list and the index."""
+        if isinstance(platform, Artifact):
+            platform.is_collected = True
+        self.remove_widget(platform)
+        self.platforms.remove(platform)
+        if self.spatial_index is not None:
+            self.spatial_index.remove(platform)
+
+    def reach_exit(self):
+        self.finish_recording('exit')
+        self.parent.manager.current = 'level_selection'
+
+    def play_sound(self, name):
+        SoundManager.play(name)
+
+    def projectile_exploded(self, proj):
+        self.particle_system.emit(proj.state.center, color=(1, 0.6, 0), count=6)
+
+    @property
+    def keys_pressed(self):
+        return self.player.keys_pressed
+
+    def phase(self, name):
+        """Profiler phase, see run_tick."""
+        return self.profiler.phase(name)
 
     def update(self, dt):
-        """Main game update loop. This is called by Clock.schedule_interval.
-        Follow: process input -> check collisions -> update"""
-        self.player.process_input()
-        self.check_collisions()
-        self.player.update(dt)
-        #update artifacts
-        for artifact in self.platforms:
-            if isinstance(artifact, Artifact):
-                artifact.pick_up(self.player)
+        """This is called by Clock.schedule_interval with the real frame time.
+        It runs step() as many times as needed so the game logic always sees FIXED_DT."""
+        if getattr(self, 'paused', False):
+            return
+        profiler = self.profiler
+        profiler.begin_frame()
+        ticks = self.fixed_step.advance(dt)
+        with profiler.phase('sync'):
+            self.sync_widgets()
+        with profiler.phase('particles'):
+            self.particle_system.update(dt)
+        with profiler.phase('camera'):
+            culled = self.update_camera()
+        profiler.count('culled', culled)
+        profiler.count('canvas_writes', canvas_writes.take())   # Only what changed, see rendersync.py
+        profiler.count('ticks', ticks)
+        profiler.count('projectiles', len(getattr(self, 'projectiles', ())))
+        profiler.count('particles', len(self.particle_system))
+        profiler.count('enemies', len(getattr(self, 'enemies', ())))
+        if self.activity is not None:
+            stats = self.activity.stats()
+            profiler.count('awake', stats['awake'])
+            profiler.count('woken', stats['woken'])
+            profiler.count('slept', stats['slept'])
+        profiler.count('scheduled', len(self.scheduler))
+        profiler.count('pool_hits', self.projectile_pool.hits)
+        profiler.count('pool_misses', self.projectile_pool.misses)
+        if hasattr(Clock, 'get_events'):
+            profiler.count('clock_events', len(Clock.get_events()))
+        profiler.end_frame(getattr(self.parent, 'name', None))
+
+    def step(self, dt):
+        """Main game update loop, one fixed tick: simulation.run_tick, the same rules LevelSimulation
+        runs headless. The widgets only follow the result, in sync_widgets."""
+        if self.paused:
+            return
+        run_tick(self, dt)
 
     def cleanup(self):
         """Clean up game resources"""
         if hasattr(self.player, 'cleanup'):
             self.player.cleanup()
 
+    def dispose(self):
+        """Tear the level down for good: stop every scheduled callback and release textures.
+        Call before throwing the level contents away."""
+        self.finish_recording('timeout')    # Quit or restarted before the end
+        self.cleanup()
+        self.scheduler.clear()
+        self.particle_system.clear()
+        self.tilemap.clear()
+        self.release_textures()
+
+    def release_textures(self):
+        """Release the cached textures used by this level. Call before throwing the level contents away."""
+        owners = list(self.walk(restrict=True))
+        owners += getattr(self, 'platforms', [])
+        owners += getattr(self, 'enemies', [])
+        owners += getattr(self.player, 'inventory', [])    # Picked up artifacts are no longer in the tree
+        released = set()
+        for owner in owners:
+            if id(owner) not in released:
+                released.add(id(owner))
+                TextureCache.release(owner)
+
+class ProfilerOverlay(Label):
+    """On-screen table of frame_profiler timings. Toggle with F3 (see ArtifactHunterApp.on_key_down)."""
+    def __init__(self, **kwargs):
+        super().__init__(size_hint=(None, None), size=(320, 260), halign='left', valign='top',
+                         font_name='RobotoMono-Regular', font_size='12sp', color=(1, 1, 0, 1), **kwargs)
+        self.text_size = self.size
+        self.refresh_event = None
+
+    def toggle(self):
+        """Show the overlay if hidden, hide it otherwise."""
+        if self.parent:
+            Window.remove_widget(self)
+            self.refresh_event.cancel()
+            self.refresh_event = None
+        else:
+            self.pos = (10, Window.height - self.height - 10)
+            Window.add_widget(self)
+            self.refresh_event = Clock.schedule_interval(self.refresh, 0.25)
+            self.refresh()
+
+    def refresh(self, *args):
+        self.text = frame_profiler.report()
+
+
+class WidgetPool:
+    """
+    Keeps released widgets so they can be reused instead of constructed again.
+    Pooled classes implement reset(...) (called by acquire with the constructor arguments)
+    and deactivate() (called on release).
+    """
+    def __init__(self, factory, size=0):
+        self.factory = factory
+        self.free = []
+        self.hits = 0       # acquire served from the pool
+        self.misses = 0     # acquire had to construct a new widget
+        for _ in range(size):
+            widget = factory()
+            widget.deactivate()
+            self.free.append(widget)
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            self.hits += 1
+            widget = self.free.pop()
+            widget.reset(*args, **kwargs)
+        else:
+            self.misses += 1
+            widget = self.factory()
+            widget.reset(*args, **kwargs)
+        return widget
+
+    def release(self, widget):
+        widget.deactivate()
+        self.free.append(widget)
+
+
 class Projectile(Entity):
     def __init__(self, x, y, direction, speed, damage, owner, decay_time=2.0, max_bounce=0, **kwargs):
         super().__init__(x, y, 10, 4, **kwargs)
+        with self.canvas:
+            self.color = Color(1, 1, 1, 1)
+            self.rect = Rectangle(pos=self.pos, size=self.size)
+        self.rect_sync = SyncedRect(self.rect)
+        self.owner_color = None
+        self.reset(x, y, direction, speed, damage, owner, decay_time, max_bounce)
+
+    def reset(self, x, y, direction, speed, damage, owner, decay_time=2.0, max_bounce=0):
+        """Set up the projectile for a new shot. Called by __init__ and when reused from a WidgetPool."""
+        self.state.pos = (x, y)
+        self.sync()   # Right away, so a reused projectile isn't drawn at its old spot
         self.direction = Vector(direction).normalize() # Normalize the direction vector
         self.speed = speed
         self.damage = damage
@@ -867,94 +1102,292 @@ class Projectile(Entity):
         self.decay_time = decay_time
         self.max_bounce = max_bounce
         self.bounce_count = 0
+        self.age = 0.0  # Seconds of simulation since the projectile was created
+        rgba = (0, 1, 0, 1) if owner == "player" else (1, 0, 0, 1)
+        if rgba != self.owner_color:    # Pooled projectiles are mostly reused by the same shooter
+            self.color.rgba = self.owner_color = rgba
+            canvas_writes.total += 1
 
-        self.spawn_time = Clock.get_boottime() # Time when projectile is created
-
-        with self.canvas:
-            Color(0, 1, 0, 1) if owner == "player" else Color(1, 0, 0, 1)
-            self.rect = Rectangle(pos=self.pos, size=self.size)
+    def deactivate(self):
+        pass
 
-        self.bind(pos=self.update_graphics, size=self.update_graphics)
 
-    def update_graphics(self, *args):
-        self.rect.pos = self.pos
-        self.rect.size = self.size
-
-    def update(self, dt, level):
-        if not self.parent:
-            return  # Don't update if removed from screen
-
-        self.pos = (self.pos[0] + self.velocity.x * dt, self.pos[1] + self.velocity.y * dt)
+class ParticleBatch:
+    """
+    Particles of one color. State lives in flat arrays (one entry per particle)
+    and everything is drawn by a single Mesh.
+    """
+    MAX_PARTICLES = 16000   # Mesh indices are 16 bit: 4 vertices per particle
 
-        if Clock.get_boottime() - self.spawn_time > self.decay_time:
-            if self.parent:
-                self.parent.remove_widget(self)
-            if self in level.projectiles:
-                level.projectiles.remove(self)
+    def __init__(self, color, size):
+        self.size = size
+        self.x = array('d')
+        self.y = array('d')
+        self.vx = array('d')
+        self.vy = array('d')
+        self.life = array('d')  # Seconds left
+        self.color = Color(*color)
+        self.mesh = Mesh(mode='triangles')
+        self.indexed = 0    # Number of particles self.mesh.indices currently covers
+
+    def __len__(self):
+        return len(self.life)
+
+    def add(self, x, y, vx, vy, lifetime):
+        if len(self.life) >= self.MAX_PARTICLES:
             return
+        self.x.append(x)
+        self.y.append(y)
+        self.vx.append(vx)
+        self.vy.append(vy)
+        self.life.append(lifetime)
 
-        for platform in level.platforms:
-            if self.collide_widget(platform):
-                if self.max_bounce > 0 and self.bounce_count < self.max_bounce:
-                    self.velocity.x *= -1   # Reverse horizontal direction
-                    self.bounce_count += 1
-                else:
-                    if self.parent:
-                        self.parent.remove_widget(self)
-                    if self in level.projectiles:
-                        level.projectiles.remove(self)
-                return
+    def update(self, dt):
+        """Move every particle, drop the expired ones, then rebuild the mesh once."""
+        x, y, vx, vy, life = self.x, self.y, self.vx, self.vy, self.life
+        alive = 0
+        for i in range(len(life)):
+            remaining = life[i] - dt
+            if remaining <= 0:
+                continue
+            # Compact in place: survivors are moved down over the expired ones
+            x[alive] = x[i] + vx[i] * dt
+            y[alive] = y[i] + vy[i] * dt
+            vx[alive] = vx[i]
+            vy[alive] = vy[i]
+            life[alive] = remaining
+            alive += 1
+        for values in (x, y, vx, vy, life):
+            del values[alive:]
+        self.rebuild_mesh()
+
+    def rebuild_mesh(self):
+        count = len(self.life)
+        size = self.size
+        vertices = []
+        for i in range(count):
+            px, py = self.x[i], self.y[i]
+            vertices += (px, py, 0, 0,
+                         px + size, py, 1, 0,
+                         px + size, py + size, 1, 1,
+                         px, py + size, 0, 1)
+        if count != self.indexed:
+            indices = []
+            for i in range(count):
+                v = i * 4
+                indices += (v, v + 1, v + 2, v + 2, v + 3, v)
+            self.mesh.indices = indices
+            self.indexed = count
+        self.mesh.vertices = vertices
+
+
+class ParticleSystem:
+    """
+    Owns every particle of a level. Replaces one Widget + Clock interval per particle:
+    the level calls update(dt) once per frame and each color is drawn with one Mesh.
+    Add `canvas` to the level's canvas to show the particles.
+    """
+    def __init__(self, particle_size=6, rng=None):
+        self.particle_size = particle_size
+        self.rng = rng or Random()
+        self.batches = {}   # rgb tuple -> ParticleBatch
+        self.canvas = InstructionGroup()
+
+    def __len__(self):
+        return sum(len(batch) for batch in self.batches.values())
+
+    def emit(self, pos, color=(1, 1, 0), count=1, lifetime=0.3, speed=100):
+        """Spawn count particles at pos flying in random directions."""
+        color = tuple(color)
+        batch = self.batches.get(color)
+        if batch is None:
+            batch = ParticleBatch(color, self.particle_size)
+            self.batches[color] = batch
+            self.canvas.add(batch.color)
+            self.canvas.add(batch.mesh)
+        half = self.particle_size / 2
+        for _ in range(count):
+            angle = radians(self.rng.uniform(0, 360))
+            batch.add(pos[0] - half, pos[1] - half, cos(angle) * speed, sin(angle) * speed, lifetime)
 
-        targets = [level.player] if self.owner != "player" else level.enemies
-        for target in targets:
-            if self.collide_widget(target):
-                if hasattr(target, 'current_health'):
-                    target.current_health -= self.damage     # Apply damage
-                    target.take_damage(self.damage)
-                    print(f"{target.name} trúng đạn! HP còn: {target.current_health}")
-                    if isinstance(target, Player) and target.current_health <= 0:
-                        target.die()
-                # Xử lý chết
-                if target.current_health <= 0 and target in level.enemies:
-                    level.remove_widget(target)     # Remove dead enemy
-                    level.enemies.remove(target)
-
-                for _ in range(6):
-                    part = Particle(self.center, color=(1, 0.6, 0)) # Create explosion particles
-                    level.add_widget(part)
-                    level.particles.append(part)
-                if self.parent:
-                    self.parent.remove_widget(self)
-                if self in level.projectiles:
-                    level.projectiles.remove(self)
-                return
+    def update(self, dt):
+        for batch in self.batches.values():
+            if len(batch) or batch.indexed:
+                batch.update(dt)
+
+    def clear(self):
+        for batch in self.batches.values():
+            for values in (batch.x, batch.y, batch.vx, batch.vy, batch.life):
+                del values[:]
+            batch.rebuild_mesh()
 
 
-class Particle(Widget):
-    def __init__(self, pos, color=(1, 1, 0), lifetime=0.3, **kwargs):
+class TileMap:
+    """
+    Draws the static platforms of a level with one Mesh per texture instead of one
+    Widget + Rectangle per platform. Platforms added here should be created with draw=False.
+    Add `canvas` to the level's canvas and call build() once every platform is added.
+    """
+    def __init__(self):
+        self.quads = {}     # texture path -> list of (x, y, width, height, tiles_x, tiles_y)
+        self.meshes = []
+        self.canvas = InstructionGroup()
+
+    def __len__(self):
+        return sum(len(quads) for quads in self.quads.values())
+
+    def add(self, platform):
+        tiles_x, tiles_y = platform.num_tiles
+        quad = (platform.pos[0], platform.pos[1], platform.size[0], platform.size[1], tiles_x, tiles_y)
+        self.quads.setdefault(platform.texture_path, []).append(quad)
+
+    def build(self):
+        """(Re)build the meshes from every quad added so far."""
+        for _ in self.build_steps():
+            pass
+
+    def build_steps(self):
+        """build() one mesh at a time, yielding in between. See BaseLevelContents.load_steps."""
+        self.clear()
+        self.canvas.add(Color(1, 1, 1, 1))
+        for path, quads in self.quads.items():
+            texture = TextureCache.get(path, wrap='repeat', owner=self)
+            quads = merge_quads(quads)
+            yield
+            for vertices, indices in build_mesh_data(quads, texture.uvpos):
+                mesh = Mesh(vertices=vertices, indices=indices, mode='triangles', texture=texture)
+                self.meshes.append(mesh)
+                self.canvas.add(mesh)
+                yield
+
+    def clear(self):
+        """Remove the meshes and release their textures. The quads are kept."""
+        self.canvas.clear()
+        self.meshes = []
+        TextureCache.release(self)
+
+
+class LoadingOverlay(FloatLayout):
+    """Progress bar shown by LevelLoader while a level is being built."""
+    def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.size = (6, 6)
-        self.pos = (pos[0] - 3, pos[1] - 3)
-        self.velocity = Vector(1, 0).rotate(randint(0, 360)) * 100
+        self.label = Label(text="Loading...", font_size=28, size_hint=(1, None), height=50,
+                           pos_hint={'center_x': 0.5, 'center_y': 0.55})
+        self.bar = ProgressBar(max=1, value=0, size_hint=(0.5, None), height=30,
+                               pos_hint={'center_x': 0.5, 'center_y': 0.45})
+        self.add_widget(self.label)
+        self.add_widget(self.bar)
 
-        with self.canvas:
-            Color(*color)
-            self.rect = Rectangle(pos=self.pos, size=self.size)
+    def set_progress(self, progress):
+        self.bar.value = progress
+        self.label.text = f"Loading... {int(progress * 100)}%"
 
-        self.bind(pos=self.update_graphics, size=self.update_graphics)
-        Clock.schedule_interval(self._update, 1/60)
-        Clock.schedule_once(self._destroy, lifetime)
 
-    def update_graphics(self, *args):
-        self.rect.pos = self.pos
-        self.rect.size = self.size
-
-    def _update(self, dt):
-        self.pos = (self.pos[0] + self.velocity.x * dt, self.pos[1] + self.velocity.y * dt)
+class LevelLoader:
+    """
+    Builds a level without freezing the window. A worker thread runs prepare() (parsing level
+    data, for example) and decodes the level's textures; the main thread then uploads them and
+    runs the level's load_steps() a few at a time, stopping every frame after budget_ms.
+    on_done(level_contents) is called once the level is fully built.
+    factory(prepared) creates the level contents; prepared is what prepare() returned (None without it).
+    """
+    TEXTURE_SHARE = 0.2     # Part of the progress bar for decoding and uploading textures
+
+    def __init__(self, screen, factory, texture_paths=(), prepare=None, on_done=None, budget_ms=FRAME_BUDGET_MS / 2):
+        self.screen = screen
+        self.factory = factory
+        self.texture_paths = [path for path in dict.fromkeys(texture_paths)
+                              if TextureCache.key(path) not in TextureCache.textures
+                              and not TextureCache.in_atlas(path)]   # Atlas sprites come with the atlas
+        self.prepare = prepare
+        self.on_done = on_done
+        self.budget = budget_ms / 1000
+        self.decoded = Queue()      # (path, image) from the worker, then (None, prepared) when it is done
+        self.prepared = None
+        self.worker_done = False
+        self.uploaded = 0
+        self.level_contents = None
+        self.steps = None
+        self.steps_done = 0
+        self.steps_total = 1
+        self.overlay = LoadingOverlay()
+        self.event = None
+        self.cancelled = False
+        self.longest_frame_ms = 0.0   # Longest time spent loading in one frame, see frame_profiler
+
+    def start(self):
+        self.screen.add_widget(self.overlay)
+        Thread(target=self._work, daemon=True).start()
+        self.event = Clock.schedule_interval(self._tick, 0)
+
+    def _work(self):
+        """Worker thread: nothing here may create a widget or a texture."""
+        prepared = self.prepare() if self.prepare else None
+        for path in self.texture_paths:
+            if self.cancelled:
+                return
+            try:
+                self.decoded.put((path, TextureCache.decode(path)))
+            except Exception as e:   # A missing texture shouldn't stop the level, TextureCache.get will complain
+                print(f"Could not decode {path}: {e}")
+        self.decoded.put((None, prepared))
+
+    def progress(self):
+        textures = self.uploaded / len(self.texture_paths) if self.texture_paths else 1
+        steps = min(self.steps_done / self.steps_total, 1)
+        return self.TEXTURE_SHARE * textures + (1 - self.TEXTURE_SHARE) * steps
+
+    def _tick(self, dt):
+        if self.cancelled:
+            return False
+        start = perf_counter()
+        deadline = start + self.budget
+        while not self.worker_done and perf_counter() < deadline:
+            try:
+                path, image = self.decoded.get_nowait()
+            except Empty:
+                break
+            if path is None:
+                self.worker_done = True
+                self.prepared = image
+            else:
+                TextureCache.upload(path, image)
+                self.uploaded += 1
+
+        if self.worker_done:
+            if self.level_contents is None:
+                self.level_contents = self.factory(self.prepared)
+                self.steps = self.level_contents.load_steps()
+                self.steps_total = max(1, self.level_contents.load_size())
+            while perf_counter() < deadline:
+                try:
+                    next(self.steps)
+                except StopIteration:
+                    self._finish()
+                    return False
+                self.steps_done += 1
+
+        self.longest_frame_ms = max(self.longest_frame_ms, (perf_counter() - start) * 1000)
+        self.overlay.set_progress(self.progress())
+
+    def _finish(self):
+        self.event = None
+        self.screen.remove_widget(self.overlay)
+        frame_profiler.count('load_ms', round(self.longest_frame_ms, 1))
+        if self.on_done:
+            self.on_done(self.level_contents)
+
+    def cancel(self):
+        """Stop loading, for leaving the screen before the level is ready. The half-built level is disposed."""
+        self.cancelled = True
+        if self.event:
+            self.event.cancel()
+            self.event = None
+        self.screen.remove_widget(self.overlay)
+        if self.level_contents is not None:
+            self.level_contents.dispose()
+            self.level_contents = None
 
-    def _destroy(self, dt):
-        if self.parent:
-            self.parent.remove_widget(self)
 
 class PuzzleComponent(Widget):
     # List of all available quiz questions
@@ -980,15 +1413,16 @@ class PuzzleComponent(Widget):
     _used_questions = set() # Set to track already-used questions
 
     @classmethod
-    def get_puzzles_for_level(cls, level_number):
+    def get_puzzles_for_level(cls, level_number, rng=None):
         """Return a list of PuzzleComponent objects based on level.
         Level 1 → 1 question, Level 2 → 2 questions, Level 3 → 3 questions.
+        rng is the level's seeded Random (questions already used this session are still skipped).
         """
         count_map = {1: 1, 2: 2, 3: 3}
         count = count_map.get(level_number, 0)
 
         remaining = [q for q in cls.QUESTIONS if q not in cls._used_questions]
-        shuffle(remaining)
+        (rng or Random()).shuffle(remaining)
         selected = remaining[:count]
         cls._used_questions.update(selected)
 
@@ -1022,10 +1456,12 @@ class PuzzleComponent(Widget):
         self.popup = None
 
         with self.canvas:
-            self.rect = Image(source=resource_path("assets/sprites/question_block.png"), pos=self.pos, size=self.size)
+            Color(1, 1, 1, 1)
+            self.rect = Rectangle(texture=TextureCache.get(resource_path("assets/sprites/question_block.png"), owner=self),
+                                  pos=self.pos, size=self.size)
 
         self.bind(pos=self.update_graphics, size=self.update_graphics)
-        Clock.schedule_interval(self._check_player_interaction, 1 / 30)
+        self.check_event = None     # Set by BaseLevelContents.add_puzzle
 
     def update_graphics(self, *args):
         self.rect.pos = self.pos
@@ -1137,7 +1573,9 @@ class PuzzleComponent(Widget):
         self.show_prompt = False
         self.wrong_attempts = 0
         self.solved = False
-        Clock.unschedule(self._check_player_interaction)
+        if self.check_event:
+            self.check_event.cancel()
+            self.check_event = None
 
     def show_hint(self, msg):
         offset = 300
@@ -1151,71 +1589,3 @@ class PuzzleComponent(Widget):
         if not self.solved:  # Chỉ hiển thị câu đố nếu chưa giải quyết
             if self.collide_widget(self.level_ref.player):
                 self.show_question_popup()
-
-class SoundManager:
-    music_volume = 0.7
-    sfx_volume = 0.8
-    sounds = {}
-    music = None
-    level_music = {}
-    @classmethod
-    def load(cls):
-        cls.sounds["shoot"] = SoundLoader.load(resource_path("assets/sounds/shoot.wav"))
-        cls.sounds["correct"] = SoundLoader.load(resource_path("assets/sounds/correct.wav"))
-        cls.sounds["incorrect"] = SoundLoader.load(resource_path("assets/sounds/incorrect.wav"))
-        cls.sounds["gameover"] = SoundLoader.load(resource_path("assets/sounds/gameover.wav"))
-        # ... add other sounds if available
-        
-        for sound in cls.sounds.values():
-            if sound:
-                sound.volume = cls.sfx_volume
-
-        '''# Tải nhạc nền nếu có
-        cls.music = SoundLoader.load(resource_path("assets/music/background_music.mp3"))
-        if cls.music:
-            cls.music.loop = True
-            cls.music.volume = cls.music_volume
-            cls.music.play()'''
-        cls.level_music["level_1"] = SoundLoader.load(resource_path("assets/sounds/level_1.wav"))
-        cls.level_music["level_2"] = SoundLoader.load(resource_path("assets/sounds/level_2.wav"))
-        cls.level_music["level_3"] = SoundLoader.load(resource_path("assets/sounds/level_3.wav"))
-    
-    @classmethod
-    def play(cls, name):
-        sound = cls.sounds.get(name)
-        if sound:
-            sound.volume = cls.sfx_volume
-            sound.stop()
-            sound.play()
-
-    @classmethod
-    def set_music_volume(cls, volume):
-        cls.music_volume = volume
-        if cls.music:
-            cls.music.volume = volume
-
-    @classmethod
-    def set_sfx_volume(cls, volume):
-        cls.sfx_volume = volume
-        for sound in cls.sounds.values():
-            if sound:
-                sound.volume = volume   
-
-    @classmethod
-    def play_music(cls, level_name):
-        if cls.music:  # Check if music is already playing, don't stop it.
-            cls.music.stop()
-            cls.music = None
-        """play music level"""
-        if level_name in cls.level_music:
-            cls.music = cls.level_music[level_name]
-            cls.music.loop = True
-            cls.music.volume = cls.music_volume
-            cls.music.play()
-
-    @classmethod
-    def stop_music(cls):
-        """stop music level when you leave level"""
-        if cls.music:
-            cls.music.stop()
-            cls.music = None
\ No newline at end of file
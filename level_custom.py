@@ -5,9 +5,10 @@ from kivy.graphics import Rectangle, Color
 from kivy.clock import Clock
 from kivy.app import App
 from utils import resource_path
+from level_data import artifact_name
 
 from level_class import Player, Platform, BaseLevelContents, Artifact, Enemy, PuzzleComponent, PlaceHolder, DeathTrap, \
-    LevelExit
+    LevelExit, TextureCache, LevelLoader
 
 
 class Level_Custom_Class(Screen):
@@ -22,6 +23,7 @@ class Level_Custom_Class(Screen):
         super().__init__(**kwargs)
         self.level_contents = None
         self.update_event = None
+        self.loader = None          # LevelLoader while the level is being built
         self.initialized = False    # Flag to ensure the level is initialized only once
 
     # Overriding Kivy-defined on_enter
@@ -37,27 +39,50 @@ class Level_Custom_Class(Screen):
         # Initialize level
         print("Entering level 3, press Q to exit")
         if not self.initialized:
-            self.level_contents = LevelContents()
-            self.add_widget(self.level_contents)
+            # Built over several frames behind a progress bar, start_level runs once it's done.
+            # The level data is fetched on the worker thread, a compiled level maps its file there
+            app = App.get_running_app()
+            if self.loader:     # Only one copy of the level may be loading
+                self.loader.cancel()
+            self.loader = LevelLoader(self, lambda data: LevelContents(data=data, deferred=True),
+                                      LevelContents.texture_paths(),
+                                      prepare=lambda: app.custom_level_data, on_done=self.start_level)
+            self.loader.start()
             self.initialized = True
+            return
         else:
              # Restore keyboard input if re-entering
             self.level_contents.player.setup_keyboard()
+        self.start_level()
+
+    def start_level(self, level_contents=None):
+        """Start updating the level. level_contents is the newly built level, from LevelLoader."""
+        if level_contents is not None:
+            self.loader = None
+            self.level_contents = level_contents
+            self.add_widget(level_contents)
         # Frame rate: 60FPS
         self.update_event = Clock.schedule_interval(self.level_contents.update, 1/60)
     
     # Overriding Kivy-defined on_leave
     def on_leave(self, *args):
         print("Leaving level 3 ")
+        if self.loader:     # Left before the level finished loading
+            self.loader.cancel()
+            self.loader = None
+            self.initialized = False
         if hasattr(self, 'level_contents') and self.level_contents:
             self.level_contents.cleanup()
         if self.update_event:
             self.update_event.cancel()
             self.update_event = None
+        TextureCache.evict_unused()    # Drop textures of levels that were thrown away
     
     def reset_level(self):
         """Reset the level to its initial state"""
+        self.on_leave()     # Stops the update event and a loader that is still running
         if self.level_contents:
+            self.level_contents.dispose()
             self.remove_widget(self.level_contents)
         self.level_contents = None
         self.initialized = False
@@ -70,10 +95,17 @@ class Level_Custom_Class(Screen):
         self.bg_rect.size = instance.size
 
 class LevelContents(BaseLevelContents):
-    def __init__(self, **kwargs):
+    LEVEL = 'custom'
+    TEXTURES = ('assets/sprites/tech_laser.png',
+                'assets/sprites/PixelTexturePack/Textures/Tech/BIGSQUARES.png',
+                'assets/sprites/Characters/Enemy.png',
+                'assets/sprites/Artifacts/DMG.png')
+
+    def __init__(self, data=None, deferred=False, **kwargs):
         super().__init__(**kwargs)
-        app = App.get_running_app()
-        self.data : dict = app.custom_level_data
+        if data is None:
+            data = App.get_running_app().custom_level_data
+        self.data : dict = data
         if self.data.get('spawn_point'):
             x, y = self.data['spawn_point'][0]
         else:
@@ -82,35 +114,41 @@ class LevelContents(BaseLevelContents):
         self.paused = False     # Flag to stop game
         self.active_puzzle_popup = None
         
-        # Lists for bullets, particles, enemies
+        # Lists for bullets, enemies (particles are in self.particle_system)
         self.projectiles = []
-        self.particles = []
         self.platforms = []
         self.enemies = []
         self.puzzles = []
         self.artifact = None
         self.add_widget(self.player)
-
-        self.create_platform()
-        self.create_enemy()
-        self.create_artifact()
-        self.create_exit()
+        if not deferred:    # Otherwise LevelLoader runs load_steps over several frames
+            self.load()
+
+    def load_steps(self):
+        yield from self.create_platform()
+        yield from self.create_enemy()
+        yield from self.create_artifact()
+        yield from self.create_exit()
+        # Custom levels can be bigger than the window, the camera scrolls over the rest
+        self.world_width = max((p.pos[0] + p.size[0] for p in self.platforms), default=0)
+        self.world_height = max((p.pos[1] + p.size[1] for p in self.platforms), default=0)
+        yield from super().load_steps()
 
     def create_platform(self, platforms_data=(), death_trap_data=()):
         death_trap_data = self.data.get('death_trap')
         if death_trap_data:
             for x, y, num_tiles_x, num_tiles_y, in death_trap_data:
                 death_trap = DeathTrap(x, y, num_tiles_x, num_tiles_y,
-                                    texture_path=resource_path('assets/sprites/tech_laser.png'))
-                self.platforms.append(death_trap)
-                self.add_widget(death_trap)
+                                    texture_path=resource_path('assets/sprites/tech_laser.png'), draw=False)
+                self.add_platform(death_trap)
+                yield
         platforms_data = self.data.get('platform')
         if platforms_data:
             for x, y, num_tiles_x, num_tiles_y in platforms_data:
                 platform = Platform(x, y, num_tiles_x, num_tiles_y,
-                                    texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Tech/BIGSQUARES.png'))
-                self.platforms.append(platform)
-                self.add_widget(platform)
+                                    texture_path=resource_path('assets/sprites/PixelTexturePack/Textures/Tech/BIGSQUARES.png'), draw=False)
+                self.add_platform(platform)
+                yield
 
     def create_enemy(self, enemy_data=()):
         enemy_data = self.data.get('enemy')
@@ -119,17 +157,19 @@ class LevelContents(BaseLevelContents):
                 enemy = Enemy(x=x, y=y, width=40, height=40, texture_path=resource_path('assets/sprites/Characters/Enemy.png'))
                 self.enemies.append(enemy)
                 self.add_widget(enemy)
+                yield
 
     def create_artifact(self, artifact_data=()):
         artifact_data = self.data.get('artifact')
         if artifact_data:
             for x, y in artifact_data:
-                artifact = Artifact(name="Acient Shotgun",
+                artifact = Artifact(name=artifact_name(self.data),
                                     x=x, y=y,
                                     width=40, height=40,texture_path=resource_path('assets/sprites/Artifacts/DMG.png'))
                 self.artifact = artifact
                 self.platforms.append(artifact)
                 self.add_widget(artifact)
+                yield
 
     def create_exit(self):
         exit_data = self.data.get('exit')
@@ -138,34 +178,22 @@ class LevelContents(BaseLevelContents):
                 exit = LevelExit(x=x, y=y)
                 self.platforms.append(exit)
                 self.add_widget(exit)
+                yield
 
-    def update(self, dt):
+    def step(self, dt):
+        """One fixed simulation tick. Called by BaseLevelContents.update."""
         if self.paused:  # if pause → no process
             return
-        # Process keyboard input for movement
-        self.player.process_input()
+        profiler = self.profiler    # Per-phase timings, see profiler.py
 
-        # update proj
-        for proj in self.projectiles:
-            proj.update(dt, self)
-
-        # update enemy
-        for enemy in self.enemies:
-            if isinstance(enemy, PlaceHolder):
-                continue
-            enemy.update(dt, self.player, self.platforms, self)
-
-        # Physics and collision checks
-        self.check_collisions()
-        self.player.update(dt)
+        # Input, projectiles, enemies, collisions, player, artifacts: the game rules in simulation.py
+        super().step(dt)
 
         # Update puzzle state; remove if solved
-        for puzzle in self.puzzles[:]:
-            if isinstance(puzzle, PlaceHolder):
-                continue
-            puzzle.update()
-            if puzzle.solved:
-                self.remove_widget(puzzle)
-
-                self.puzzles.remove(puzzle)
-
+        with profiler.phase('puzzles'):
+            for puzzle in self.puzzles[:]:
+                if isinstance(puzzle, PlaceHolder):
+                    continue
+                puzzle.update()
+                if puzzle.solved:
+                    self.remove_puzzle(puzzle)
@@ -0,0 +1,334 @@
+"""
+Level layouts as plain data, in the same categories as custom.txt. No Kivy dependency,
+so both the LevelContents classes and the headless simulator read from here.
+Platforms and death traps: (x, y, num_tiles_x, num_tiles_y). Everything else: (x, y).
+"""
+import re
+from collections import namedtuple
+
+# Categories allowed in custom.txt
+CATEGORIES = {'platform', 'death_trap', 'enemy', 'artifact', 'spawn_point', 'exit'}
+# custom.txt can't name its artifact, so custom levels all get this one
+CUSTOM_ARTIFACT_NAME = "Acient Shotgun"
+
+# A line of flat tuples, "(1, 2), (3, 4)", the inside of one tuple, and one number
+_TUPLE_LINE = re.compile(r'\s*\([^()]*\)\s*(?:,\s*\([^()]*\)\s*)*,?\s*')
+_TUPLE = re.compile(r'\(([^()]*)\)')
+_INT_TUPLE = re.compile(r'\s*[+-]?\d+\s*(?:,\s*[+-]?\d+\s*)*,?\s*')
+_NUMBER = re.compile(r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*')
+
+# One tuple of a custom.txt file. values is None for the category line itself.
+LevelRecord = namedtuple('LevelRecord', 'line category values')
+
+
+def _split_tuple(inside):
+    """The numbers in '1, 2.5, 3' as a tuple. Raises ValueError if one isn't a number."""
+    parts = inside.split(',')
+    if not parts[-1].strip():
+        parts.pop()     # (1, 2,) and ()
+    if _INT_TUPLE.fullmatch(inside):     # What almost every level has, (x, y) or (x, y, tiles_x, tiles_y)
+        return tuple(map(int, parts))
+    values = []
+    for part in parts:
+        if not _NUMBER.fullmatch(part):
+            raise ValueError(f"'{part.strip()}' is not a number")
+        values.append(float(part) if any(c in part for c in '.eE') else int(part))
+    return tuple(values)
+
+
+def parse_tuple_line(line):
+    """
+    Return the tuples on a custom.txt line, "(1, 2), (3, 4.5)" -> [(1, 2), (3, 4.5)].
+    Only flat tuples of numbers are allowed; anything else raises ValueError.
+    """
+    if not _TUPLE_LINE.fullmatch(line):
+        raise ValueError(f"can't read '{line}'")
+    return [_split_tuple(inside) for inside in _TUPLE.findall(line)]
+
+
+def _raise_error(number, message):
+    raise ValueError(f"line {number}: {message}")
+
+
+def iter_level_records(lines, categories=CATEGORIES, on_error=_raise_error):
+    """
+    Read custom.txt one line at a time and yield a LevelRecord per tuple. lines can be an
+    open file, so the whole file is never in memory. A category line yields a record with
+    values None so builders see the category even when it has no tuples.
+    Problems raise ValueError, or go to on_error(line number, message) and the line is skipped.
+    """
+    category = None
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if ':' in line:
+            category = line.split(':')[0].strip()
+            if category not in categories:
+                on_error(number, f"unknown category '{category}'")
+                category = ''   # Its tuples are skipped, the category was already reported
+                continue
+            yield LevelRecord(number, category, None)
+        elif '(' in line:
+            if not category:
+                if category is None:
+                    on_error(number, "values before any category")
+                    category = ''
+                continue
+            try:
+                tuples = parse_tuple_line(line)
+            except ValueError as e:
+                on_error(number, str(e))
+                continue
+            for values in tuples:
+                yield LevelRecord(number, category, values)
+
+
+class LevelDataBuilder:
+    """Collects LevelRecords into level data. A category given twice starts over, like it always did."""
+    def __init__(self):
+        self.data = {}
+
+    def add(self, record):
+        if record.values is None:
+            self.data[record.category] = []
+        else:
+            self.data[record.category].append(record.values)
+
+
+def build_level_data(records, builder=None):
+    """Feed records to builder (a LevelDataBuilder by default) and return its data."""
+    builder = builder or LevelDataBuilder()
+    add = builder.add
+    for record in records:
+        add(record)
+    return builder.data
+
+
+def artifact_name(data):
+    """Name of the level's artifact, for the game and the headless levels alike."""
+    return data.get('artifact_name') or CUSTOM_ARTIFACT_NAME
+
+
+def parse_level_data(content: str, categories=CATEGORIES):
+    """Parse the raw data from file into categories for easier processing"""
+    return build_level_data(iter_level_records(content.splitlines(), categories))
+
+
+def parse_level_file(path, categories=CATEGORIES):
+    """parse_level_data for a file, read line by line."""
+    with open(path, 'r', encoding='utf-8') as file:
+        return build_level_data(iter_level_records(file, categories))
+
+
+LEVEL_1 = {
+    'spawn_point': [(40, 40)],
+    'ground': [(0, 0, 100, 1)],
+    'platform': [
+        (160, 80, 2, 1),
+        (440, 80 * 2, 2, 1),
+        (160, 80 * 3, 2, 1),
+        (440, 80 * 4, 2, 1),
+        (160, 80 * 5, 2, 1),
+        (440, 80 * 6, 2, 1),
+
+        (560, 40, 1, 14),
+        (640, 120, 1, 14),
+
+        (160 + 600, 80, 2, 1),
+        (440 + 600, 80 * 2, 2, 1),
+        (160 + 600, 80 * 3, 2, 1),
+        (440 + 600, 80 * 4, 2, 1),
+        (160 + 600, 80 * 5, 2, 1),
+        (440 + 600, 80 * 6, 2, 1),
+        (160 + 600, 80 * 7, 2, 1),
+
+        (0, 120 + 40 * 14, 16, 1),
+
+        (160, 760, 2, 1),
+        (440, 840, 2, 1),
+        (440 + 320, 840, 2, 1),
+        (440 + 320 * 2, 840, 2, 1),
+
+        (440 + 400 * 2, 40, 1, 22)
+    ],
+    'enemy': [
+        (480, 520),
+        (1200, 40),
+        (640, 680),
+        (1500, 40)
+    ],
+    'artifact': [(700, 40)],
+    'artifact_name': "sky rocket",
+    'exit': [(1280, 40)],
+}
+
+LEVEL_2 = {
+    'spawn_point': [(10, 40)],
+    'ground': [(0, 0, 100, 1)],
+    'platform': [
+        (60, 150, 10, 1),
+        (60, 40, 1, 1),
+        (0, 230, 2, 1),
+        (600, 40, 1, 11),
+        (640, 440, 1, 1),
+        (680, 440, 1, 3),
+        (560, 80, 1, 1),
+        (400, 400, 3, 1),
+        (260, 350, 1, 1),
+        (160, 300, 1, 1),
+        (600, 530, 12, 1),
+        (770, 440, 10, 1),
+        (1130, 530, 1, 1),
+        (1170, 440, 1, 8),
+        (690, 360, 5, 1),
+        (770, 400, 3, 2),
+        (640, 280, 3, 1),
+        (770, 80, 1, 1),
+        (890, 160, 1, 1),
+        (890, 260, 1, 5),
+        (1010, 120, 1, 1),
+        (1130, 200, 1, 1),
+        (930, 260, 2, 1),
+        (1130, 320, 2, 1),
+        (1290, 400, 2, 1),
+        (1290, 560, 2, 1),
+        (1290, 720, 2, 1),
+        (1210, 480, 2, 1),
+        (1210, 640, 2, 1),
+        (1370, 40, 1, 21),
+        (320, 760, 1, 1),
+        (480, 720, 18, 1),
+        (480, 720, 1, 2),
+        (480, 850, 23, 1),
+        (1610, 800, 1, 5),
+        (1610, 680, 1, 1),
+        (1410, 640, 5, 1),
+        (1700, 720, 1, 1),
+        (1800, 640, 1, 4),
+        (1500, 510, 11, 1),
+        (1370, 320, 12, 1),
+        (1530, 360, 1, 2),
+        (1670, 360, 1, 1),
+        (1810, 360, 1, 2),
+        (1530, 160, 8, 1),
+        (1810, 200, 1, 3),
+        (1530, 80, 1, 2),
+        (1410, 80, 1, 1)
+    ],
+    'death_trap': [
+        (200, 190, 2, 1),
+        (850, 40, 3, 1),
+        (1220, 40, 4, 1),
+        (1070, 760, 2, 1),
+        (850, 760, 2, 1),
+        (600, 760, 2, 1),
+        (1620, 550, 5, 1),
+        (1570, 360, 6, 1)
+    ],
+    'enemy': [
+        (350, 40),
+        (160, 340),
+        (260, 390),
+        (690, 570),
+        (950, 480),
+        (1331, 760),
+        (320, 800),
+        (850, 890),
+        (1330, 890),
+        (1400, 680),
+        (1500, 550),
+        (1570, 40),
+        (1410, 120)
+    ],
+    'artifact': [(650, 40)],
+    'artifact_name': "meat armor",
+    'exit': [(1760, 200)],
+}
+
+LEVEL_3 = {
+    'spawn_point': [(10, 40)],
+    'ground': [(0, 0, 100, 1)],
+    'platform': [
+        (60, 80, 15, 1),
+        (120, 160, 2, 1),
+        (240, 240, 2, 1),
+        (480, 300, 2, 1),
+        (240, 360, 2, 1),
+        (360, 480, 8, 1),
+        (120, 420, 1, 1),
+
+        (660, 80, 1, 11),
+        (780, 40, 1, 5),
+        (780, 320, 1, 8),
+        (900, 80, 1, 11),
+        (0, 600, 20, 1),
+
+        (1020, 80, 2, 1),
+        (1140, 160, 2, 1),
+        (900, 240, 3, 1),
+        (1140, 360, 2, 1),
+        (900, 280, 2, 1),
+        (1060 - 120, 440, 1, 1),
+
+        (1220, 40, 1, 15),
+        (1220, 120 + 40 * 15, 1, 10),
+        (820, 560, 1, 1),
+        (780, 760, 1, 4),
+
+        (120, 760 - 80, 2, 1),
+        (240, 840 - 80, 2, 1),
+        (120, 800, 1, 1),
+        (240, 960 - 80, 10, 1),
+
+        (780, 720, 8, 1),
+        (900, 880, 1, 4),
+        (1060, 760, 1, 5),
+        (1020, 800, 1, 1),
+        (940, 880, 1, 1),
+
+        (1260, 600, 10, 1),
+        (1620, 80, 1, 21),
+        (1580, 680, 1, 1),
+        (1380, 760, 1, 1),
+        (1260, 840, 1, 1),
+        (1420, 880, 1, 1),
+
+        (1580, 80, 1, 1),
+        (1380, 160, 1, 1),
+        (1260, 240, 1, 1),
+        (1420, 320, 1, 1),
+        (1580, 400, 1, 1),
+        (1260, 480, 5, 1),
+        (1420, 420, 1, 2)
+    ],
+    'death_trap': [
+        (200, 120, 12, 1),
+        (660, 40, 3, 1),
+        (820, 40, 1, 1),
+        (1020, 40, 2, 1),
+        (860, 760, 1, 1),
+        (1470, 640, 1, 1),
+        (1270, 40, 6, 1)
+    ],
+    'enemy': [
+        (160, 40),
+        (520, 340),
+        (1180, 40),
+        (1060, 120),
+        (980, 280),
+        (1180, 400),
+        (570, 640),
+        (430, 640),
+        (210, 640),
+        (1020, 760),
+        (1580, 640),
+        (1580, 720),
+        (1260, 880),
+        (1615, 40),
+        (1880, 40)
+    ],
+    'artifact': [(900, 520)],
+    'artifact_name': "ancient shotgun",
+    'exit': [(1280, 520)],
+}
+
+LEVELS = {1: LEVEL_1, 2: LEVEL_2, 3: LEVEL_3}
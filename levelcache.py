@@ -0,0 +1,107 @@
+"""
+Cache of checked custom levels, so showing the level selection screen again doesn't re-read,
+re-parse and re-validate custom.txt unless it changed.
+
+An entry is keyed by path and checked against the file's mtime and size first (one stat call).
+When those changed, the content hash decides: a file that was only touched is still a hit.
+With a cache_dir, valid levels are also saved there in compiled form (see levelpack.py),
+named by content hash, so the next run of the game loads them without parsing.
+"""
+import hashlib
+import os
+
+from level_data import parse_level_file
+from levelcheck import validate_level, validate_data
+from levelpack import compile_level, CompiledLevel
+
+
+def file_digest(path, chunk_size=1 << 16):
+    """blake2b of the file's content, read in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LevelCache:
+    """
+    load(path) returns (data, errors) for a custom.txt style file or a compiled .lvl:
+    data is None when errors isn't empty. Invalid files are cached too, so a broken
+    custom.txt isn't checked again either.
+    """
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.entries = {}   # absolute path -> (mtime_ns, size, digest, data, errors)
+        self.hits = 0       # Same mtime and size
+        self.hash_hits = 0  # Different mtime or size, same content
+        self.disk_hits = 0  # Loaded from cache_dir instead of parsing
+        self.misses = 0     # Parsed and validated
+
+    def load(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry[:2] == (stat.st_mtime_ns, stat.st_size):
+            self.hits += 1
+            return entry[3], entry[4]
+
+        digest = file_digest(path)
+        if entry is not None and entry[2] == digest:
+            self.hash_hits += 1
+            self.entries[path] = (stat.st_mtime_ns, stat.st_size) + entry[2:]
+            return entry[3], entry[4]
+
+        data, errors = self._load_compiled(digest) if not path.endswith('.lvl') else (None, None)
+        if data is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            data, errors = self._parse(path, digest)
+        self._close(entry)
+        self.entries[path] = (stat.st_mtime_ns, stat.st_size, digest, data, errors)
+        return data, errors
+
+    @staticmethod
+    def _close(entry):
+        """Unmap the compiled level of an entry that is being replaced or forgotten."""
+        if entry is not None and isinstance(entry[3], CompiledLevel):
+            entry[3].close()
+
+    def _cache_path(self, digest):
+        return os.path.join(self.cache_dir, f"{digest}.lvl")
+
+    def _load_compiled(self, digest):
+        """Compiled copy of a level with this content, saved by an earlier run. Only valid levels are saved."""
+        if self.cache_dir is None or not os.path.exists(self._cache_path(digest)):
+            return None, None
+        try:
+            return CompiledLevel(self._cache_path(digest)), []
+        except (OSError, ValueError):
+            return None, None   # Unreadable or an older format, parse the source again
+
+    def _parse(self, path, digest):
+        if path.endswith('.lvl'):
+            data = CompiledLevel(path)
+            errors = validate_data(data)
+            return (None if errors else data), errors
+        with open(path, 'r', encoding='utf-8') as file:
+            errors = validate_level(file)
+        if errors:
+            return None, errors
+        data = parse_level_file(path)
+        if self.cache_dir is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                compile_level(data, self._cache_path(digest))
+            except OSError as e:
+                # Read-only install or full disk: the level is fine, it just isn't cached on disk
+                print(f"Could not cache custom level in {self.cache_dir}: {e}")
+        return data, errors
+
+    def forget(self, path):
+        self._close(self.entries.pop(os.path.abspath(path), None))
+
+    def stats(self):
+        return {'hits': self.hits, 'hash_hits': self.hash_hits, 'disk_hits': self.disk_hits,
+                'misses': self.misses, 'entries': len(self.entries)}
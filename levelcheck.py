@@ -0,0 +1,124 @@
+"""
+Checks a custom level as plain data, without building any widgets or loading textures.
+validate_level takes the custom.txt text, validate_data takes parsed level data
+(or a levelpack.CompiledLevel); both return a list of LevelError, empty when the level is fine.
+"""
+from collections import namedtuple
+
+from level_data import iter_level_records
+from spatial import SpatialGrid
+from simulation import aabb_overlap
+
+TILE = 40               # Platform tile size, see Platform / LevelSimulation.TILE
+TRAP_TILE_HEIGHT = 10   # DeathTrap tiles are 40x10
+ENTITY_SIZE = 40        # Player, Enemy, Artifact and LevelExit are 40x40
+MAX_COORDINATE = 1_000_000
+MAX_TILES = 10_000
+
+# Values per tuple in each category
+ARITY = {'platform': 4, 'death_trap': 4, 'enemy': 2, 'artifact': 2, 'spawn_point': 2, 'exit': 2}
+SOLIDS = ('platform', 'death_trap')
+
+
+class LevelError(namedtuple('LevelError', 'line message')):
+    """One problem in a level. line is the custom.txt line number, or None for parsed data."""
+    __slots__ = ()
+
+    def __str__(self):
+        return f"line {self.line}: {self.message}" if self.line is not None else self.message
+
+
+def read_records(lines, errors):
+    """
+    Yield (line number, category, values) for every tuple in custom.txt lines, read the same
+    way parse_level_data does. Lines that can't be read are added to errors instead.
+    """
+    report = lambda number, message: errors.append(LevelError(number, message))
+    for record in iter_level_records(lines, on_error=report):
+        if record.values is not None:
+            yield record
+
+
+def check_values(category, values):
+    """Return (rect, None) for a valid tuple of the category, or (None, message)."""
+    arity = ARITY[category]
+    if not isinstance(values, tuple):
+        return None, f"{category} needs a tuple of {arity} numbers, got {values!r}"
+    if len(values) != arity:
+        return None, f"{category} needs {arity} values, got {len(values)}"
+    for value in values:
+        if type(value) not in (int, float):
+            return None, f"{category} values must be numbers, got {value!r}"
+    x, y = values[0], values[1]
+    # Written so NaN fails as well
+    if not (0 <= x <= MAX_COORDINATE and 0 <= y <= MAX_COORDINATE):
+        return None, f"{category} position ({x}, {y}) is outside 0..{MAX_COORDINATE}"
+    if arity == 2:
+        return (x, y, ENTITY_SIZE, ENTITY_SIZE), None
+    tiles_x, tiles_y = values[2], values[3]
+    # 2.0 is fine: a compiled level stores a whole section as floats when one value isn't whole
+    if not (1 <= tiles_x <= MAX_TILES and 1 <= tiles_y <= MAX_TILES and
+            tiles_x == int(tiles_x) and tiles_y == int(tiles_y)):
+        return None, f"{category} tile counts must be whole numbers in 1..{MAX_TILES}, got ({tiles_x}, {tiles_y})"
+    height = TRAP_TILE_HEIGHT if category == 'death_trap' else TILE
+    return (x, y, TILE * tiles_x, height * tiles_y), None
+
+
+def check_records(records, errors):
+    """
+    Check every (where, category, values) record and then look for things placed inside
+    platforms or death traps. where is a line number, or a label like 'enemy #3'.
+    """
+    solids = []
+    entities = []
+    for where, category, values in records:
+        rect, message = check_values(category, values)
+        if message is not None:
+            errors.append(_error(where, message))
+        elif category in SOLIDS:
+            solids.append((where, category, rect))
+        else:
+            entities.append((where, category, rect))
+
+    # Bigger cells than the game's grid: most platforms then sit in one or two cells
+    grid = SpatialGrid(cell_size=TILE * 4)
+    grid.insert_many((solid, *solid[2]) for solid in solids)
+    for where, category, rect in entities:
+        for solid_where, kind, solid_rect in grid.query(*rect):
+            if aabb_overlap(rect, solid_rect):
+                place = f"line {solid_where}" if type(solid_where) is int else solid_where
+                errors.append(_error(where, f"{category} at ({rect[0]}, {rect[1]}) is inside the {kind} from {place}"))
+                break
+    return errors
+
+
+def _error(where, message):
+    if type(where) is int:
+        return LevelError(where, message)
+    return LevelError(None, f"{where}: {message}")
+
+
+def validate_level(content):
+    """
+    Check custom.txt text, or its lines (an open file is read as it goes).
+    Returns a list of LevelError sorted by line, empty if the level is fine.
+    """
+    if isinstance(content, str):
+        content = content.splitlines()
+    errors = []
+    check_records(read_records(content, errors), errors)
+    errors.sort(key=lambda error: error.line)
+    return errors
+
+
+def validate_data(data):
+    """Check parsed level data (see level_data.py) or a CompiledLevel. Returns a list of LevelError."""
+    errors = []
+    records = []
+    for category in ARITY:
+        for i, values in enumerate(data.get(category, ()) or ()):
+            records.append((f"{category} #{i + 1}", category, tuple(values) if isinstance(values, list) else values))
+    for category in data.keys():
+        if category not in ARITY and category not in ('ground', 'artifact_name'):
+            errors.append(LevelError(None, f"unknown category '{category}'"))
+    return check_records(records, errors)
@@ -0,0 +1,218 @@
+"""
+Compiled levels: level data (see level_data.py) packed into one binary file, so big levels
+load without parsing text or building a tuple per object.
+
+File layout, little endian:
+    header    b'AHLV', version (uint16), section count (uint16)
+    table     one entry per section: name (16 bytes, NUL padded), typecode (1 byte, 'i', 'd' or 's'),
+              fields per row (uint8), row count (uint32), data offset (uint32), data size (uint32)
+    sections  rows stored one after another, int32 ('i') or float64 ('d'); 's' is UTF-8 text.
+              Every section starts on an 8 byte boundary.
+
+Usage:
+    python levelpack.py custom.txt -o custom.lvl
+    python levelpack.py 1 -o level_1.lvl
+"""
+import argparse
+import mmap
+import os
+import struct
+
+from level_data import artifact_name
+from spatial import SpatialGrid
+from simulation import StaticObject, LevelSimulation
+
+MAGIC = b'AHLV'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+ENTRY = struct.Struct('<16scBIII')
+
+
+def _pad(size):
+    return -size % 8
+
+
+def compile_level(data, path):
+    """Write level data (dict of category -> list of tuples, or str) to path. Returns the file size."""
+    sections = []
+    for name, value in data.items():
+        encoded_name = name.encode('utf-8')
+        if len(encoded_name) > 16:
+            raise ValueError(f"Category name '{name}' is longer than 16 bytes")
+        if isinstance(value, str):
+            sections.append((encoded_name, 's', 0, 0, value.encode('utf-8')))
+            continue
+        rows = list(value or ())
+        fields = len(rows[0]) if rows else 0
+        flat = []
+        for row in rows:
+            if len(row) != fields:
+                raise ValueError(f"'{name}' mixes rows of {fields} and {len(row)} values")
+            flat.extend(row)
+        # Whole pixel positions (every built-in level) fit in int32, anything else is kept as float64
+        typecode = 'i' if all(type(v) is int and -2 ** 31 <= v < 2 ** 31 for v in flat) else 'd'
+        sections.append((encoded_name, typecode, fields, len(rows), struct.pack(f'<{len(flat)}{typecode}', *flat)))
+
+    offset = HEADER.size + ENTRY.size * len(sections)
+    offset += _pad(offset)
+    header = [HEADER.pack(MAGIC, VERSION, len(sections))]
+    body = []
+    for name, typecode, fields, count, payload in sections:
+        header.append(ENTRY.pack(name, typecode.encode(), fields, count, offset, len(payload)))
+        body.append(payload + b'\0' * _pad(len(payload)))
+        offset += len(payload) + _pad(len(payload))
+    table = b''.join(header)
+    # Written next to path and swapped in, so a CompiledLevel still mapping the old file keeps
+    # its data (truncating a mapped file makes reads from it crash) and nobody maps half a file
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as file:
+        file.write(table + b'\0' * _pad(len(table)))
+        file.write(b''.join(body))
+    os.replace(temporary, path)
+    return offset
+
+
+class Rows:
+    """Read-only sequence of tuples over a flat memoryview, fields values per row."""
+    def __init__(self, values, fields):
+        self.values = values
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.values) // self.fields if self.fields else 0
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start = index * self.fields
+        return tuple(self.values[start:start + self.fields])
+
+    def __iter__(self):
+        if not self.fields:
+            return iter(())
+        # zip over one iterator groups the flat values into rows without indexing
+        return zip(*[iter(self.values)] * self.fields)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class CompiledLevel:
+    """
+    A compiled level file, memory-mapped. Reads like the level data dict (get, [], in), so
+    LevelSimulation and the LevelContents classes take it as is, but rows are only turned
+    into tuples when they are iterated.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        self._views = [view]    # Released in close(), mmap refuses to close while they are exported
+        magic, version, count = HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled level")
+        if version != VERSION:
+            raise ValueError(f"{path} is version {version}, expected {VERSION}")
+        self.sections = {}
+        for i in range(count):
+            name, typecode, fields, rows, offset, size = ENTRY.unpack_from(view, HEADER.size + i * ENTRY.size)
+            name = name.rstrip(b'\0').decode('utf-8')
+            typecode = typecode.decode()
+            if typecode == 's':
+                self.sections[name] = bytes(view[offset:offset + size]).decode('utf-8')
+            else:
+                values = view[offset:offset + size].cast(typecode)
+                self._views.append(values)
+                self.sections[name] = Rows(values, fields)
+
+    def __reduce__(self):
+        # Workers (simulate.py --workers) map the file again instead of copying it
+        return CompiledLevel, (self.path,)
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def __getitem__(self, name):
+        return self.sections[name]
+
+    def get(self, name, default=None):
+        return self.sections.get(name, default)
+
+    def keys(self):
+        return self.sections.keys()
+
+    def count(self):
+        """Total rows over every section."""
+        return sum(len(rows) for rows in self.sections.values() if isinstance(rows, Rows))
+
+    def static_rects(self):
+        """
+        Yield (StaticObject, x, y, width, height) for the platforms, traps, artifacts and exits,
+        in LevelSimulation order.
+        """
+        tile = LevelSimulation.TILE
+        trap_height = LevelSimulation.TRAP_TILE_HEIGHT
+        for x, y, tiles_x, tiles_y in self.get('ground', ()):
+            width, height = tile * tiles_x, tile * tiles_y
+            yield StaticObject('platform', x, y, width, height), x, y, width, height
+        for x, y, tiles_x, tiles_y in self.get('death_trap', ()):
+            width, height = tile * tiles_x, trap_height * tiles_y
+            yield StaticObject('death_trap', x, y, width, height, damage=5), x, y, width, height
+        for x, y, tiles_x, tiles_y in self.get('platform', ()):
+            width, height = tile * tiles_x, tile * tiles_y
+            yield StaticObject('platform', x, y, width, height), x, y, width, height
+        name = artifact_name(self)
+        for x, y in self.get('artifact', ()):
+            yield StaticObject('artifact', x, y, 40, 40, name=name), x, y, 40, 40
+        for x, y in self.get('exit', ()):
+            yield StaticObject('exit', x, y, 40, 40), x, y, 40, 40
+
+    def build_spatial_index(self, cell_size=40):
+        """Return (static objects, SpatialGrid holding them), filled straight from the mapped rows."""
+        objects = []
+        keep = objects.append
+
+        def rects():
+            # One (obj, x, y, width, height) at a time, so only the objects and the grid stay allocated
+            for rect in self.static_rects():
+                keep(rect[0])
+                yield rect
+
+        grid = SpatialGrid(cell_size=cell_size)
+        grid.insert_many(rects())
+        return objects, grid
+
+    def close(self):
+        self.sections.clear()
+        for view in reversed(self._views):
+            view.release()
+        self._views.clear()
+        self._map.close()
+
+
+def load_source(source):
+    """Level data for '1', '2', '3' or a custom.txt style file."""
+    from level_data import LEVELS, parse_level_file
+    if source in ('1', '2', '3'):
+        return LEVELS[int(source)]
+    return parse_level_file(source)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile a level into the binary level format.")
+    parser.add_argument('source', help="1, 2, 3 or a custom.txt style file")
+    parser.add_argument('-o', '--output', help="output file (default: <source>.lvl)")
+    args = parser.parse_args(argv)
+    output = args.output or (f"level_{args.source}.lvl" if args.source in ('1', '2', '3')
+                             else args.source.rsplit('.', 1)[0] + '.lvl')
+    size = compile_level(load_source(args.source), output)
+    level = CompiledLevel(output)
+    print(f"Wrote {output}: {level.count()} objects, {size} bytes")
+    level.close()
+
+
+if __name__ == "__main__":
+    main()
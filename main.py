@@ -1,10 +1,16 @@
 import os
-import ast
+import importlib
+
+from profiler import StartupTimer, frame_profiler
+startup = StartupTimer()    # Before the Kivy imports below, they are most of the startup time
 
 from utils import resource_path
+from level_data import CATEGORIES, parse_level_data
+from levelcache import LevelCache
 from kivy.resources import resource_add_path
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
+LEVEL_CACHE_DIR = os.path.join(APP_DIR, '.level_cache')   # Compiled copies of custom levels
 resource_add_path(APP_DIR)
 
 
@@ -18,12 +24,15 @@ from kivy.factory import Factory
 from kivy.clock import Clock
 from kivy.properties import StringProperty
 
-from level_1 import Level_1_Class
-from level_2 import Level_2_Class
-from level_3 import Level_3_Class
-from level_custom import Level_Custom_Class
-from level_custom import LevelContents as Custom_LevelContents
-from level_class import SoundManager, DeathTrap, Platform, Enemy, Artifact, Player, LevelExit
+from sounds import SoundManager
+
+# Level screens are only imported and created the first time they are shown (see LazyScreenManager)
+LEVEL_SCREENS = {
+    'level_1': ('level_1', 'Level_1_Class'),
+    'level_2': ('level_2', 'Level_2_Class'),
+    'level_3': ('level_3', 'Level_3_Class'),
+    'level_custom': ('level_custom', 'Level_Custom_Class'),
+}
 
 
 # # Set default font
@@ -60,7 +69,7 @@ class MainMenuScreen(Screen):
             current_screen = app.root.get_screen(app.current_playing_screen)
             
             # Kiểm tra nếu màn hình hiện tại có chứa câu đố
-            if hasattr(current_screen, 'level_contents') and current_screen.level_contents.active_puzzle_popup:
+            if getattr(current_screen, 'level_contents', None) and current_screen.level_contents.active_puzzle_popup:
                 current_screen.level_contents.active_puzzle_popup.dismiss()  # Đóng popup câu đố
                 current_screen.level_contents.active_puzzle_popup = None  # Reset popup
         SoundManager.stop_music()
@@ -72,11 +81,11 @@ class MainMenuScreen(Screen):
 
 class LevelSelectionScreen(Screen):
     custom_level_status = StringProperty("No custom.txt found")  # Use Kivy property
-    categories = {'platform', 'death_trap', 'enemy', 'artifact', 'spawn_point', 'exit'}
+    categories = CATEGORIES
+    level_cache = LevelCache(cache_dir=LEVEL_CACHE_DIR)
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.custom_level_data = None
-        self.check_custom_level()
+        self.custom_level_data = None   # Checked in on_enter, not while the app starts
 
     def back(self):
         print("Back to main menu")
@@ -112,23 +121,31 @@ class LevelSelectionScreen(Screen):
         self.check_custom_level()
 
     def check_custom_level(self):
-        """Check if custom.txt exists and load its contents"""
+        """Check if custom.lvl (compiled with levelpack.py) or custom.txt exists and load its contents"""
         try:
             app = App.get_running_app()
-            if os.path.exists("custom.txt"):
-                with open("custom.txt", "r", encoding="utf-8") as file:
-                    self.custom_level_data = self.parse_level_data(file.read())
-                    if self.try_load(self.custom_level_data):
-                        app.custom_level_data = self.custom_level_data
-                        self.custom_level_status = "Level loaded"
-                    else:
-                        self.custom_level_data = None
-                        self.custom_level_status = "Incorrect data format"
-                print("Custom level loaded successfully")
+            if os.path.exists("custom.lvl"):
+                path = "custom.lvl"
+            elif os.path.exists("custom.txt"):
+                path = "custom.txt"
             else:
                 self.custom_level_data = None
                 self.custom_level_status = "No custom.txt found"
                 print("No custom.txt file found")
+                return
+            # Only re-read when the file changed, this runs every time the screen is shown
+            data, errors = self.level_cache.load(path)
+            if errors:
+                self.custom_level_data = None
+                more = f" (+{len(errors) - 1} more)" if len(errors) > 1 else ""
+                self.custom_level_status = f"Incorrect data format, {errors[0]}{more}"
+                for error in errors:
+                    print(f"custom level: {error}")
+            else:
+                self.custom_level_data = data
+                app.custom_level_data = data
+                self.custom_level_status = "Level loaded"
+                print("Custom level loaded successfully")
         except Exception as e:
             self.custom_level_data = None
             self.custom_level_status = str(e)
@@ -136,61 +153,7 @@ class LevelSelectionScreen(Screen):
 
     def parse_level_data(self, content: str):
         """Parse the raw data from file into categories for easier processing"""
-        result = {}
-        current_categ = None
-        lines = content.strip().split('\n')
-        for line in lines:
-            line = line.strip()
-            if ':' in line:
-                current_categ = line.split(':')[0].strip()
-                if current_categ in self.categories:
-                    result[current_categ] = []
-                else:
-                    raise ValueError(f"Category \'{current_categ}\' not found")
-            elif '(' in line:
-                print(line)
-                line = f"[{line}]" # Enclose line with [] to make it a list
-                parsed = ast.literal_eval(line)
-                result[current_categ].extend(parsed)
-            else:
-                continue
-        return result
-
-    def try_load(self, data: dict):
-        """Try to load the parsed data to see if it was formatted correctly"""
-        try:
-            if data.get('spawn_point'):
-                player_data = data['spawn_point']
-                x, y = player_data[0]
-                Player(x=x, y=y, width=40, height=40)
-            if data.get('death_trap'):
-                death_trap_data = data['death_trap']
-                for x, y, num_tiles_x, num_tiles_y, in death_trap_data:
-                    death_trap = DeathTrap(x, y, num_tiles_x, num_tiles_y,
-                                           texture_path=resource_path('assets/sprites/tech_laser.png'))
-            if data.get('platform'):
-                platforms_data = data['platform']
-                for x, y, num_tiles_x, num_tiles_y in platforms_data:
-                    platform = Platform(x, y, num_tiles_x, num_tiles_y,
-                                        texture_path=resource_path(
-                                            'assets/sprites/PixelTexturePack/Textures/Tech/BIGSQUARES.png'))
-            if data.get('enemy'):
-                enemy_data = data['enemy']
-                for x, y in enemy_data:
-                    enemy = Enemy(x=x, y=y, width=40, height=40,
-                                  texture_path=resource_path('assets/sprites/Characters/Enemy.png'))
-            if data.get('artifact'):
-                artifact_data = data['artifact']
-                for x, y in artifact_data:
-                    artifact = Artifact(name="Custom", x=x, y=y)
-            if data.get('exit'):
-                exit_data = data['exit']
-                for x, y in exit_data:
-                    exit = LevelExit(x=x, y=y)
-
-        except Exception as e:
-            return False
-        return True
+        return parse_level_data(content, self.categories)
 
 
 class GuideScreen(Screen):
@@ -205,7 +168,7 @@ class GuideScreen(Screen):
         # If return level, open popup pause
         if previous.startswith('level'):
             app.is_paused = True
-            if hasattr(app.root.get_screen(previous), 'level_contents'):
+            if getattr(app.root.get_screen(previous), 'level_contents', None):
                 app.root.get_screen(previous).level_contents.paused = True
             popup = Factory.PausePopup()
             popup.open()
@@ -236,7 +199,7 @@ class SettingScreen(Screen):
         # If return level, open popup pause
         if previous.startswith('level'):
             app.is_paused = True
-            if hasattr(app.root.get_screen(previous), 'level_contents'):
+            if getattr(app.root.get_screen(previous), 'level_contents', None):
                 app.root.get_screen(previous).level_contents.paused = True
             popup = Factory.PausePopup()
             popup.open()
@@ -250,7 +213,7 @@ class PausePopup(Popup):
         app = App.get_running_app()
         app.is_paused = False
         # Resume logic: reset pause flag trong LevelContents
-        if hasattr(app.root.get_screen(app.current_playing_screen), 'level_contents'):
+        if getattr(app.root.get_screen(app.current_playing_screen), 'level_contents', None):
             app.root.get_screen(app.current_playing_screen).level_contents.paused = False
         SoundManager.play_music(app.current_playing_screen)
         self.dismiss()
@@ -314,13 +277,18 @@ class GameOverPopup(Popup):
                 if hasattr(puzzle, 'reset_puzzle'):
                     puzzle.reset_puzzle()
             
+            # Textures stay cached, so rebuilding the level below doesn't decode them again
+            if screen.level_contents:
+                screen.level_contents.dispose()
             screen.remove_widget(screen.level_contents)
             screen.level_contents = None
         
-        screen.initialized = False
-        screen.on_enter()
+        # reset_level stops the old level (and a loader still building it) and loads it again
         if hasattr(screen, 'reset_level'):
             screen.reset_level()
+        else:
+            screen.initialized = False
+            screen.on_enter()
         
         # Reset game state
         app.is_paused = False
@@ -353,11 +321,14 @@ class GameOverPopup(Popup):
             for puzzle in getattr(screen.level_contents, 'puzzles', []):
                 if hasattr(puzzle, 'reset_puzzle'): 
                     puzzle.reset_puzzle()
+            screen.level_contents.dispose()
             
         # Reset the screen completely
         screen.clear_widgets()
         screen.initialized = False
         screen.level_contents = None
+        from level_class import TextureCache    # Imported by the level screen already
+        TextureCache.evict_unused()
         # Go back to main menu
         app.root.current = 'main_menu'
         self.dismiss()
@@ -368,27 +339,63 @@ class GameOverPopup(Popup):
 Factory.register('GameOverPopup', cls=GameOverPopup)
 Factory.register('PausePopup', cls=PausePopup)
 
+class LazyScreenManager(ScreenManager):
+    """ScreenManager that imports and creates a registered screen the first time it is asked for."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lazy_screens = {}  # name -> (module, class name)
+
+    def register(self, name, module, class_name):
+        self.lazy_screens[name] = (module, class_name)
+
+    def get_screen(self, name):
+        # Setting current calls get_screen too, so switching to a screen is enough to create it
+        if name in self.lazy_screens:
+            module, class_name = self.lazy_screens.pop(name)
+            screen_class = getattr(importlib.import_module(module), class_name)
+            self.add_widget(screen_class(name=name))
+        return super().get_screen(name)
+
+    def has_screen(self, name):
+        return name in self.lazy_screens or super().has_screen(name)
+
+
 class ArtifactHunterApp(App):
     current_playing_screen = None
     is_paused = False  # NEW: Pause state flag
     custom_level_data = None
+    profiler_overlay = None
 
     def build(self):
         Window.bind(on_key_down=self.on_key_down)
-        SoundManager.load()
 
-        sm = ScreenManager()
+        sm = LazyScreenManager()
         sm.add_widget(MainMenuScreen(name='main_menu'))
         sm.add_widget(LevelSelectionScreen(name='level_selection'))
         sm.add_widget(GuideScreen(name='guide'))
         sm.add_widget(SettingScreen(name='settings'))
-        sm.add_widget(Level_1_Class(name='level_1'))
-        sm.add_widget(Level_2_Class(name='level_2'))
-        sm.add_widget(Level_3_Class(name='level_3'))
-        sm.add_widget(Level_Custom_Class(name='level_custom'))
+        for name, (module, class_name) in LEVEL_SCREENS.items():
+            sm.register(name, module, class_name)
+        startup.mark('build')
         return sm
 
+    def on_start(self):
+        Window.bind(on_flip=self.on_first_frame)
+
+    def on_first_frame(self, *args):
+        Window.unbind(on_flip=self.on_first_frame)
+        startup.mark('first frame')
+        print(startup.report())
+        # Sounds are loaded when first played, the rest one per frame now that the menu is up
+        SoundManager.preload()
+
     def on_key_down(self, window, key, *args):
+        if key == 284:  # F3: frame-time overlay
+            if self.profiler_overlay is None:
+                from level_class import ProfilerOverlay
+                self.profiler_overlay = ProfilerOverlay()
+            self.profiler_overlay.toggle()
+            return True
         if key == 27:  # ESC
             current = self.root.current
             if self.is_paused:
@@ -398,7 +405,7 @@ class ArtifactHunterApp(App):
                         w.dismiss()
                         self.is_paused = False
                         # Resume: turn off pause in LevelContents
-                        if hasattr(self.root.get_screen(current), 'level_contents'):
+                        if getattr(self.root.get_screen(current), 'level_contents', None):
                             self.root.get_screen(current).level_contents.paused = False
                         break
             else:
@@ -407,14 +414,22 @@ class ArtifactHunterApp(App):
                     self.current_playing_screen = current
                     self.is_paused = True
                     # Pause:turn on pause in LevelContents
-                    if hasattr(self.root.get_screen(current), 'level_contents'):
+                    if getattr(self.root.get_screen(current), 'level_contents', None):
                         self.root.get_screen(current).level_contents.paused = True
                     popup = Factory.PausePopup()
                     popup.open()
             return True
 
+    def on_stop(self):
+        # Set ARTIFACTHUNTER_PROFILE=frames.csv (or .jsonl) to keep the frame timings of this session
+        profile_path = os.environ.get('ARTIFACTHUNTER_PROFILE')
+        if profile_path:
+            count = frame_profiler.dump(profile_path)
+            print(f"Wrote {count} frame timings to {profile_path}")
+
 if __name__ == "__main__":
     print("-----------------------")
     Window.top = 25
     Window.left = 0
+    startup.mark('imports')
     ArtifactHunterApp().run()
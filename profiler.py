@@ -0,0 +1,159 @@
+"""
+Per-frame timing of the game loop. The overlay that shows it lives in level_class.py. One shared instance, frame_profiler, is used by every level.
+StartupTimer times how long the game takes to show its menu (see main.py).
+"""
+import csv
+import json
+import time
+from collections import deque
+
+FRAME_BUDGET_MS = 1000 / 60
+
+
+class _Phase:
+    """Context manager returned by FrameProfiler.phase."""
+    __slots__ = ('current', 'name', 'start')
+
+    def __init__(self, current, name):
+        self.current = current
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        self.current[self.name] = self.current.get(self.name, 0.0) + elapsed
+        return False
+
+
+class FrameProfiler:
+    """
+    Records how long each phase of a frame took (in ms) and a few object counts.
+    Percentiles are computed over the last `window` frames; the last `history` frames
+    are kept for dump().
+    """
+    def __init__(self, window=300, history=36000):
+        self.window = window
+        self.timings = {}   # phase name -> deque of ms, one entry per frame
+        self.counts = {}    # count name -> last value
+        self.records = deque(maxlen=history)
+        self.current = {}
+        self.frame_start = None
+        self.frame_count = 0
+
+    def begin_frame(self):
+        self.current = {}
+        self.frame_start = time.perf_counter()
+
+    def phase(self, name):
+        """Use as `with profiler.phase('enemies'):`. A phase run several times in a frame adds up."""
+        return _Phase(self.current, name)
+
+    def count(self, name, value):
+        self.counts[name] = value
+        self.current['#' + name] = value
+
+    def end_frame(self, label=None):
+        if self.frame_start is None:
+            return
+        self.current['frame'] = (time.perf_counter() - self.frame_start) * 1000
+        self.frame_start = None
+        for name, value in self.current.items():
+            if name.startswith('#'):
+                continue
+            if name not in self.timings:
+                self.timings[name] = deque(maxlen=self.window)
+            self.timings[name].append(value)
+        record = dict(self.current)
+        record['n'] = self.frame_count
+        if label:
+            record['level'] = label
+        self.records.append(record)
+        self.frame_count += 1
+
+    @staticmethod
+    def _percentile(ordered, fraction):
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    def percentiles(self, name):
+        """Return (p50, p95, p99) in ms for a phase over the rolling window."""
+        values = self.timings.get(name)
+        if not values:
+            return 0.0, 0.0, 0.0
+        ordered = sorted(values)
+        return (self._percentile(ordered, 0.50),
+                self._percentile(ordered, 0.95),
+                self._percentile(ordered, 0.99))
+
+    def summary(self):
+        """Phase name -> (p50, p95, p99), slowest p95 first."""
+        stats = {name: self.percentiles(name) for name in self.timings}
+        return dict(sorted(stats.items(), key=lambda item: item[1][1], reverse=True))
+
+    def report(self):
+        """Text used by the on-screen overlay."""
+        lines = [f"{'phase':<12}{'p50':>7}{'p95':>7}{'p99':>7}  ms"]
+        for name, (p50, p95, p99) in self.summary().items():
+            flag = ' !' if name == 'frame' and p95 > FRAME_BUDGET_MS else ''
+            lines.append(f"{name:<12}{p50:>7.2f}{p95:>7.2f}{p99:>7.2f}{flag}")
+        for name, value in self.counts.items():
+            lines.append(f"{name:<12}{value:>7}")
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """Write every recorded frame to path, as CSV if it ends with .csv, JSON lines otherwise."""
+        records = list(self.records)
+        if path.endswith('.csv'):
+            fields = []
+            for record in records:
+                fields.extend(key for key in record if key not in fields)
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            with open(path, 'w', encoding='utf-8') as file:
+                for record in records:
+                    file.write(json.dumps(record) + '\n')
+        return len(records)
+
+    def reset(self):
+        self.timings.clear()
+        self.counts.clear()
+        self.records.clear()
+        self.frame_count = 0
+
+
+frame_profiler = FrameProfiler()
+
+
+class StartupTimer:
+    """
+    Milestones of the game's startup, in ms since the timer was created (main.py creates it
+    before importing Kivy). report() gives each step and the running total.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.marks = {}     # milestone -> ms since start, in the order they happened
+
+    def mark(self, name):
+        self.marks[name] = (time.perf_counter() - self.start) * 1000
+        return self.marks[name]
+
+    def steps(self):
+        """Milestone -> ms since the previous milestone."""
+        steps = {}
+        previous = 0.0
+        for name, at in self.marks.items():
+            steps[name] = at - previous
+            previous = at
+        return steps
+
+    def report(self):
+        parts = [f"{name} {step:.0f} ms" for name, step in self.steps().items()]
+        total = max(self.marks.values(), default=0.0)
+        return f"Startup: {', '.join(parts)}, {total:.0f} ms in total"
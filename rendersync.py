@@ -0,0 +1,58 @@
+"""
+Dirty tracking for the canvas instructions of moving entities. The entities
+in level_class.py wrap their Rectangles in SyncedRect and redraw from sync().
+
+Kivy rebuilds an instruction's vertices on every pos/size/texture assignment, even when the
+value is the same. SyncedRect keeps what it last wrote and only assigns what changed, and
+every assignment is counted in canvas_writes, which the level reports to the frame profiler.
+"""
+
+_KEEP = object()    # SyncedRect.set: leave this one as it is
+
+
+class WriteCounter:
+    """Counts canvas instruction writes. take() returns the count since the last take()."""
+    def __init__(self):
+        self.total = 0
+        self.taken = 0
+
+    def take(self):
+        count = self.total - self.taken
+        self.taken = self.total
+        return count
+
+
+canvas_writes = WriteCounter()
+
+
+class SyncedRect:
+    """One canvas instruction with pos, size and texture (a Rectangle), written only on change."""
+    __slots__ = ('target', 'pos', 'size', 'texture', 'counter')
+
+    def __init__(self, target, counter=canvas_writes):
+        self.target = target
+        self.pos = tuple(target.pos)
+        self.size = tuple(target.size)
+        self.texture = getattr(target, 'texture', None)
+        self.counter = counter
+
+    def set(self, pos=_KEEP, size=_KEEP, texture=_KEEP):
+        """pos and size are tuples. Returns how many attributes were written."""
+        writes = 0
+        if pos is not _KEEP and pos != self.pos:
+            self.target.pos = self.pos = pos
+            writes += 1
+        if size is not _KEEP and size != self.size:
+            self.target.size = self.size = size
+            writes += 1
+        if texture is not _KEEP and texture is not self.texture:
+            self.target.texture = self.texture = texture
+            writes += 1
+        self.counter.total += writes
+        return writes
+
+
+def health_bar_rect(x, y, width, height, health, max_health, gap=5, thickness=5):
+    """(pos, size) of the health bar drawn above an entity, as wide as its health is full."""
+    fraction = max(health, 0) / max_health if max_health else 0
+    return (x, y + height + gap), (width * fraction, thickness)
@@ -0,0 +1,251 @@
+"""
+Input recording and deterministic replay of level runs.
+
+A run is recorded as the keys held on every tick plus what's needed to play it again:
+the level (id and a hash of its data), the random seed, the tick length and world width.
+Replaying drives LevelSimulation with the same keys as fast as it can, and must end with
+the same outcome on the same tick. That makes a recording a regression check: see
+`python replay.py play` below, which exits with 1 when the run diverges. The seed is the
+level's (puzzle order, particles), nothing the headless replay draws depends on it.
+
+File layout, little endian:
+    header    b'AHRP', version (uint16), outcome (uint8, see OUTCOMES), seed (uint64),
+              tick length (float64, seconds), world width (uint32), level id (16 bytes, NUL padded),
+              level hash (16 bytes), end tick (uint32), run count (uint32)
+    runs      (ticks (uint16), key mask (uint8)) per run of ticks holding the same keys
+
+Usage:
+    python replay.py record --level 3 --seed 7 -o run.ahr
+    python replay.py play run.ahr
+    python replay.py play run.ahr --backend numpy --repeat 20
+"""
+import argparse
+import hashlib
+import os
+import struct
+import time
+from collections import namedtuple
+
+from simulation import LevelSimulation, FIXED_DT
+
+MAGIC = b'AHRP'
+VERSION = 1
+HEADER = struct.Struct('<4sHBQdI16s16sII')
+RUN = struct.Struct('<HB')
+MAX_RUN = 0xFFFF
+OUTCOMES = ('timeout', 'exit', 'dead')
+
+# Keys that mean the same thing to Player.process_input share a bit
+KEY_BITS = {'up': 1, 'w': 1, 'left': 2, 'a': 2, 'right': 4, 'd': 4, 'spacebar': 8}
+KEY_NAMES = ('up', 'left', 'right', 'spacebar')    # Bit order
+# Keys held for every possible mask, so a replay doesn't build a tuple per tick
+MASK_KEYS = [tuple(name for bit, name in enumerate(KEY_NAMES) if mask >> bit & 1) for mask in range(16)]
+
+
+def keys_to_mask(keys):
+    """Bitmask of the keys in the set that the game reads, anything else is dropped."""
+    mask = 0
+    for key in keys:
+        mask |= KEY_BITS.get(key, 0)
+    return mask
+
+
+def level_digest(data):
+    """
+    Hash of level data (dict, see level_data.py, or a levelpack.CompiledLevel).
+    Numbers are hashed as floats, so a level and its compiled copy hash the same.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for category in sorted(data.keys()):
+        value = data[category]
+        digest.update(category.encode('utf-8') + b'\0')
+        if isinstance(value, str):
+            digest.update(value.encode('utf-8'))
+            continue
+        for row in value or ():
+            digest.update(struct.pack(f'<{len(row)}d', *row))
+        digest.update(b'\0')
+    return digest.digest()
+
+
+class InputLog:
+    """
+    A recorded run: masks holds one key mask per tick. outcome and end_tick are how the
+    recorded run ended ('timeout' also covers a run that was quit).
+    """
+    def __init__(self, level, digest, seed=0, fixed_dt=FIXED_DT, world_width=1920):
+        if len(level.encode('utf-8')) > 16:
+            raise ValueError(f"Level id '{level}' is longer than 16 bytes")
+        self.level = level
+        self.digest = digest
+        self.seed = seed
+        self.fixed_dt = fixed_dt
+        self.world_width = world_width
+        self.masks = bytearray()
+        self.outcome = 'timeout'
+        self.end_tick = 0
+
+    def __len__(self):
+        return len(self.masks)
+
+    def record(self, keys):
+        """Add the keys held for the next tick."""
+        self.masks.append(keys_to_mask(keys))
+
+    def finish(self, outcome, tick):
+        self.outcome = outcome or 'timeout'
+        self.end_tick = tick
+
+    def keys_at(self, tick):
+        """Keys held on a tick, none after the end of the recording."""
+        return MASK_KEYS[self.masks[tick]] if tick < len(self.masks) else ()
+
+    def runs(self):
+        """(ticks, mask) for every run of ticks with the same keys held."""
+        runs = []
+        masks = self.masks
+        start = 0
+        for tick in range(1, len(masks) + 1):
+            if tick == len(masks) or masks[tick] != masks[start] or tick - start == MAX_RUN:
+                runs.append((tick - start, masks[start]))
+                start = tick
+        return runs
+
+    def to_bytes(self):
+        runs = self.runs()
+        header = HEADER.pack(MAGIC, VERSION, OUTCOMES.index(self.outcome), self.seed, self.fixed_dt,
+                             self.world_width, self.level.encode('utf-8'), self.digest, self.end_tick, len(runs))
+        return header + b''.join(RUN.pack(ticks, mask) for ticks, mask in runs)
+
+    @classmethod
+    def from_bytes(cls, content):
+        magic, version, outcome, seed, fixed_dt, world_width, level, digest, end_tick, count = \
+            HEADER.unpack_from(content, 0)
+        if magic != MAGIC:
+            raise ValueError("Not an input recording")
+        if version != VERSION:
+            raise ValueError(f"Input recording is version {version}, expected {VERSION}")
+        if len(content) != HEADER.size + count * RUN.size:
+            raise ValueError(f"Input recording should hold {count} runs, the file is cut short or too long")
+        log = cls(level.rstrip(b'\0').decode('utf-8'), digest, seed, fixed_dt, world_width)
+        for ticks, mask in RUN.iter_unpack(memoryview(content)[HEADER.size:]):
+            log.masks.extend(bytes((mask,)) * ticks)
+        log.finish(OUTCOMES[outcome], end_tick)
+        return log
+
+    def save(self, path):
+        # Written next to path and swapped in, like levelpack.compile_level
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as file:
+            file.write(self.to_bytes())
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as file:
+            return cls.from_bytes(file.read())
+
+
+class InputRecorder:
+    """Policy (see LevelSimulation.run) that asks another policy for the keys and records them."""
+    def __init__(self, policy, log):
+        self.policy = policy
+        self.log = log
+
+    def __call__(self, sim):
+        keys = self.policy(sim) if self.policy else ()
+        self.log.record(keys)
+        return keys
+
+
+class ReplayPolicy:
+    """Policy holding the keys of a recording."""
+    def __init__(self, log):
+        self.log = log
+
+    def __call__(self, sim):
+        return self.log.keys_at(sim.tick_count)
+
+
+ReplayResult = namedtuple('ReplayResult', 'outcome tick matches seconds speedup')
+
+
+def record_run(data, policy, level, seed=0, max_ticks=7200, simulation_class=LevelSimulation,
+               world_width=1920, fixed_dt=FIXED_DT):
+    """Play the level headless with policy and return its InputLog."""
+    log = InputLog(level, level_digest(data), seed, fixed_dt, world_width)
+    sim = simulation_class(data, world_width=world_width, fixed_dt=fixed_dt)
+    outcome = sim.run(max_ticks, InputRecorder(policy, log))
+    log.finish(outcome, sim.tick_count)
+    return log
+
+
+def replay(log, data, simulation_class=LevelSimulation):
+    """
+    Play a recording again on the level data, unthrottled. matches is True when it ends with
+    the recorded outcome on the recorded tick; speedup is simulated time over real time.
+    """
+    if level_digest(data) != log.digest:
+        raise ValueError(f"Level '{log.level}' changed since the run was recorded")
+    start = time.perf_counter()
+    sim = simulation_class(data, world_width=log.world_width, fixed_dt=log.fixed_dt)
+    outcome = sim.run(log.end_tick, ReplayPolicy(log))
+    seconds = time.perf_counter() - start
+    tick = sim.tick_count
+    speedup = tick * log.fixed_dt / seconds if seconds else float('inf')
+    return ReplayResult(outcome, tick, (outcome, tick) == (log.outcome, log.end_tick), seconds, speedup)
+
+
+def main(argv=None):
+    from simulate import load_level, RandomPolicy, ScriptPolicy
+    from batch import BatchLevelSimulation, HAVE_NUMPY
+
+    parser = argparse.ArgumentParser(description="Record level runs and replay them deterministically.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    record = commands.add_parser('record', help="play a level headless and save its inputs")
+    record.add_argument('--level', default='1', choices=['1', '2', '3', 'custom'])
+    record.add_argument('--file', default='custom.txt', help="custom level file, used with --level custom")
+    record.add_argument('--seed', type=int, default=0, help="seed of the random policy")
+    record.add_argument('--script', help="input script file (see simulate.py) instead of the random policy")
+    record.add_argument('--seconds', type=float, default=120, help="simulated time limit")
+    record.add_argument('--world-width', type=int, default=1920)
+    record.add_argument('-o', '--output', default='run.ahr')
+    play = commands.add_parser('play', help="replay a recording and check it ends the same way")
+    play.add_argument('recording')
+    play.add_argument('--file', help="level file, for recordings of custom levels (default: custom.txt)")
+    play.add_argument('--backend', default='objects', choices=['objects', 'numpy'])
+    play.add_argument('--repeat', type=int, default=1, help="replay this many times, for timing")
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        data = load_level(args.level, args.file)
+        if args.script:
+            with open(args.script, 'r', encoding='utf-8') as file:
+                policy = ScriptPolicy.parse(file.read())
+        else:
+            policy = RandomPolicy(args.seed)
+        log = record_run(data, policy, args.level, seed=args.seed, max_ticks=int(args.seconds / FIXED_DT),
+                         world_width=args.world_width)
+        log.save(args.output)
+        print(f"Recorded {log.outcome} at tick {log.end_tick} on level {log.level}: "
+              f"{len(log.runs())} runs, {os.path.getsize(args.output)} bytes in {args.output}")
+        return 0
+
+    if args.backend == 'numpy' and not HAVE_NUMPY:
+        parser.error("--backend numpy needs numpy installed")
+    log = InputLog.load(args.recording)
+    data = load_level(log.level, args.file)
+    simulation_class = BatchLevelSimulation if args.backend == 'numpy' else LevelSimulation
+    results = [replay(log, data, simulation_class) for _ in range(args.repeat)]
+    result = results[-1]
+    best = max(r.speedup for r in results)
+    print(f"Recorded {log.outcome} at tick {log.end_tick}, replayed {result.outcome} at tick {result.tick} "
+          f"({best:.0f}x real time)")
+    if not all(r.matches for r in results):
+        print("Replay diverged from the recording")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
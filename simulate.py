@@ -0,0 +1,196 @@
+"""
+Headless batch simulator. Plays a level many times without opening a window and prints
+how often the player reaches the exit, dies or runs out of time.
+
+Usage:
+    python simulate.py --level 3 --episodes 1000
+    python simulate.py --level custom --file custom.txt --policy script --script inputs.txt
+    python simulate.py --level custom --file custom.lvl    (compiled with levelpack.py)
+
+A script file has one "<ticks> <key> <key>..." entry per line, e.g. "45 right spacebar".
+Keys are the names Player.process_input reads: up/w, left/a, right/d, spacebar.
+"""
+import argparse
+import json
+import random
+import time
+from multiprocessing import Pool
+from statistics import mean, median
+
+from level_data import LEVELS, parse_level_file
+from simulation import LevelSimulation, FIXED_DT
+from batch import BatchLevelSimulation, HAVE_NUMPY
+from levelpack import CompiledLevel
+
+# Key combos the random policy picks from
+RANDOM_ACTIONS = [
+    (),
+    ('right',),
+    ('left',),
+    ('up',),
+    ('right', 'up'),
+    ('left', 'up'),
+    ('spacebar',),
+    ('right', 'spacebar'),
+    ('left', 'spacebar'),
+]
+
+
+class RandomPolicy:
+    """Hold a random key combo for a random number of ticks, then pick another one."""
+    def __init__(self, seed, min_hold=10, max_hold=40):
+        self.rng = random.Random(seed)
+        self.min_hold = min_hold
+        self.max_hold = max_hold
+        self.keys = ()
+        self.ticks_left = 0
+
+    def __call__(self, sim):
+        if self.ticks_left <= 0:
+            self.keys = self.rng.choice(RANDOM_ACTIONS)
+            self.ticks_left = self.rng.randint(self.min_hold, self.max_hold)
+        self.ticks_left -= 1
+        return self.keys
+
+
+class ScriptPolicy:
+    """Replay a list of (ticks, keys) entries. No keys are held once the script is over."""
+    def __init__(self, entries):
+        self.entries = entries
+
+    @classmethod
+    def parse(cls, content):
+        entries = []
+        for line_number, line in enumerate(content.splitlines(), start=1):
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            ticks, *keys = line.split()
+            if not ticks.isdigit():
+                raise ValueError(f"Line {line_number}: tick count expected, got '{ticks}'")
+            entries.append((int(ticks), tuple(keys)))
+        return cls(entries)
+
+    def __call__(self, sim):
+        tick = sim.tick_count
+        for ticks, keys in self.entries:
+            if tick < ticks:
+                return keys
+            tick -= ticks
+        return ()
+
+
+def load_level(level, path=None):
+    """Return the level data for 1, 2, 3 or 'custom' (read from path, compiled if it ends with .lvl)."""
+    if level == 'custom' and path and path.endswith('.lvl'):
+        return CompiledLevel(path)
+    if level == 'custom':
+        return parse_level_file(path or 'custom.txt')
+    return LEVELS[int(level)]
+
+
+# Set once per worker process by _init_worker, so the level isn't pickled for every episode
+_worker_level = None
+_worker_options = None
+
+
+def _init_worker(level_data, options):
+    global _worker_level, _worker_options
+    _worker_level = level_data
+    _worker_options = options
+
+
+def run_episode(episode):
+    """Play one episode in the current worker. Returns a dict of results."""
+    options = _worker_options
+    if options['policy'] == 'script':
+        policy = ScriptPolicy(options['script'])
+    else:
+        policy = RandomPolicy(options['seed'] + episode)
+    simulation_class = BatchLevelSimulation if options['backend'] == 'numpy' else LevelSimulation
+    sim = simulation_class(_worker_level, world_width=options['world_width'], fixed_dt=1 / options['tick_rate'])
+    outcome = sim.run(options['max_ticks'], policy)
+    return {
+        'episode': episode,
+        'outcome': outcome,
+        'ticks': sim.tick_count,
+        'health': sim.player.health,
+        'enemies_killed': sim.enemies_killed,
+        'artifacts': len(sim.player.inventory),
+    }
+
+
+def summarize(results, elapsed):
+    total = len(results)
+    summary = {'episodes': total, 'seconds': round(elapsed, 3)}
+    for outcome in ('exit', 'dead', 'timeout'):
+        matching = [r for r in results if r['outcome'] == outcome]
+        summary[outcome] = len(matching)
+        summary[f'{outcome}_rate'] = round(len(matching) / total, 4) if total else 0
+        if matching and outcome != 'timeout':
+            ticks = [r['ticks'] for r in matching]
+            summary[f'{outcome}_ticks_mean'] = round(mean(ticks), 1)
+            summary[f'{outcome}_ticks_median'] = median(ticks)
+    if total:
+        summary['enemies_killed_mean'] = round(mean(r['enemies_killed'] for r in results), 2)
+        summary['artifact_rate'] = round(sum(1 for r in results if r['artifacts']) / total, 4)
+    ticks = sum(r['ticks'] for r in results)
+    summary['ticks_per_second'] = int(ticks / elapsed) if elapsed else 0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run levels headless and report completion/death statistics.")
+    parser.add_argument('--level', default='1', choices=['1', '2', '3', 'custom'])
+    parser.add_argument('--file', default='custom.txt', help="custom level file (.txt or compiled .lvl), used with --level custom")
+    parser.add_argument('--episodes', type=int, default=100)
+    parser.add_argument('--seconds', type=float, default=120, help="simulated time limit per episode")
+    parser.add_argument('--policy', default='random', choices=['random', 'script'])
+    parser.add_argument('--script', help="input script file, used with --policy script")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help="process count (default: CPU count)")
+    parser.add_argument('--world-width', type=int, default=1920, help="stands in for Window.width")
+    parser.add_argument('--tick-rate', type=float, default=1 / FIXED_DT, help="simulation ticks per second")
+    parser.add_argument('--backend', default='objects', choices=['objects', 'numpy'],
+                        help="numpy steps enemies and projectiles as arrays (needs numpy)")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args(argv)
+    if args.backend == 'numpy' and not HAVE_NUMPY:
+        parser.error("--backend numpy needs numpy installed")
+
+    level_data = load_level(args.level, args.file)
+    script = None
+    if args.policy == 'script':
+        if not args.script:
+            parser.error("--policy script needs --script")
+        with open(args.script, 'r', encoding='utf-8') as file:
+            script = ScriptPolicy.parse(file.read()).entries
+    options = {
+        'policy': args.policy,
+        'script': script,
+        'seed': args.seed,
+        'max_ticks': int(args.seconds * args.tick_rate),
+        'tick_rate': args.tick_rate,
+        'world_width': args.world_width,
+        'backend': args.backend,
+    }
+
+    start = time.perf_counter()
+    if args.workers == 1:
+        _init_worker(level_data, options)
+        results = [run_episode(episode) for episode in range(args.episodes)]
+    else:
+        with Pool(args.workers, initializer=_init_worker, initargs=(level_data, options)) as pool:
+            results = pool.map(run_episode, range(args.episodes), chunksize=max(1, args.episodes // 64))
+    summary = summarize(results, time.perf_counter() - start)
+
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        for key, value in summary.items():
+            print(f"{key:>22}: {value}")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
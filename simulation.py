@@ -0,0 +1,898 @@
+"""
+Game rules that don't depend on Kivy: the fixed timestep loop, the simulation clock, the
+physics and the rules of a level tick (run_tick). The levels in level_class.py run their
+ticks through this module and only draw the result; LevelSimulation runs the same ticks
+with no window, on plain Body objects.
+"""
+import weakref
+from contextlib import nullcontext
+
+from level_data import artifact_name
+from spatial import SpatialGrid
+
+FIXED_DT = 1 / 60   # One simulation tick. Levels always step with this, whatever the frame rate is.
+MAX_STEPS_PER_FRAME = 5  # After a long hitch, drop the backlog instead of trying to catch up forever
+
+# Rates (Hz) and priorities (lower runs first) for TickScheduler
+PHYSICS_RATE = None     # Every tick
+INTERACTION_RATE = 30
+AI_RATE = 10
+PRIORITY_INPUT = -10     # Input recording, before the tick reads the keys (see replay.py)
+PRIORITY_PHYSICS = 0
+PRIORITY_INTERACTION = 10
+PRIORITY_AI = 20
+
+# Enemies further than this (px, center to center) from the player sleep. Enemies shoot
+# within 300px, the rest is slack for the player moving between two AI_RATE refreshes.
+ACTIVITY_RADIUS = 600
+
+_NO_PHASE = nullcontext()     # LevelSimulation.phase: headless ticks aren't profiled
+
+
+class SimulationClock:
+    """
+    Time as seen by the game logic. It only moves when the simulation ticks,
+    so cooldowns give the same result on every machine and in headless runs.
+    """
+    def __init__(self, start=0.0):
+        self.time = start
+        self.tick_count = 0
+
+    def now(self):
+        return self.time
+
+    def advance(self, dt):
+        self.time += dt
+        self.tick_count += 1
+
+
+class FixedStepLoop:
+    """
+    Accumulates the variable frame dt and calls step(FIXED_DT) the matching number of times.
+    step is any callable taking dt. The clock is advanced after each step.
+    stop() (optional) is checked after each step: once it is true, the rest of the frame's ticks are dropped.
+    """
+    def __init__(self, step, clock=None, fixed_dt=FIXED_DT, max_steps=MAX_STEPS_PER_FRAME, stop=None):
+        self.step = step
+        self.stop = stop
+        self.clock = clock if clock is not None else SimulationClock()
+        self.fixed_dt = fixed_dt
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+    def advance(self, dt):
+        """Feed real elapsed time. Returns how many ticks were run."""
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= self.fixed_dt:
+            if steps >= self.max_steps:
+                self.accumulator = 0.0
+                break
+            self.step(self.fixed_dt)
+            self.clock.advance(self.fixed_dt)
+            self.accumulator -= self.fixed_dt
+            steps += 1
+            if self.stop is not None and self.stop():
+                self.accumulator = 0.0
+                break
+        return steps
+
+    def run_ticks(self, count):
+        """Run count ticks back to back. Used when there is no real time, e.g. headless runs."""
+        for _ in range(count):
+            self.step(self.fixed_dt)
+            self.clock.advance(self.fixed_dt)
+
+
+class ScheduledCallback:
+    """Handle returned by TickScheduler.schedule. Call cancel() to stop it."""
+    __slots__ = ('scheduler', 'callback', 'period', 'priority', 'name', 'elapsed', 'once', 'active')
+
+    def __init__(self, scheduler, callback, period, priority, name, once):
+        self.scheduler = scheduler
+        self.callback = callback
+        self.period = period        # Seconds between calls, None for every tick
+        self.priority = priority
+        self.name = name
+        self.elapsed = 0.0
+        self.once = once
+        self.active = True
+
+    def cancel(self):
+        self.scheduler.cancel(self)
+
+
+class TickScheduler:
+    """
+    Runs callbacks from a level's fixed ticks instead of separate Kivy Clock events.
+    Each callback has a rate (Hz, None = every tick) and a priority (lower runs first).
+    Everything dies with the level: clear() removes every callback at once.
+    """
+    def __init__(self):
+        self.entries = []
+        _schedulers.add(self)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def schedule(self, callback, rate=None, priority=0, name=None):
+        """Call callback(dt) rate times per simulated second. dt is the time since its last call."""
+        period = 1 / rate if rate else None
+        return self._add(ScheduledCallback(self, callback, period, priority, name, once=False))
+
+    def schedule_once(self, callback, delay, priority=0, name=None):
+        """Call callback(dt) once after delay simulated seconds."""
+        return self._add(ScheduledCallback(self, callback, delay, priority, name, once=True))
+
+    def _add(self, entry):
+        if entry.name is None:
+            entry.name = getattr(entry.callback, '__qualname__', repr(entry.callback))
+        self.entries.append(entry)
+        self.entries.sort(key=lambda e: e.priority)     # Stable, so same priority keeps insertion order
+        return entry
+
+    def cancel(self, entry):
+        if entry.active:
+            entry.active = False
+            self.entries.remove(entry)
+
+    def clear(self):
+        for entry in self.entries:
+            entry.active = False
+        self.entries.clear()
+
+    def tick(self, dt):
+        for entry in list(self.entries):
+            if not entry.active:
+                continue    # Cancelled by an earlier callback this tick
+            if entry.period is None:
+                entry.callback(dt)
+                continue
+            entry.elapsed += dt
+            if entry.elapsed + 1e-9 < entry.period:
+                continue
+            elapsed = entry.elapsed
+            if entry.once:
+                self.cancel(entry)
+            else:
+                entry.elapsed = max(0.0, entry.elapsed - entry.period)
+            entry.callback(elapsed)
+
+    def live_callbacks(self):
+        """Diagnostic: (name, rate in Hz or None, priority) of every scheduled callback."""
+        return [(entry.name, (1 / entry.period if entry.period and not entry.once else None), entry.priority)
+                for entry in self.entries]
+
+
+_schedulers = weakref.WeakSet()
+
+
+def live_callback_report():
+    """
+    Diagnostic: callbacks still registered in every TickScheduler that hasn't been garbage collected.
+    A level that was thrown away but still shows up here is leaking.
+    """
+    return {id(scheduler): scheduler.live_callbacks() for scheduler in list(_schedulers) if len(scheduler)}
+
+
+class ActivityRegion:
+    """
+    Keeps the actors near the player awake and lets the others sleep, so the per-tick AI
+    cost depends on how many enemies are nearby, not on how many the level has.
+    refresh() asks the actor index for the neighbourhood instead of looking at every actor.
+    Sleeping actors are still in the index, so projectiles can hit them.
+    """
+    def __init__(self, index, radius=ACTIVITY_RADIUS):
+        self.index = index
+        self.radius = radius
+        self.awake = []         # Awake actors, in index insertion order
+        self._awake_ids = set()
+        self.woken = 0          # Total number of sleep -> awake transitions
+        self.slept = 0          # Total number of awake -> sleep transitions
+
+    def refresh(self, x, y):
+        """Wake the actors within radius of the point (x, y) and put the others to sleep."""
+        radius = self.radius
+        index = self.index
+        if len(index) < index.cell_count(radius * 2, radius * 2):
+            candidates = index.objects()  # Few actors: cheaper than visiting every cell of the region
+        else:
+            candidates = index.query(x - radius, y - radius, radius * 2, radius * 2)
+        awake = []
+        for actor in candidates:
+            dx = actor.pos[0] + actor.size[0] / 2 - x
+            dy = actor.pos[1] + actor.size[1] / 2 - y
+            if dx * dx + dy * dy <= radius * radius:
+                awake.append(actor)
+        ids = {id(actor) for actor in awake}
+        self.woken += len(ids - self._awake_ids)
+        self.slept += len(self._awake_ids - ids)
+        self.awake = awake
+        self._awake_ids = ids
+        return awake
+
+    def forget(self, actor):
+        """Drop an actor that left the level (dead enemy) without counting it as slept."""
+        if id(actor) in self._awake_ids:
+            self._awake_ids.discard(id(actor))
+            self.awake.remove(actor)
+
+    def is_awake(self, actor):
+        return id(actor) in self._awake_ids
+
+    def stats(self):
+        return {
+            'awake': len(self.awake),
+            'asleep': len(self.index) - len(self.awake),
+            'woken': self.woken,
+            'slept': self.slept,
+        }
+
+
+class Velocity:
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x=0.0, y=0.0):
+        self.x = x
+        self.y = y
+
+
+class EntityState:
+    """
+    Position and movement of a player, enemy or projectile. The game logic mutates this
+    directly and the Kivy widget copies pos from it once per frame (Entity.sync), so
+    moving an entity doesn't dispatch Kivy property events on every tick.
+    owner is the widget (or nothing, headless) this state belongs to.
+    """
+    __slots__ = ('x', 'y', 'width', 'height', 'velocity', 'on_ground', 'gravity', 'move_speed', 'jump_speed',
+                 'owner')
+
+    def __init__(self, x, y, width, height, gravity=-800, move_speed=300, jump_speed=400, velocity=None, owner=None):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.velocity = velocity if velocity is not None else Velocity()
+        self.on_ground = False
+        self.gravity = gravity
+        self.move_speed = move_speed
+        self.jump_speed = jump_speed
+        self.owner = owner
+
+    @property
+    def pos(self):
+        return self.x, self.y
+
+    @pos.setter
+    def pos(self, value):
+        self.x, self.y = value
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @size.setter
+    def size(self, value):
+        self.width, self.height = value
+
+    @property
+    def rect(self):
+        return self.x, self.y, self.width, self.height
+
+    @property
+    def center(self):
+        return self.x + self.width / 2, self.y + self.height / 2
+
+
+class Body(EntityState):
+    """
+    EntityState for the headless simulation. Not slotted, so LevelSimulation can hang
+    extra attributes on it (health, inventory, direction...).
+    """
+    @property
+    def state(self):
+        """Widgets keep their EntityState in .state; a Body is its own."""
+        return self
+
+
+def integrate(body, dt, world_width, solids=None):
+    """
+    Apply gravity and velocity to body for dt seconds, then keep it inside the world.
+    Same rules Entity.update always had; pos is only assigned once.
+
+    With solids (a function (x, y, width, height) -> list of solid rects in that area),
+    the move is swept against them instead (see move_swept): the body stops at the
+    first platform in its way, however long dt is, and on_ground says whether it
+    landed on one this tick.
+    """
+    if solids is not None:
+        # Gravity always pulls, so standing on a platform is a landing at t=0 every tick
+        body.velocity.y += body.gravity * dt
+        hits = move_swept(body, body.velocity.x * dt, body.velocity.y * dt, solids)
+        body.on_ground = any(normal_y == 1 for _, _, normal_y in hits)
+        x, y = body.pos
+    else:
+        if not body.on_ground:
+            body.velocity.y += body.gravity * dt
+
+        x = body.pos[0] + body.velocity.x * dt
+        y = body.pos[1] + body.velocity.y * dt
+
+    # Keep entity within world bounds (horizontal)
+    if x < 0:
+        x = 0
+    elif x > world_width - body.size[0]:
+        x = world_width - body.size[0]
+
+    # Don't let entity fall below the world
+    if y < 0:
+        y = 0
+        body.velocity.y = 0
+        body.on_ground = True
+
+    body.pos = (x, y)
+
+
+def sweep_aabb(rect, dx, dy, other, inclusive=False):
+    """
+    Time of impact of rect moving by (dx, dy) against the still rect other, both (x, y, width, height).
+    Returns (t, normal_x, normal_y) with t in [0, 1] as a fraction of the move, or None if they don't meet.
+    The normal points out of other at the side that was hit.
+
+    inclusive=False is for solids: edges only touching don't count, and a rect that already
+    overlaps other at the start is ignored (resolve_platform_collision handles that).
+    inclusive=True uses touching() semantics and reports t=0 when they already touch.
+    """
+    x, y, w, h = rect
+    ox, oy, ow, oh = other
+    inf = float('inf')
+
+    if dx > 0:
+        tx_entry, tx_exit = (ox - (x + w)) / dx, (ox + ow - x) / dx
+    elif dx < 0:
+        tx_entry, tx_exit = (ox + ow - x) / dx, (ox - (x + w)) / dx
+    elif (x + w < ox or x > ox + ow) if inclusive else (x + w <= ox or x >= ox + ow):
+        return None
+    else:
+        tx_entry, tx_exit = -inf, inf
+
+    if dy > 0:
+        ty_entry, ty_exit = (oy - (y + h)) / dy, (oy + oh - y) / dy
+    elif dy < 0:
+        ty_entry, ty_exit = (oy + oh - y) / dy, (oy - (y + h)) / dy
+    elif (y + h < oy or y > oy + oh) if inclusive else (y + h <= oy or y >= oy + oh):
+        return None
+    else:
+        ty_entry, ty_exit = -inf, inf
+
+    entry = max(tx_entry, ty_entry)
+    exit_ = min(tx_exit, ty_exit)
+    if inclusive:
+        # exit_ == 0: touching at the start but moving away, not a hit
+        if entry > exit_ or exit_ <= 0 or entry > 1:
+            return None
+    elif entry >= exit_ or entry < 0 or entry > 1:
+        return None
+
+    if tx_entry > ty_entry:
+        return max(entry, 0.0), (-1 if dx > 0 else 1), 0
+    return max(entry, 0.0), 0, (-1 if dy > 0 else 1) if dy else 0
+
+
+def swept_bounds(rect, dx, dy):
+    """Rectangle covering rect along the whole move, for the broad phase."""
+    x, y, w, h = rect
+    return min(x, x + dx), min(y, y + dy), w + abs(dx), h + abs(dy)
+
+
+def move_swept(body, dx, dy, solids, max_hits=3):
+    """
+    Move body by (dx, dy) without passing through solids, sliding along what it hits.
+    solids(x, y, width, height) returns the solid rects in an area. Returns the list of
+    (rect, normal_x, normal_y) hit. Velocities change like in resolve_platform_collision:
+    landing stops the fall, a head bump sends the body down, a wall stops it sideways.
+    """
+    hits = []
+    if not dx and not dy:
+        return hits
+    candidates = solids(*swept_bounds(body.rect, dx, dy))
+    for _ in range(max_hits):
+        if not dx and not dy:
+            break
+        rect = body.rect
+        first = None
+        for solid in candidates:
+            hit = sweep_aabb(rect, dx, dy, solid)
+            if hit is not None and (first is None or hit[0] < first[0]):
+                first = (hit[0], hit[1], hit[2], solid)
+        if first is None:
+            body.pos = (rect[0] + dx, rect[1] + dy)
+            break
+
+        t, normal_x, normal_y, solid = first
+        x, y = rect[0] + dx * t, rect[1] + dy * t
+        # Snap to the edge that was hit, so the contact position doesn't depend on dt
+        if normal_y == 1:
+            y = solid[1] + solid[3]
+            body.velocity.y = 0
+        elif normal_y == -1:
+            y = solid[1] - rect[3]
+            body.velocity.y = -50   # Makes the body fall faster
+        elif normal_x == 1:
+            x = solid[0] + solid[2]
+            body.velocity.x = 0
+        else:
+            x = solid[0] - rect[2]
+            body.velocity.x = 0
+        body.pos = (x, y)
+        hits.append((solid, normal_x, normal_y))
+
+        # Slide: keep moving along the surface for the rest of the move
+        dx, dy = dx * (1 - t), dy * (1 - t)
+        if normal_y:
+            dy = 0
+        else:
+            dx = 0
+    return hits
+
+
+def aabb_overlap(a, b):
+    """Standard Axis-Aligned Bounding Box check on (x, y, width, height) tuples."""
+    return (a[0] < b[0] + b[2] and
+            a[0] + a[2] > b[0] and
+            a[1] < b[1] + b[3] and
+            a[1] + a[3] > b[1])
+
+
+def resolve_platform_collision(body, body_rect, platform_rect):
+    """
+    Push body out of a platform it overlaps. body_rect is the body's rect before any
+    correction this frame. Returns True if the body is now standing on the platform.
+    """
+    # Calculate overlap distances for each direction
+    # Read the comments to prevent misused of these variables. They follow standard naming for overlapping.
+    overlap_left = (body_rect[0] + body_rect[2]) - platform_rect[0]  # platform's left - player's right
+    overlap_right = (platform_rect[0] + platform_rect[2]) - body_rect[0]  # platform's right - player's left
+    overlap_top = (platform_rect[1] + platform_rect[3]) - body_rect[1]  # platform's top - player's bottom
+    overlap_bottom = (body_rect[1] + body_rect[3]) - platform_rect[1]  # platform's bottom - player's top
+    min_overlap = min(overlap_left, overlap_right, overlap_bottom, overlap_top)
+
+    # Falling down onto platform: place body on top of it
+    if body.velocity.y <= 0 and min_overlap == overlap_top:
+        body.pos = (body.pos[0], platform_rect[1] + platform_rect[3])
+        body.velocity.y = 0
+        return True
+
+    # Head hitting the bottom of platform
+    if body.velocity.y > 0 and min_overlap == overlap_bottom:
+        body.velocity.y = -50  # Makes the body fall faster
+
+    # Touching the sides of platform
+    elif body.velocity.x > 0 and min_overlap == overlap_left:
+        body.velocity.x = 0
+    elif body.velocity.x < 0 and min_overlap == overlap_right:
+        body.velocity.x = 0
+    return False
+
+
+def touching(a, b):
+    """Same test as Kivy's Widget.collide_widget: edges touching counts as a hit."""
+    return not (a[0] + a[2] < b[0] or a[0] > b[0] + b[2] or
+                a[1] + a[3] < b[1] or a[1] > b[1] + b[3])
+
+
+class StaticObject:
+    """Platform, death trap, artifact or exit in a headless level. kind is the custom.txt category."""
+    __slots__ = ('kind', 'pos', 'size', 'damage', 'name')
+
+    def __init__(self, kind, x, y, width, height, damage=0, name=""):
+        self.kind = kind
+        self.pos = (x, y)
+        self.size = (width, height)
+        self.damage = damage
+        self.name = name
+
+
+class SimPlayer(Body):
+    """The Player widget without the drawing. level is the LevelSimulation it dies in."""
+    def __init__(self, level, x, y):
+        super().__init__(x, y, 40, 40)
+        self.level = level
+        self.health = 100
+        self.max_health = 100
+        self.current_health = 100
+        self.damage = 10
+        self.inventory = []
+        self.jumpboost = False
+        self.last_direction = (1, 0)
+        self.last_shot_time = 0.0
+        self.shoot_cooldown = 0.3
+
+    def take_damage(self, damage):
+        """Player.take_damage"""
+        self.health = max(self.health - damage, 0)
+        if self.health <= 0:
+            self.die()
+
+    def die(self):
+        self.level.lose()
+
+    def inventory_add_item(self, item):
+        self.inventory.append(item)
+
+
+class SimEnemy(Body):
+    """The Enemy widget without the drawing."""
+    def __init__(self, x, y, shoot_cooldown=2.0):
+        super().__init__(x, y, 40, 40, move_speed=0)
+        self.max_health = 60
+        self.current_health = 60
+        self.attack_damage = 10
+        self.direction = 1
+        self.shoot_interval = shoot_cooldown
+        self.last_shot_time = 0.0
+
+    def take_damage(self, damage):
+        """Enemy.take_damage"""
+        self.current_health = max(self.current_health - damage, 0)
+
+
+class SimProjectile(Body):
+    def __init__(self, x, y, direction, speed, damage, owner, decay_time=2.0):
+        super().__init__(x, y, 10, 4, gravity=0)
+        self.velocity = Velocity(direction[0] * speed, direction[1] * speed)
+        self.damage = damage
+        self.owner = owner
+        self.decay_time = decay_time
+        self.age = 0.0
+        self.max_bounce = 0
+        self.bounce_count = 0
+
+
+# The game rules. Each one takes the actor it moves (a widget from level_class.py, or a
+# SimPlayer/SimEnemy/SimProjectile) and the world it is in: BaseLevelContents in the game,
+# LevelSimulation headless. Both worlds have the same methods (queries, spawn/remove, and
+# hooks like play_sound that only do something in the game), so a level plays out the
+# same with or without a window, and the widgets only copy the result to the canvas.
+
+def run_tick(world, dt):
+    """One tick of a level, in the order the game has always run it."""
+    phase = world.phase
+    player = world.player
+    with phase('input'):
+        player_input(player, world.keys_pressed, world)
+    with phase('projectiles'):
+        for proj in list(world.projectiles):    # A projectile that hits something removes itself
+            projectile_step(proj, dt, world)
+    with phase('enemies'):
+        for enemy in world.awake_enemies():     # Far away enemies sleep, see ActivityRegion
+            enemy_step(enemy, dt, world)
+    with phase('collisions'):
+        player_contacts(world)
+    with phase('player'):
+        integrate(player.state, dt, world.get_world_size()[0], world.solids_near)
+    with phase('artifacts'):
+        apply_inventory_effects(player)
+
+
+def player_input(player, keys, world):
+    """Jump, shoot and walk with the keys held this tick."""
+    state = player.state
+    if ('up' in keys or 'w' in keys) and state.on_ground:
+        state.velocity.y = state.jump_speed * (1.5 if player.jumpboost else 1)
+        state.on_ground = False
+    if 'spacebar' in keys:
+        player_shoot(player, keys, world)
+    if 'left' in keys or 'a' in keys:
+        state.velocity.x = -state.move_speed
+        player.last_direction = (-1, 0)
+    elif 'right' in keys or 'd' in keys:
+        state.velocity.x = state.move_speed
+        player.last_direction = (1, 0)
+    else:
+        state.velocity.x = 0
+
+
+def player_shoot(player, keys, world):
+    """Shoot the way the player is walking (or last walked), at most once per shoot_cooldown."""
+    now = world.clock.now()
+    if now - player.last_shot_time < player.shoot_cooldown:
+        return
+    player.last_shot_time = now
+    if 'right' in keys or 'd' in keys:
+        player.last_direction = (1, 0)
+    elif 'left' in keys or 'a' in keys:
+        player.last_direction = (-1, 0)
+    x, y = player.state.center
+    world.spawn_projectile(x=x, y=y, direction=player.last_direction, speed=500, damage=10, owner='player')
+    world.play_sound('shoot')
+
+
+def projectile_step(proj, dt, world):
+    """
+    Move a projectile and hit the first platform or target it touches on the way.
+    Swept, so a fast projectile can't skip over a thin trap or an enemy between two ticks.
+    """
+    state = proj.state
+    start = state.rect
+    dx, dy = state.velocity.x * dt, state.velocity.y * dt
+    state.x += dx
+    state.y += dy
+
+    proj.age += dt
+    if proj.age > proj.decay_time:
+        world.release_projectile(proj)
+        return
+
+    area = swept_bounds(start, dx, dy)
+    first = None    # (time of impact, object, is a target)
+    for platform in world.platforms_near(*area):
+        hit = sweep_aabb(start, dx, dy, (platform.pos[0], platform.pos[1], platform.size[0], platform.size[1]),
+                         inclusive=True)
+        if hit is not None and (first is None or hit[0] < first[0]):
+            first = (hit[0], platform, False)
+    targets = [world.player] if proj.owner != 'player' else world.enemies_near(*area)
+    for target in targets:
+        hit = sweep_aabb(start, dx, dy, target.state.rect, inclusive=True)
+        if hit is not None and (first is None or hit[0] < first[0]):
+            first = (hit[0], target, True)
+    if first is None:
+        return
+
+    t, target, is_target = first
+    state.pos = (start[0] + dx * t, start[1] + dy * t)
+    if not is_target:
+        if proj.max_bounce > 0 and proj.bounce_count < proj.max_bounce:
+            state.velocity.x *= -1   # Reverse horizontal direction
+            proj.bounce_count += 1
+        else:
+            world.release_projectile(proj)
+        return
+
+    # Both subtract: the enemy loses twice the damage, the player loses it from both health counters
+    target.current_health -= proj.damage
+    target.take_damage(proj.damage)
+    if target is world.player:
+        if target.current_health <= 0:
+            target.die()
+    elif target.current_health <= 0:
+        world.remove_enemy(target)
+    world.projectile_exploded(proj)
+    world.release_projectile(proj)
+
+
+def enemy_step(enemy, dt, world):
+    """Walk, turn around at walls, gaps and the world edges, hurt the player on contact and shoot at them."""
+    if world.paused:
+        return
+    state = enemy.state
+    state.velocity.x = enemy.direction * state.move_speed
+    dx, dy = state.velocity.x * dt, state.velocity.y * dt
+    # Swept, so a fast enemy turns around at walls instead of walking through them
+    if (dx or dy) and move_swept(state, dx, dy, world.solids_near):
+        enemy.direction *= -1
+    world.actor_moved(enemy)
+
+    if state.x <= 0:
+        enemy.direction = 1
+    elif state.x >= world.get_world_size()[0] - state.width:
+        enemy.direction = -1
+
+    # Gap detection: turn around when there is no platform under the front foot
+    foot_x = state.x + state.width + 1 if enemy.direction == 1 else state.x - 1
+    foot_y = state.y - 1
+    if not any(p.pos[0] <= foot_x <= p.pos[0] + p.size[0] and p.pos[1] <= foot_y <= p.pos[1] + p.size[1]
+               for p in world.platforms_at(foot_x, foot_y)):
+        enemy.direction *= -1
+
+    player = world.player
+    if touching(state.rect, player.state.rect):
+        player.current_health -= enemy.attack_damage
+
+    now = world.clock.now()
+    if now - enemy.last_shot_time < enemy.shoot_interval:
+        return
+    center_x, center_y = state.center
+    player_x, player_y = player.state.center
+    dx, dy = player_x - center_x, player_y - center_y
+    distance = (dx * dx + dy * dy) ** 0.5
+    if distance > 300 or distance == 0:    # Only shoot if player is within 300 pixels
+        return
+    enemy.last_shot_time = now
+    world.spawn_projectile(x=center_x, y=center_y, direction=(dx / distance, dy / distance),
+                           speed=300, damage=10, owner='enemy')
+    world.play_sound('shoot')
+
+
+def player_contacts(world):
+    """Traps, artifacts and the exit the player touches, and platforms the player starts inside."""
+    player = world.player
+    state = player.state
+    player_rect = state.rect
+    for thing in world.platforms_near(*player_rect):
+        rect = (thing.pos[0], thing.pos[1], thing.size[0], thing.size[1])
+        # The swept move leaves the player touching platforms, not inside them,
+        # so traps, artifacts and exits trigger on contact (same test as collide_widget)
+        if not touching(player_rect, rect):
+            continue
+        kind = thing.kind
+        if kind == 'death_trap':
+            player.current_health -= thing.damage
+            player.take_damage(thing.damage)
+        elif kind == 'artifact':
+            player.inventory_add_item(thing.name)
+            world.remove_platform(thing)
+        elif kind == 'exit':
+            world.reach_exit()
+            return
+        # Only when the player starts inside a platform (spawn point, platform added on top...)
+        if kind in ('platform', 'death_trap') and aabb_overlap(player_rect, rect):
+            if resolve_platform_collision(state, player_rect, rect):
+                state.on_ground = True
+
+
+def apply_inventory_effects(player):
+    """What the collected artifacts do. Runs every tick, so picking one up works from the next tick on."""
+    player.jumpboost = False
+    player.damage = 10
+    player.max_health = 100
+    player.current_health = min(player.current_health, player.max_health)
+    for item in player.inventory:
+        name = getattr(item, 'name', str(item)).lower()
+        if name == 'sky rocket':
+            player.jumpboost = True
+        if name == 'ancient shotgun':
+            player.damage = 20
+        if name == 'meat armor':
+            player.max_health = 200
+            player.current_health = min(player.current_health, player.max_health)
+
+
+class LevelSimulation:
+    """
+    Headless level: the world run_tick acts on, like BaseLevelContents. Built from level data
+    (see level_data.py) and driven by a set of pressed key names, like Player.keys_pressed.
+    Puzzles are not simulated since they need someone to answer them.
+    outcome is None while running, then 'exit' or 'dead'.
+    """
+    TILE = 40
+    TRAP_TILE_HEIGHT = 10
+
+    def __init__(self, data, world_width=1920, fixed_dt=FIXED_DT):
+        self.world_width = world_width
+        self.clock = SimulationClock()
+        # Same callbacks and rates as BaseLevelContents.scheduler
+        self.scheduler = TickScheduler()
+        self.scheduler.schedule(self.step, priority=PRIORITY_PHYSICS, name='step')
+        self.scheduler.schedule(self.update_activity, rate=AI_RATE, priority=PRIORITY_AI, name='activity')
+        self.fixed_step = FixedStepLoop(self.scheduler.tick, clock=self.clock, fixed_dt=fixed_dt)
+        self.keys_pressed = set()
+        self.outcome = None
+        self.enemies_killed = 0
+
+        x, y = data['spawn_point'][0] if data.get('spawn_point') else (1, 1)
+        self.player = SimPlayer(self, x, y)
+
+        if hasattr(data, 'build_spatial_index'):
+            # Compiled level (levelpack.CompiledLevel): the index is built straight from the file
+            self.platforms, self.spatial_index = data.build_spatial_index(cell_size=40)
+        else:
+            # Same order the LevelContents classes append to self.platforms
+            tile = self.TILE
+            self.platforms = []
+            for x, y, tiles_x, tiles_y in data.get('ground', ()):
+                self.platforms.append(StaticObject('platform', x, y, tile * tiles_x, tile * tiles_y))
+            for x, y, tiles_x, tiles_y in data.get('death_trap', ()) or ():
+                self.platforms.append(StaticObject('death_trap', x, y, tile * tiles_x,
+                                                   self.TRAP_TILE_HEIGHT * tiles_y, damage=5))
+            for x, y, tiles_x, tiles_y in data.get('platform', ()) or ():
+                self.platforms.append(StaticObject('platform', x, y, tile * tiles_x, tile * tiles_y))
+            for x, y in data.get('artifact', ()) or ():
+                self.platforms.append(StaticObject('artifact', x, y, 40, 40, name=artifact_name(data)))
+            for x, y in data.get('exit', ()) or ():
+                self.platforms.append(StaticObject('exit', x, y, 40, 40))
+
+            self.spatial_index = SpatialGrid(cell_size=40)
+            for platform in self.platforms:
+                self.spatial_index.insert(platform)
+
+        self.enemies = []
+        for x, y in data.get('enemy', ()) or ():
+            self.enemies.append(SimEnemy(x, y))
+        self.projectiles = []
+
+        self.actor_index = SpatialGrid(cell_size=40)
+        for enemy in self.enemies:
+            self.actor_index.insert(enemy)
+        self.activity = ActivityRegion(self.actor_index)
+        self.update_activity()
+
+    @property
+    def tick_count(self):
+        return self.clock.tick_count
+
+    def dispose(self):
+        """BaseLevelContents.dispose: stop every scheduled callback."""
+        self.scheduler.clear()
+
+    def run(self, max_ticks, policy=None):
+        """Run until the player exits, dies or max_ticks pass. policy(sim) returns the keys to hold this tick."""
+        while self.outcome is None and self.clock.tick_count < max_ticks:
+            if policy is not None:
+                self.keys_pressed = set(policy(self))
+            self.fixed_step.run_ticks(1)
+        return self.outcome or 'timeout'
+
+    @property
+    def paused(self):
+        return self.outcome is not None
+
+    def lose(self):
+        """SimPlayer.die"""
+        if self.outcome is None:
+            self.outcome = 'dead'
+
+    def reach_exit(self):
+        if self.outcome is None:
+            self.outcome = 'exit'
+
+    def step(self, dt):
+        if self.outcome is not None:
+            return
+        run_tick(self, dt)
+
+    # What the game rules (run_tick and the functions it calls) need from a world.
+    # Each one does what the BaseLevelContents method of the same name does, minus the drawing.
+
+    def phase(self, name):
+        return _NO_PHASE
+
+    def get_world_size(self):
+        """Only the width matters headless."""
+        return self.world_width, 0
+
+    def solids_near(self, x, y, width, height):
+        return [(p.pos[0], p.pos[1], p.size[0], p.size[1]) for p in self.spatial_index.query(x, y, width, height)
+                if p.kind in ('platform', 'death_trap')]
+
+    def platforms_near(self, x, y, width, height):
+        return self.spatial_index.query(x, y, width, height)
+
+    def platforms_at(self, x, y):
+        return self.spatial_index.query_point(x, y)
+
+    def enemies_near(self, x, y, width, height):
+        return self.actor_index.query(x, y, width, height)
+
+    def awake_enemies(self):
+        return list(self.activity.awake)
+
+    def actor_moved(self, actor):
+        self.actor_index.move(actor.state)
+
+    def update_activity(self, dt=0):
+        self.activity.refresh(*self.player.state.center)
+
+    def spawn_projectile(self, x, y, direction, speed, damage, owner):
+        self.projectiles.append(SimProjectile(x, y, direction, speed=speed, damage=damage, owner=owner))
+
+    def release_projectile(self, proj):
+        if proj in self.projectiles:
+            self.projectiles.remove(proj)
+
+    def remove_enemy(self, enemy):
+        if enemy in self.enemies:
+            self.enemies.remove(enemy)
+            self.enemies_killed += 1
+        self.actor_index.remove(enemy)
+        self.activity.forget(enemy)
+
+    def remove_platform(self, thing):
+        self.platforms.remove(thing)
+        self.spatial_index.remove(thing)
+
+    def play_sound(self, name):
+        pass
+
+    def projectile_exploded(self, proj):
+        pass
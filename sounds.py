@@ -0,0 +1,114 @@
+"""
+Sound effects and level music. Kept out of level_class.py so the menus can play and stop
+sounds without importing the level code.
+
+Nothing is loaded at startup: a sound is loaded the first time it is played, and preload()
+loads the rest one file per frame once the menu is showing.
+"""
+from kivy.clock import Clock
+from kivy.core.audio import SoundLoader
+
+from utils import resource_path
+
+SOUNDS = {
+    'shoot': 'assets/sounds/shoot.wav',
+    'correct': 'assets/sounds/correct.wav',
+    'incorrect': 'assets/sounds/incorrect.wav',
+    'gameover': 'assets/sounds/gameover.wav',
+}
+LEVEL_MUSIC = {
+    'level_1': 'assets/sounds/level_1.wav',
+    'level_2': 'assets/sounds/level_2.wav',
+    'level_3': 'assets/sounds/level_3.wav',
+}
+
+
+class SoundManager:
+    music_volume = 0.7
+    sfx_volume = 0.8
+    sounds = {}         # name -> Sound, None if it couldn't be loaded
+    music = None
+    level_music = {}    # level name -> Sound, None if it couldn't be loaded
+    preload_event = None
+
+    @classmethod
+    def sound(cls, name):
+        """Sound effect name, loaded on first use."""
+        if name not in cls.sounds and name in SOUNDS:
+            sound = SoundLoader.load(resource_path(SOUNDS[name]))
+            if sound:
+                sound.volume = cls.sfx_volume
+            cls.sounds[name] = sound
+        return cls.sounds.get(name)
+
+    @classmethod
+    def track(cls, level_name):
+        """Music of a level, loaded on first use."""
+        if level_name not in cls.level_music and level_name in LEVEL_MUSIC:
+            cls.level_music[level_name] = SoundLoader.load(resource_path(LEVEL_MUSIC[level_name]))
+        return cls.level_music.get(level_name)
+
+    @classmethod
+    def load(cls):
+        """Load every sound now."""
+        for name in SOUNDS:
+            cls.sound(name)
+        for level_name in LEVEL_MUSIC:
+            cls.track(level_name)
+
+    @classmethod
+    def preload(cls):
+        """Load the sounds that aren't loaded yet, one file per frame. Call once the menu is up."""
+        pending = [(cls.sound, name) for name in SOUNDS if name not in cls.sounds]
+        pending += [(cls.track, name) for name in LEVEL_MUSIC if name not in cls.level_music]
+
+        def load_next(dt):
+            if not pending:
+                cls.preload_event = None
+                return False
+            load, name = pending.pop(0)
+            load(name)  # Already loaded if it was played in the meantime
+
+        if cls.preload_event is None and pending:
+            cls.preload_event = Clock.schedule_interval(load_next, 0)
+
+    @classmethod
+    def play(cls, name):
+        sound = cls.sound(name)
+        if sound:
+            sound.volume = cls.sfx_volume
+            sound.stop()
+            sound.play()
+
+    @classmethod
+    def set_music_volume(cls, volume):
+        cls.music_volume = volume
+        if cls.music:
+            cls.music.volume = volume
+
+    @classmethod
+    def set_sfx_volume(cls, volume):
+        cls.sfx_volume = volume
+        for sound in cls.sounds.values():
+            if sound:
+                sound.volume = volume
+
+    @classmethod
+    def play_music(cls, level_name):
+        """play music level"""
+        if cls.music:  # Check if music is already playing, don't stop it.
+            cls.music.stop()
+            cls.music = None
+        music = cls.track(level_name)
+        if music:
+            cls.music = music
+            cls.music.loop = True
+            cls.music.volume = cls.music_volume
+            cls.music.play()
+
+    @classmethod
+    def stop_music(cls):
+        """stop music level when you leave level"""
+        if cls.music:
+            cls.music.stop()
+            cls.music = None
@@ -0,0 +1,140 @@
+"""Spatial index used to narrow down collision checks."""
+from math import floor
+
+
+class SpatialGrid:
+    """
+    Uniform grid that buckets objects by the cells their rectangle covers.
+    Any object with pos and size can be inserted (Platform, DeathTrap, Artifact, LevelExit...).
+    Cell size defaults to 40px, same as the Platform tile size.
+    """
+    def __init__(self, cell_size=40):
+        self.cell_size = cell_size
+        self.cells = {}         # (cell_x, cell_y) -> list of objects
+        self._entries = {}      # id(obj) -> (insertion order, obj, list of cell keys)
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, obj):
+        return id(obj) in self._entries
+
+    def _cell_keys(self, x, y, width, height):
+        """Return every cell key covered by the rectangle (edges included)."""
+        size = self.cell_size
+        x0, x1 = floor(x / size), floor((x + width) / size)
+        y0, y1 = floor(y / size), floor((y + height) / size)
+        return [(cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1)]
+
+    def insert(self, obj):
+        """Add obj to every cell covered by its rectangle."""
+        self.insert_rect(obj, obj.pos[0], obj.pos[1], obj.size[0], obj.size[1])
+
+    def insert_rect(self, obj, x, y, width, height):
+        """Add obj with the given rectangle, for loaders that already have the numbers at hand."""
+        if id(obj) in self._entries:
+            return
+        keys = self._cell_keys(x, y, width, height)
+        for key in keys:
+            self.cells.setdefault(key, []).append(obj)
+        self._entries[id(obj)] = (self._next_order, obj, keys)
+        self._next_order += 1
+
+    def insert_many(self, items):
+        """
+        insert_rect for many (obj, x, y, width, height) at once, for level loading.
+        Same result as inserting them one by one, with the per-call work inlined.
+        """
+        size = self.cell_size
+        cells = self.cells
+        entries = self._entries
+        order = self._next_order
+        for obj, x, y, width, height in items:
+            if id(obj) in entries:
+                continue
+            x0, x1 = floor(x / size), floor((x + width) / size)
+            y0, y1 = floor(y / size), floor((y + height) / size)
+            keys = []
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    key = (cx, cy)
+                    keys.append(key)
+                    bucket = cells.get(key)
+                    if bucket is None:
+                        cells[key] = [obj]
+                    else:
+                        bucket.append(obj)
+            entries[id(obj)] = (order, obj, keys)
+            order += 1
+        self._next_order = order
+
+    def remove(self, obj):
+        """Remove obj from the grid. Does nothing if it isn't indexed."""
+        entry = self._entries.pop(id(obj), None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            bucket = self.cells[key]
+            bucket.remove(obj)
+            if not bucket:
+                del self.cells[key]
+
+    def move(self, obj):
+        """
+        Re-bucket obj after its rectangle changed. Only touches the cells when the
+        covered cells are different, so objects moving inside a cell cost one comparison.
+        """
+        entry = self._entries.get(id(obj))
+        if entry is None:
+            self.insert(obj)
+            return
+        order, _, old_keys = entry
+        keys = self._cell_keys(obj.pos[0], obj.pos[1], obj.size[0], obj.size[1])
+        if keys == old_keys:
+            return
+        for key in old_keys:
+            bucket = self.cells[key]
+            bucket.remove(obj)
+            if not bucket:
+                del self.cells[key]
+        for key in keys:
+            self.cells.setdefault(key, []).append(obj)
+        self._entries[id(obj)] = (order, obj, keys)
+
+    def objects(self):
+        """Return every indexed object, in insertion order."""
+        # Dicts keep insertion order and move() overwrites in place, so no sort is needed
+        return [entry[1] for entry in self._entries.values()]
+
+    def cell_count(self, width, height):
+        """Roughly how many cells a query of this size visits."""
+        return (int(width // self.cell_size) + 2) * (int(height // self.cell_size) + 2)
+
+    def query_point(self, x, y):
+        """Return the objects in the cell containing the point."""
+        size = self.cell_size
+        return list(self.cells.get((floor(x / size), floor(y / size)), ()))
+
+    def query(self, x, y, width, height):
+        """
+        Return the objects whose cells overlap the rectangle, in insertion order.
+        This is only a broad phase: callers still have to do the exact AABB check.
+        """
+        found = {}
+        cells = self.cells
+        for key in self._cell_keys(x, y, width, height):
+            bucket = cells.get(key)
+            if bucket:
+                for obj in bucket:
+                    found[id(obj)] = obj
+        if len(found) < 2:
+            return list(found.values())
+        # Keep the same order as the original list so collision resolution doesn't change
+        entries = self._entries
+        return sorted(found.values(), key=lambda obj: entries[id(obj)][0])
+
+    def clear(self):
+        self.cells.clear()
+        self._entries.clear()
+        self._next_order = 0
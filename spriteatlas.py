@@ -0,0 +1,129 @@
+"""
+Sprite atlas: the character, enemy, artifact and object sprites packed into one image, in
+Kivy's .atlas format, so they are read from one file and drawn from one GPU texture.
+Building it needs Pillow (see requirements.txt).
+TextureCache (level_class.py) takes sprites from the atlas once it has been built.
+
+Tiles (PixelTexturePack, spikes, lasers) are left out: the TileMap draws them with
+wrap='repeat', which only works on a texture of their own.
+
+Rebuild after changing a sprite, the game doesn't compare the atlas with the PNGs:
+    python spriteatlas.py
+    python spriteatlas.py --max-size 64
+"""
+import argparse
+import json
+import os
+
+ATLAS_PATH = 'assets/atlas/sprites.atlas'
+SPRITES = (
+    'assets/sprites/Characters/slime_character/slime_idle.png',
+    'assets/sprites/Characters/slime_character/slime_left.png',
+    'assets/sprites/Characters/slime_character/slime_right.png',
+    'assets/sprites/Characters/slime_character/slime_jump.png',
+    'assets/sprites/Characters/ENEMY.png',
+    'assets/sprites/Artifacts/DMG.png',
+    'assets/sprites/Artifacts/DOUBLE_JUMP.png',
+    'assets/sprites/Artifacts/HEALTH.png',
+    'assets/sprites/exit_portal.png',
+    'assets/sprites/question_block.png',
+)
+PADDING = 2         # Transparent pixels around each sprite, so linear filtering doesn't pick up a neighbour
+MAX_PAGE = 2048
+MAX_SPRITE = 128    # Sprites are drawn 40px wide; bigger sources are scaled down to this
+
+
+def sprite_id(path):
+    """Id of a sprite in the atlas: its file name without extension, like Kivy's atlas tool."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def source_key(path):
+    """Compare sprite paths ignoring case and separators (the code asks for Enemy.png, the file is ENEMY.png)."""
+    return os.path.normpath(path).replace('\\', '/').lower()
+
+
+def pack(sizes, padding=PADDING, max_page=MAX_PAGE):
+    """
+    Shelf-pack (width, height) boxes into pages no bigger than max_page. Returns a list of
+    pages, (width, height, [(box index, x, y)]), with y from the top. Tallest boxes go first,
+    each page is the smallest power of two that fits its shelves.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    for i in order:
+        width, height = sizes[i]
+        if width + 2 * padding > max_page or height + 2 * padding > max_page:
+            raise ValueError(f"Sprite {i} ({width}x{height}) doesn't fit a {max_page}px page")
+    side = 64
+    while True:
+        pages = []
+        placed = []
+        x = y = shelf_height = 0
+        for i in order:
+            width, height = sizes[i][0] + 2 * padding, sizes[i][1] + 2 * padding
+            if x + width > side:    # Next shelf
+                x, y, shelf_height = 0, y + shelf_height, 0
+            if y + height > side or width > side:
+                if side < max_page:
+                    break           # Try again with a bigger page
+                pages.append(placed)  # Page is full, start the next one
+                placed = []
+                x = y = shelf_height = 0
+            placed.append((i, x + padding, y + padding))
+            x += width
+            shelf_height = max(shelf_height, height)
+        else:
+            pages.append(placed)
+            return [(side, side, page) for page in pages]
+        side *= 2
+
+
+def build_atlas(sources=SPRITES, output=ATLAS_PATH, max_size=MAX_SPRITE, padding=PADDING):
+    """Write output (.atlas) and its page images next to it. Returns the .atlas content."""
+    from PIL import Image   # Only needed here, the game reads the result with Kivy
+
+    ids = [sprite_id(path) for path in sources]
+    duplicates = {sprite for sprite in ids if ids.count(sprite) > 1}
+    if duplicates:
+        raise ValueError(f"Sprites with the same file name can't share an atlas: {sorted(duplicates)}")
+    images = []
+    for path in sources:
+        image = Image.open(path).convert('RGBA')
+        if max_size and max(image.size) > max_size:
+            image.thumbnail((max_size, max_size), Image.LANCZOS)   # Keeps the aspect ratio
+        images.append(image)
+
+    folder = os.path.dirname(output) or '.'
+    os.makedirs(folder, exist_ok=True)
+    base = os.path.splitext(os.path.basename(output))[0]
+    meta = {}
+    for number, (width, height, placed) in enumerate(pack([image.size for image in images], padding)):
+        page = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        regions = {}
+        for i, x, y in placed:
+            page.paste(images[i], (x, y))
+            w, h = images[i].size
+            regions[ids[i]] = [x, height - y - h, w, h]     # Kivy textures start at the bottom left
+        name = f"{base}-{number}.png"
+        page.save(os.path.join(folder, name), optimize=True)
+        meta[name] = regions
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(meta, file)
+    return meta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack the game's sprites into a Kivy .atlas.")
+    parser.add_argument('-o', '--output', default=ATLAS_PATH)
+    parser.add_argument('--max-size', type=int, default=MAX_SPRITE, help="scale sprites down to this size (0: keep)")
+    args = parser.parse_args(argv)
+    meta = build_atlas(output=args.output, max_size=args.max_size)
+    source_bytes = sum(os.path.getsize(path) for path in SPRITES)
+    folder = os.path.dirname(args.output) or '.'
+    atlas_bytes = sum(os.path.getsize(os.path.join(folder, name)) for name in meta)
+    print(f"Packed {len(SPRITES)} sprites into {len(meta)} page(s): {atlas_bytes} bytes, "
+          f"was {len(SPRITES)} files and {source_bytes} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Seeded collision scenarios played at several tick rates, for tests/test_tick_rates.py and
+benchmark.py (check_tick_rates). Collisions must not depend on the tick rate (see simulation.move_swept).
+"""
+import random
+
+from simulation import LevelSimulation, Body, integrate, aabb_overlap, resolve_platform_collision
+
+TICK_RATES = (30, 60, 144)
+
+
+def drop(rate, start_y, platform, swept, seconds=4.0, x=100):
+    """Drop a body from (x, start_y) onto platform (x, y, w, h) at the given tick rate. Return its final y."""
+    body = Body(x, start_y, 40, 40)
+    dt = 1 / rate
+    for _ in range(int(seconds * rate)):
+        if swept:
+            integrate(body, dt, 2000, lambda *area: [platform])
+        else:
+            # The old way: move, then push out of whatever the body overlaps (check_collisions)
+            integrate(body, dt, 2000)
+            body.on_ground = resolve_platform_collision(body, body.rect, platform) \
+                if aabb_overlap(body.rect, platform) else body.pos[1] == 0
+    return body.pos[1]
+
+
+def drop_in_level(rate, x, start_y, row, kind, seconds=4.0):
+    """
+    Drop the player of a LevelSimulation from (x, start_y) onto one level row (x, y, tiles_x, tiles_y)
+    of kind 'ground' or 'death_trap', ticking at rate. Return where the player ended up.
+    """
+    data = {'spawn_point': [(x, start_y)], kind: [row]}
+    sim = LevelSimulation(data, world_width=4000, fixed_dt=1 / rate)
+    sim.run(int(seconds * rate))
+    return sim.player.pos
+
+
+def shot_in_level(rate, x, speed, target_x, kind):
+    """
+    Fire a player projectile from x to the right at a 40px wall (kind 'ground') or enemy ('enemy')
+    standing at target_x, in a LevelSimulation ticking at rate. Return (tick it hit on, what it hit),
+    what is None if it missed. The player stays far away so the enemy doesn't wake up.
+    """
+    data = {'spawn_point': [(3900, 0)], kind: [(target_x, 100, 1, 1) if kind == 'ground' else (target_x, 100)]}
+    sim = LevelSimulation(data, world_width=4000, fixed_dt=1 / rate)
+    sim.spawn_projectile(x, 110, (1, 0), speed=speed, damage=10, owner='player')
+    while sim.projectiles and sim.outcome is None:
+        sim.fixed_step.run_ticks(1)
+    if kind == 'enemy':
+        hit = kind if sim.enemies[0].current_health < sim.enemies[0].max_health else None
+    else:
+        hit = kind if sim.tick_count <= 2 * rate else None    # Otherwise it decayed, see SimProjectile
+    return sim.tick_count, hit
+
+
+def drop_scenarios(count=100, seed=0):
+    """Seeded random drops for drop_in_level: (x, start_y, row, kind) onto 10px traps and 40px platforms."""
+    rng = random.Random(seed)
+    scenarios = []
+    for _ in range(count):
+        kind = rng.choice(('ground', 'death_trap'))
+        row = (rng.randrange(0, 40) * 40, rng.randrange(1, 10) * 40, rng.randint(1, 5), 1)
+        height = 40 if kind == 'ground' else LevelSimulation.TRAP_TILE_HEIGHT
+        x = max(0.0, rng.uniform(row[0] - 30, row[0] + 40 * row[2] - 10))  # At least 10px over the row
+        scenarios.append((x, row[1] + height + rng.uniform(50, 3000), row, kind))
+    return scenarios
+
+
+def shot_scenarios(count=100, seed=0):
+    """Seeded random shots for shot_in_level: (x, speed, target_x, kind, exact time of impact in seconds)."""
+    rng = random.Random(seed)
+    scenarios = []
+    for _ in range(count):
+        x = rng.uniform(0, 400)
+        speed = rng.uniform(300, 3000)
+        target_x = round(x + 10 + rng.uniform(20, min(speed * 1.9, 3000)))
+        impact = (target_x - (x + 10)) / speed     # Projectiles are 10px wide
+        scenarios.append((x, speed, target_x, rng.choice(('ground', 'enemy')), impact))
+    return scenarios
+
+
+def shot_on_time(rate, tick, impact):
+    """Whether tick (1 = the first) is the tick during which the exact time of impact falls."""
+    dt = 1 / rate
+    return (tick - 1) * dt - 1e-9 <= impact <= tick * dt + 1e-9
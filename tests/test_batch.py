@@ -0,0 +1,33 @@
+"""The NumPy backend (batch.py) must play out exactly like LevelSimulation."""
+import random
+
+import pytest
+
+from batch import BatchLevelSimulation, HAVE_NUMPY
+from simulate import RandomPolicy
+from simulation import LevelSimulation
+
+pytestmark = pytest.mark.skipif(not HAVE_NUMPY, reason="needs numpy")
+
+
+def wide_level(seed, width=40000, platforms=2000, enemies=300):
+    rng = random.Random(seed)
+    return {
+        'spawn_point': [(100, 40)],
+        'ground': [(0, 0, width // 40, 1)],
+        'platform': [(rng.randrange(0, width // 40) * 40, rng.randrange(2, 12) * 40, rng.randint(1, 4), 1)
+                     for _ in range(platforms)],
+        'enemy': [(rng.randrange(1, width // 40) * 40, 40) for _ in range(enemies)],
+    }
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_batch_backend_matches_objects_on_a_wide_level(seed):
+    data = wide_level(seed)
+    runs = []
+    for simulation_class in (LevelSimulation, BatchLevelSimulation):
+        sim = simulation_class(data, world_width=40000)
+        sim.player.health = sim.player.current_health = float('inf')
+        sim.run(900, RandomPolicy(seed))
+        runs.append((sim.player.pos, sim.enemies_killed, sorted(e.pos for e in sim.enemies)))
+    assert runs[0] == runs[1]
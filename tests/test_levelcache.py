@@ -0,0 +1,37 @@
+"""Custom level cache (levelcache.py): a level that passed its checks is never rejected for caching reasons."""
+import os
+
+from levelcache import LevelCache
+from levelpack import CompiledLevel
+
+LEVEL = "spawn_point:\n(40, 40)\nplatform:\n(0, 0, 10, 1)\nexit:\n(360, 40)\n"
+
+
+def write_level(path, content=LEVEL):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def test_unwritable_cache_dir_still_loads_the_level(tmp_path):
+    blocked = tmp_path / 'cache'
+    blocked.write_text('not a directory')   # makedirs fails like on a read-only install
+    level = tmp_path / 'custom.txt'
+    write_level(level)
+    data, errors = LevelCache(cache_dir=str(blocked)).load(str(level))
+    assert errors == []
+    assert data['exit'] == [(360, 40)]
+
+
+def test_replaced_compiled_entry_is_unmapped(tmp_path):
+    cache = LevelCache(cache_dir=str(tmp_path / 'cache'))
+    first = LevelCache(cache_dir=str(tmp_path / 'cache'))
+    level = tmp_path / 'custom.txt'
+    write_level(level)
+    first.load(str(level))     # Leaves a compiled copy in the cache dir
+    old, errors = cache.load(str(level))
+    assert isinstance(old, CompiledLevel) and errors == []
+    write_level(level, LEVEL.replace('(360, 40)', '(320, 40)'))
+    os.utime(level, ns=(1, 1))
+    new, errors = cache.load(str(level))
+    assert new['exit'] == [(320, 40)]
+    assert old._map.closed
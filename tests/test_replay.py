@@ -0,0 +1,97 @@
+"""
+Recordings must replay to the recorded outcome on the recorded tick (see replay.py), and a
+replay that doesn't must be reported as one.
+"""
+import pytest
+
+from batch import BatchLevelSimulation, HAVE_NUMPY
+from level_data import LEVELS, CUSTOM_ARTIFACT_NAME, parse_level_data
+from replay import InputLog, ReplayPolicy, record_run, replay, level_digest
+from simulate import RandomPolicy
+from simulation import LevelSimulation
+
+RUNS = [(level, seed) for level in (1, 2, 3) for seed in range(4)]
+
+
+@pytest.mark.parametrize('level, seed', RUNS)
+def test_recording_replays_to_the_same_tick(level, seed):
+    log = record_run(LEVELS[level], RandomPolicy(seed), str(level), seed=seed, max_ticks=3600)
+    result = replay(InputLog.from_bytes(log.to_bytes()), LEVELS[level])
+    assert (result.outcome, result.tick) == (log.outcome, log.end_tick)
+    assert result.matches
+
+
+@pytest.mark.skipif(not HAVE_NUMPY, reason="needs numpy")
+@pytest.mark.parametrize('level, seed', RUNS)
+def test_numpy_backend_replays_to_the_same_tick(level, seed):
+    log = record_run(LEVELS[level], RandomPolicy(seed), str(level), seed=seed, max_ticks=3600)
+    assert replay(log, LEVELS[level], BatchLevelSimulation).matches
+
+
+def test_diverged_replay_is_reported():
+    log = record_run(LEVELS[3], RandomPolicy(0), '3', max_ticks=600)
+    log.finish(log.outcome, log.end_tick + 1)
+    assert not replay(log, LEVELS[3]).matches
+
+
+def test_changed_level_is_refused():
+    log = record_run(LEVELS[1], RandomPolicy(0), '1', max_ticks=60)
+    with pytest.raises(ValueError):
+        replay(log, LEVELS[2])
+
+
+def test_file_round_trip(tmp_path):
+    log = record_run(LEVELS[2], RandomPolicy(5), '2', seed=5, max_ticks=1200)
+    path = tmp_path / 'run.ahr'
+    log.save(str(path))
+    loaded = InputLog.load(str(path))
+    assert loaded.masks == log.masks
+    assert (loaded.level, loaded.digest, loaded.seed, loaded.outcome, loaded.end_tick) == \
+        (log.level, log.digest, log.seed, log.outcome, log.end_tick)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_game_run_replays_to_the_same_tick(seed, tmp_path, monkeypatch):
+    """Records through BaseLevelContents (the game's own step path) and replays headless. Needs Kivy and a window."""
+    pytest.importorskip('kivy')
+    from kivy.uix.screenmanager import Screen, ScreenManager
+    from level_3 import LevelContents
+
+    monkeypatch.setenv('ARTIFACTHUNTER_RECORD', str(tmp_path))
+    manager = ScreenManager()
+    manager.add_widget(Screen(name='level_selection'))     # Where reaching the exit goes
+    level = LevelContents()
+    for puzzle in list(level.puzzles):
+        level.remove_puzzle(puzzle)     # Their popups need a running app, and they don't move anything
+    # Player.die opens the game over popup, which needs a running app
+    monkeypatch.setattr(level.player, 'die', lambda: level.finish_recording('dead'))
+    screen = Screen(name='level_3')
+    screen.add_widget(level)
+    manager.add_widget(screen)
+
+    policy = RandomPolicy(seed)
+    level.start_recording()
+    sim = LevelSimulation(level.data, world_width=level.input_log.world_width)
+    while level.input_log is not None and len(level.input_log) < 3600:
+        level.player.keys_pressed = set(policy(sim))
+        level.fixed_step.run_ticks(1)
+    if level.input_log is not None:
+        level.finish_recording('timeout')
+
+    recordings = list(tmp_path.glob('*.ahr'))
+    assert len(recordings) == 1
+    log = InputLog.load(str(recordings[0]))
+    assert log.digest == level_digest(LEVELS[3])
+    result = replay(log, level.data)
+    assert (result.outcome, result.tick) == (log.outcome, log.end_tick)
+
+    # Same positions too, not only the same ending
+    sim.run(log.end_tick, ReplayPolicy(log))
+    assert sim.player.pos == pytest.approx(level.player.state.pos)
+    assert len(sim.enemies) == len(level.enemies)
+
+
+def test_custom_artifact_is_named_like_the_game_names_it():
+    data = parse_level_data("spawn_point:\n(40, 40)\nartifact:\n(200, 40)\n")
+    names = [thing.name for thing in LevelSimulation(data).platforms if thing.kind == 'artifact']
+    assert names == [CUSTOM_ARTIFACT_NAME]
@@ -0,0 +1,92 @@
+"""
+The game and LevelSimulation run the same rules (simulation.run_tick and the functions it calls),
+each as the world the rules act on. level_class.py needs Kivy, so the game's side is checked from
+its source: it must provide the whole world and route every tick through run_tick.
+"""
+import ast
+import os
+
+import pytest
+
+from simulation import LevelSimulation
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What run_tick and the rules call on a world
+WORLD = ('player', 'projectiles', 'enemies', 'clock', 'paused', 'keys_pressed', 'phase', 'get_world_size',
+         'solids_near', 'platforms_near', 'platforms_at', 'enemies_near', 'awake_enemies', 'actor_moved',
+         'spawn_projectile', 'release_projectile', 'remove_enemy', 'remove_platform', 'reach_exit',
+         'play_sound', 'projectile_exploded')
+# Moved to simulation.py; the widgets must not grow their own copies again
+RULES = {'Entity': ('update', 'jump', 'move_left', 'move_right'),
+         'Player': ('update', 'process_input', 'shoot_towards_cursor'),
+         'Enemy': ('update', 'try_shoot', 'hit_player'),
+         'Projectile': ('update',),
+         'Artifact': ('pick_up',),
+         'BaseLevelContents': ('check_collisions',)}
+
+
+def classes(module):
+    with open(os.path.join(ROOT, module + '.py'), encoding='utf-8') as file:
+        tree = ast.parse(file.read())
+    return {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+
+
+def members(cls):
+    """Methods, properties and class attributes of cls, plus the self.<name> it assigns."""
+    names = set()
+    for node in cls.body:
+        if isinstance(node, ast.FunctionDef):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+    for node in ast.walk(cls):
+        if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store) and \
+                isinstance(node.value, ast.Name) and node.value.id == 'self':
+            names.add(node.attr)
+    return names
+
+
+def calls(function, name):
+    return any(isinstance(node, ast.Call) and getattr(node.func, 'id', getattr(node.func, 'attr', None)) == name
+               for node in ast.walk(function))
+
+
+def method(cls, name):
+    return next(node for node in cls.body if isinstance(node, ast.FunctionDef) and node.name == name)
+
+
+def test_simulation_is_a_world():
+    sim = LevelSimulation({'spawn_point': [(40, 40)]})
+    assert [name for name in WORLD if not hasattr(sim, name)] == []
+
+
+def test_game_level_is_a_world():
+    base = classes('level_class')['BaseLevelContents']
+    # player, projectiles, enemies and paused come from the level subclasses
+    provided = members(base) | {'player', 'projectiles', 'enemies'}
+    assert [name for name in WORLD if name not in provided] == []
+
+
+def test_game_tick_runs_the_shared_rules():
+    assert calls(method(classes('level_class')['BaseLevelContents'], 'step'), 'run_tick')
+
+
+@pytest.mark.parametrize('module', ['level_1', 'level_2', 'level_3', 'level_custom'])
+def test_levels_step_through_the_base_class(module):
+    step = method(classes(module)['LevelContents'], 'step')
+    assert calls(step, 'step')  # super().step(dt)
+
+
+def test_widgets_have_no_rules_of_their_own():
+    found = classes('level_class')
+    copies = [f"{name}.{rule}" for name, rules in RULES.items() for rule in rules
+              if any(isinstance(node, ast.FunctionDef) and node.name == rule for node in found[name].body)]
+    assert copies == []
+
+
+def test_collected_artifact_works_from_the_next_tick():
+    sim = LevelSimulation({'spawn_point': [(40, 0)], 'artifact': [(90, 0)], 'artifact_name': 'sky rocket'})
+    sim.run(60, lambda sim: ('right',))
+    assert sim.player.inventory == ['sky rocket']
+    assert sim.player.jumpboost
@@ -0,0 +1,42 @@
+"""
+Every callback of a level lives in its TickScheduler and dies with it (see simulation.py):
+live_callback_report() must not list a level once it was disposed.
+"""
+import gc
+
+from level_data import LEVELS
+from simulation import LevelSimulation, TickScheduler, live_callback_report
+
+
+def live_names(scheduler):
+    return [name for name, rate, priority in live_callback_report().get(id(scheduler), ())]
+
+
+def test_disposed_level_leaves_no_callbacks():
+    gc.collect()    # Levels of earlier tests only go away with their reference cycles
+    assert live_callback_report() == {}
+    sim = LevelSimulation(LEVELS[3])
+    sim.run(120, lambda sim: ('right', 'spacebar'))
+    assert live_names(sim.scheduler) == ['step', 'activity']
+    sim.dispose()
+    assert live_callback_report() == {}
+
+
+def test_level_that_is_not_disposed_shows_up():
+    sim = LevelSimulation(LEVELS[1])
+    sim.run(10)
+    assert live_names(sim.scheduler) == ['step', 'activity']
+    sim.dispose()
+
+
+def test_cancelled_and_fired_callbacks_are_gone():
+    scheduler = TickScheduler()
+    calls = []
+    entry = scheduler.schedule(calls.append, rate=30, name='interaction')
+    scheduler.schedule_once(calls.append, 0.05, name='once')
+    for _ in range(6):
+        scheduler.tick(1 / 60)
+    assert live_names(scheduler) == ['interaction']
+    entry.cancel()
+    assert live_callback_report().get(id(scheduler)) is None
+    assert len(calls) == 4  # 3 at 30 Hz over 0.1s, and the one-shot
@@ -0,0 +1,47 @@
+"""
+Collisions must not depend on the tick rate (see simulation.move_swept): the same drop or shot,
+played in a LevelSimulation at 30, 60 and 144 Hz, ends the same way. Scenarios are seeded, so a
+failure always reproduces.
+"""
+import pytest
+
+from tests.scenarios import (TICK_RATES, drop, drop_in_level, drop_scenarios, shot_in_level, shot_on_time,
+                             shot_scenarios)
+from simulation import Body, integrate
+
+DROPS = drop_scenarios(100)
+SHOTS = shot_scenarios(100)
+
+
+@pytest.mark.parametrize('x, start_y, row, kind', DROPS)
+def test_drop_lands_on_the_same_spot_at_every_rate(x, start_y, row, kind):
+    landed = {rate: drop_in_level(rate, x, start_y, row, kind) for rate in TICK_RATES}
+    assert len(set(landed.values())) == 1, landed
+    height = 40 if kind == 'ground' else 10
+    assert landed[TICK_RATES[0]] == (x, row[1] + height)   # On top of the row, not through it
+
+
+@pytest.mark.parametrize('x, speed, target_x, kind, impact', SHOTS)
+def test_shot_hits_on_the_tick_of_impact_at_every_rate(x, speed, target_x, kind, impact):
+    for rate in TICK_RATES:
+        tick, hit = shot_in_level(rate, x, speed, target_x, kind)
+        assert hit == kind, f"missed at {rate} Hz"
+        assert shot_on_time(rate, tick, impact), f"hit on tick {tick} at {rate} Hz, impact at {impact:.4f}s"
+
+
+def test_scenarios_tunnel_without_the_sweep():
+    # Keeps the scenarios honest: the old move-then-push-out resolution gets some of them wrong
+    def same_at_every_rate(x, start_y, row, kind):
+        height = 40 if kind == 'ground' else 10
+        platform = (row[0], row[1], 40 * row[2], height)
+        return len({drop(rate, start_y, platform, swept=False, x=x) for rate in TICK_RATES}) == 1
+    assert not all(same_at_every_rate(*scenario) for scenario in DROPS)
+
+
+def test_integrate_stops_at_the_first_solid_in_the_way():
+    body = Body(0, 500, 40, 40)
+    body.velocity.y = -30000    # 500px in one 60 Hz tick
+    solids = [(0, 100, 400, 10), (0, 300, 400, 10)]
+    integrate(body, 1 / 60, 2000, lambda *area: solids)
+    assert body.pos == (0, 310)
+    assert body.on_ground
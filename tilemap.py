@@ -0,0 +1,50 @@
+"""
+Vertex data for the static tile layer. The TileMap that turns it into
+Meshes lives in level_class.py.
+
+A quad is (x, y, width, height, tiles_x, tiles_y): the same numbers create_platform
+passes to Platform, with the size already multiplied by the tile size.
+"""
+
+MAX_QUADS_PER_MESH = 16000  # Mesh indices are 16 bit: 4 vertices per quad
+
+
+def merge_quads(quads):
+    """
+    Merge quads that sit side by side on the same row (same y, height and tile size)
+    into one wider quad. Textures repeat every tile, so the result looks the same.
+    """
+    merged = []
+    for quad in sorted(quads, key=lambda q: (q[1], q[3], q[5], q[0])):
+        x, y, width, height, tiles_x, tiles_y = quad
+        if merged:
+            last = merged[-1]
+            same_row = last[1] == y and last[3] == height and last[5] == tiles_y
+            same_tile = last[2] * tiles_x == width * last[4]
+            if same_row and same_tile and last[0] + last[2] == x:
+                merged[-1] = (last[0], y, last[2] + width, height, last[4] + tiles_x, tiles_y)
+                continue
+        merged.append(quad)
+    return merged
+
+
+def build_mesh_data(quads, uvpos=(0, 0)):
+    """
+    Return a list of (vertices, indices), one per mesh, for the quads.
+    uvpos is the texture's uvpos; each quad repeats the texture tiles_x by tiles_y times,
+    exactly like Platform did with texture.uvsize.
+    """
+    u0, v0 = uvpos
+    meshes = []
+    for start in range(0, len(quads), MAX_QUADS_PER_MESH):
+        vertices = []
+        indices = []
+        for i, (x, y, width, height, tiles_x, tiles_y) in enumerate(quads[start:start + MAX_QUADS_PER_MESH]):
+            vertices += (x, y, u0, v0,
+                         x + width, y, u0 + tiles_x, v0,
+                         x + width, y + height, u0 + tiles_x, v0 + tiles_y,
+                         x, y + height, u0, v0 + tiles_y)
+            v = i * 4
+            indices += (v, v + 1, v + 2, v + 2, v + 3, v)
+        meshes.append((vertices, indices))
+    return meshes